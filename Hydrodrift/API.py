@@ -1,30 +1,92 @@
 import requests
-import xarray as xr
 import numpy as np
-from opendrift.readers import reader_netCDF_CF_generic
 import datetime
 import pandas as pd
-import json
 import netCDF4 as nc
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from SensorReader import SensorReader
 
 
 class QueryAPI():
 
-    def __init__(self):
-        self.results = []
+    # Unique constraint on (grid_id, record_time) of the simulations table, with the
+    # default name given by PostgreSQL to UNIQUE (grid_id, record_time)
+    upsert_constraint = "simulations_grid_id_record_time_key"
+
+    def __init__(self, hasura_url=None, page_size=10000, pool_size=4, retries=3, record_id="id"):
+        """
+        Optional variables:
+            hasura_url: GraphQL endpoint, defaults to port 8080 of HASURA_HOST
+            page_size: number of records pulled per request
+            record_id: unique column of the sensor record tables, used for paging
+            pool_size: number of pooled connections, and of concurrent uploads
+            retries: number of retries of failed requests
+        """
         self.locationlist = []
-        hasura_host = os.getenv('HASURA_HOST', 'localhost')
-        self.hasura_url = f"http://{hasura_host}:8080/v1/graphql"
+        if hasura_url is None:
+            hasura_host = os.getenv('HASURA_HOST', 'localhost')
+            hasura_url = f"http://{hasura_host}:8080/v1/graphql"
+        self.hasura_url = hasura_url
+        self.page_size = page_size
+        self.record_id = record_id
 
         self.headers = {
             "Content-Type": "application/json",
             "x-hasura-admin-secret": "mylongsecretkey",
         }
 
+        # Pooled connections, retrying requests on connection errors and server errors.
+        # Only queries and upserts are sent with self.session, as these can safely be
+        # repeated, while other mutations are sent once with self.mutation_session
+        self.pool_size = pool_size
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                      allowed_methods=None)
+        self.session = self.pooled_session(retry)
+        self.mutation_session = self.pooled_session(0)
+
+    def pooled_session(self, max_retries):
+        """
+        Returns a session with pooled connections
+        Required variables:
+            max_retries: Retry, or number of retries
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                              max_retries=max_retries)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def post_query(self, query, variables=None):
+        """
+        Posts a query and returns its data.
+        Raises requests.RequestException if the request fails
+        Required variables:
+            query
+        Optional variables:
+            variables: variables of the query
+        """
+        payload = {"query": query}
+        if variables is not None:
+            payload["variables"] = variables
+        response = self.session.post(self.hasura_url, json=payload, headers=self.headers)
+        try:
+            result = response.json()
+        except ValueError:
+            raise requests.RequestException(f"Query failed: {response.status_code} - {response.text}")
+        if response.status_code != 200 or "errors" in result:
+            raise requests.RequestException(f"Query failed: {response.status_code} - {response.text}")
+        return result["data"]
+
     def query_location_API(self, start_datetime, end_datetime):
         """
         Pulls relevant locations from the API
+        Raises requests.RequestException if the request fails
         Required variables:
             start_datetime
             end_datetime
@@ -45,384 +107,297 @@ class QueryAPI():
         }}
         """
 
-        try:
-            response = requests.post(self.hasura_url, json={"query": unique_location_query}, headers=self.headers)
-
-            if response.status_code == 200:
-                data = response.json()["data"]["salinity"]
-
-            for entry in data:
-                self.locationlist.append(entry["location"]["coordinates"])
-
-            return self.locationlist
+        for entry in self.post_query(unique_location_query)["salinity"]:
+            self.locationlist.append(entry["location"]["coordinates"])
 
-        except requests.ConnectionError:
-            print("Error: Unable to connect to the Hasura API. Please check the server.")
-            exit()
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            exit()
+        return self.locationlist
 
 
-    def get_next_measurement_index(self, available_dates : list, hour_range : list) -> int :
-        """The method returns the hour index for which measurement are available. The return entry is based on the order of the given range.
+    def add_missing_measurements(self, measurements : pd.DataFrame, start_from : datetime.datetime, hours : int = 24) -> pd.DataFrame :
+        """If measurements for some hours are missing, we add the missing measurement based on the average of the two closest values.
+        If only earlier or only later measurements are available, the closest one is used.
 
         Args:
-            available_dates (list): List of dates for which measurements are available
-            hour_range (list): List of hour index that should be check, the order of elements defines the priority
+            measurements (DataFrame): hourly measurements of one location, indexed by time
+            start_from (datetime): date that indicates the first entry
+            hours (int): number of hourly entries
 
         Returns:
-            int : index of the next available data entry
+            DataFrame : measurements for all hours
         """
-        available_hours = [datetime.datetime.fromisoformat(date.replace('T', ' ')).hour for date in available_dates]
-        for i in hour_range:
-            if i in available_hours:
-                return i
-        return None
-    
-    def add_missing_measurements(self, measurements : dict, measurement_type : str, start_from : datetime.date):
-        """if measurements for the last 24 hours are missing, we add the missing measurement based on the average of the two closet values 
+        time = pd.date_range(start_from, periods=hours, freq='h')
+        missing = time.difference(measurements.index)
+        for date_hour in missing:
+            print(date_hour.strftime('%Y-%m-%dT%H:%M:%S+00:00'))
 
-        Args:
-            measurements (dict): dictionary with all provided measurements
-            measurement_type (str): name of the measurement: salinity or turbidity
-            start_from (date): date that indicates the first entry
-        """
-        available_hours = list(measurements.keys())
-        
-        for hour in range(24):
-            date_hour =  start_from + datetime.timedelta(hours=hour)
-            date_hour_str = date_hour.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-            # print(date_hour_str)
-            if not (date_hour_str in available_hours):
-                print(date_hour_str)
-                prev_hours = range(hour - 1, -1, -1)
-                prev_hour = self.get_next_measurement_index(available_hours, prev_hours)
-                prev_measurement = None
-                if prev_hour:
-                    prev_date_hour =  start_from + datetime.timedelta(hours=prev_hour)
-                    prev_date_hour_str = prev_date_hour.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-                    prev_measurement = measurements[prev_date_hour_str]
-                
-                next_hours = range(hour + 1, 24)
-                next_hour = self.get_next_measurement_index(available_hours, next_hours)
-                next_measurement = None
-                if next_hour:
-                    next_date_hour =  start_from + datetime.timedelta(hours=next_hour)
-                    next_date_hour_str = next_date_hour.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-                    next_measurement = measurements[next_date_hour_str]
-
-                if measurement_type == "salinity":
-                    if prev_measurement and next_measurement:
-                        measurements[date_hour_str] = {"conductivity": (prev_measurement["conductivity"] + next_measurement["conductivity"]) / 2.0, "temperature": (prev_measurement["temperature"] + next_measurement["temperature"]) / 2.0}
-                    elif prev_measurement and next_measurement == None:
-                        measurements[date_hour_str] = {"conductivity": prev_measurement["conductivity"], "temperature": prev_measurement["temperature"]}
-                    elif next_measurement and prev_measurement == None:
-                        measurements[date_hour_str] = {"conductivity": next_measurement["conductivity"], "temperature": prev_measurement["temperature"]}
-                elif measurement_type == "turbidity":
-                    if prev_measurement and next_measurement:
-                        measurements[date_hour_str] = {"turbidity": (prev_measurement["turbidity"] + next_measurement["turbidity"]) / 2.0}
-                    elif prev_measurement and next_measurement == None:
-                        measurements[date_hour_str] = {"turbidity": prev_measurement["turbidity"]}
-                    elif next_measurement and prev_measurement == None:
-                        measurements[date_hour_str] = {"turbidity": next_measurement["turbidity"]}
-        return measurements
-                
+        measurements = measurements.reindex(time)
+        prev_measurement = measurements.ffill()
+        next_measurement = measurements.bfill()
+        return ((prev_measurement + next_measurement) / 2.0).fillna(prev_measurement).fillna(next_measurement)
 
-    def query_data_API(self, start_datetime, end_datetime):
+    def stream_records_API(self, measurement_type, fields, date_from_str, date_to_str, locations=None):
         """
-        Pulls sensordata from the API and creates a netCDF file with hourly values
+        Pulls the records of one measurement type from the API, one page of
+        page_size records at a time, and yields them one by one.
+        Records are ordered by record time and record_id, and each page starts
+        after the last record of the previous page (keyset paging), so that
+        records with equal record times are neither skipped nor repeated.
+        Raises requests.RequestException if a request fails
         Required variables:
-            start_datetime
-            end_datetime
-        """        
-        # Set the start and end dates
-        start_from = start_datetime
-        end_to = end_datetime
-        end_to_turbidity = end_to
-
-
-        # Format the dates as strings
-        date_from_str = start_from.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-        date_to_str_salinity = end_to.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-        date_to_str_turbidity = end_to_turbidity.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-
-        # Your GraphQL query with variables and formatted dates
-        graphql_query = f"""
-        query APIQuery {{
-            salinity(where: {{record_time: {{_gte: "{date_from_str}", _lt: "{date_to_str_salinity}"}}}}) {{
-                temperature
-                conductivity
-                location
-                record_time
-            }}
-            turbidity(where: {{record_time: {{_gte: "{date_from_str}", _lt: "{date_to_str_turbidity}"}}}}) {{
-                record_time
-                turbidity
-                location
+            measurement_type: salinity or turbidity
+            fields: list of fields to pull
+            date_from_str
+            date_to_str
+        Optional variables:
+            locations: list of coordinates, only records from these locations are pulled
+        """
+        where = {"record_time": {"_gte": date_from_str, "_lt": date_to_str}}
+        if locations is not None:
+            where["location"] = {"_in": [{"type": "Point", "coordinates": list(location)}
+                                         for location in locations]}
+        if self.record_id not in fields:
+            fields = fields + [self.record_id]
+
+        paged_query = f"""
+        query APIQuery($where: {measurement_type}_bool_exp!, $limit: Int!) {{
+            {measurement_type}(where: $where, order_by: [{{record_time: asc}}, {{{self.record_id}: asc}}], limit: $limit) {{
+                {" ".join(fields)}
             }}
         }}
         """
 
-        try:
-            response = requests.post(self.hasura_url, json={"query": graphql_query}, headers=self.headers)
-
-            if response.status_code == 200:
-                salinity_data = response.json()["data"]["salinity"]
-                turbidity_data = response.json()["data"]["turbidity"]
-
-                if salinity_data and turbidity_data:
-                    print("Response successful")
-
-                count = 0
+        page_where = where
+        while True:
+            page = self.post_query(paged_query, {"where": page_where, "limit": self.page_size})[measurement_type]
+            yield from page
 
-                for location in self.locationlist:
-                    count+=1
-                    filtered_salinity_data = [data for data in salinity_data if data["location"]["coordinates"] == location]
-                    filtered_turbidity_data = [data for data in turbidity_data if data["location"]["coordinates"] == location]
+            if len(page) < self.page_size:
+                break
+            last = page[-1]
+            page_where = {"_and": [where, {"_or": [
+                {"record_time": {"_gt": last["record_time"]}},
+                {"record_time": {"_eq": last["record_time"]},
+                 self.record_id: {"_gt": last[self.record_id]}}]}]}
 
-                    # Calculate hourly average for salinity and turbidity
-                    salinity_hourly_avg = self.calculate_hourly_average(filtered_salinity_data, "salinity")
-                    turbidity_hourly_avg = self.calculate_hourly_average(filtered_turbidity_data, "turbidity")  
-    
-                    # length = len(salinity_hourly_avg)
-                    print(f"salinity length: {len(salinity_hourly_avg)}, turbidity length: {len(turbidity_hourly_avg)}")
-                    
-                    if (len(salinity_hourly_avg) < 24):
-                        salinity_hourly_avg = self.add_missing_measurements(salinity_hourly_avg, "salinity", start_from)
-
-                    if (len(turbidity_hourly_avg) < 24):
-                        turbidity_hourly_avg = self.add_missing_measurements(turbidity_hourly_avg, "turbidity", start_from)
-
-                    if (len(salinity_hourly_avg) != len(turbidity_hourly_avg)):
-                        print(f"Data mismatch: Salinity: {len(salinity_hourly_avg)} Turbidity: {len(turbidity_hourly_avg)}")
-
-                    # create joined start date and end date => time frame
-                    # create access data 
-
-                    # Extract relevant data from GraphQL response
-                    depth = np.linspace(0, 100, 10, dtype=np.float64)
-
-                    # Extract sea water salinity, temperature, and turbidity data from the API
-                    sea_water_salinity_data = np.array([(value["conductivity"]) for value in salinity_hourly_avg.values()])
-                    sea_water_temperature_data = np.array([(value["temperature"]) for value in salinity_hourly_avg.values()])
-                    sea_water_turbidity_data = np.array([(value["turbidity"]) for value in turbidity_hourly_avg.values()])
-                    
-                    sensor_lat, sensor_lon = location[1], location[0]
-                    
-
-                    num_points = 100  # number of data points along lat and lon
-                    lon = np.linspace(sensor_lon - 0.005, sensor_lon + 0.005, num_points)
-                    lat = np.linspace(sensor_lat - 0.005, sensor_lat + 0.005, num_points)
+    def query_hourly_average_API(self, measurement_type, start_datetime, end_datetime, locations=None):
+        """
+        Pulls the records of one measurement type from the API and averages them per location and hour
+        Required variables:
+            measurement_type: salinity or turbidity
+            start_datetime
+            end_datetime
+        Optional variables:
+            locations: list of coordinates, only records from these locations are pulled
+        """
+        if measurement_type == "salinity":
+            fields = ["temperature", "conductivity", "location", "record_time"]
+        else:
+            fields = ["record_time", "turbidity", "location"]
 
-                    min_datetime = min(salinity_hourly_avg.keys())
-                    start_date_time = datetime.datetime.fromisoformat(min_datetime.replace('T', ' ').replace('+00:00', '')).strftime('%Y-%m-%d %H:%M:%S')
+        # Format the dates as strings
+        date_from_str = start_datetime.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        date_to_str = end_datetime.strftime('%Y-%m-%dT%H:%M:%S+00:00')
 
-                    max_datetime = max(salinity_hourly_avg.keys())
-                    end_date_time = datetime.datetime.fromisoformat(max_datetime.replace('T', ' ').replace('+00:00', '')).strftime('%Y-%m-%d %H:%M:%S')
+        return self.calculate_hourly_average(self.stream_records_API(
+            measurement_type, fields, date_from_str, date_to_str, locations), measurement_type)
 
+    def query_data_API(self, start_datetime, end_datetime):
+        """
+        Pulls sensordata from the API and returns a SensorReader with hourly values
+        Raises requests.RequestException if a request fails
+        Required variables:
+            start_datetime
+            end_datetime
+        """
+        # Only pull records from the known locations
+        locations = self.locationlist if self.locationlist else None
+        salinity_data = self.query_hourly_average_API("salinity", start_datetime, end_datetime, locations)
+        turbidity_data = self.query_hourly_average_API("turbidity", start_datetime, end_datetime, locations)
 
-                    # Change date according to run. Husk set opp metode så man slipper endre her
-                    time = pd.date_range(start_date_time, end_date_time, freq='H')  # hourly data
+        return self.create_sensor_reader(salinity_data, turbidity_data, start_datetime, end_datetime)
 
+    async def query_API_async(self, start_datetime, end_datetime):
+        """
+        Runs the location query and the salinity and turbidity queries concurrently,
+        and returns the locations and a SensorReader with hourly values.
+        The data queries can not be limited to the locations, which are not known yet.
+        Raises requests.RequestException if a request fails
+        Required variables:
+            start_datetime
+            end_datetime
+        """
+        loop = asyncio.get_running_loop()
+        locations, salinity_data, turbidity_data = await asyncio.gather(
+            loop.run_in_executor(None, self.query_location_API, start_datetime, end_datetime),
+            loop.run_in_executor(None, self.query_hourly_average_API, "salinity", start_datetime, end_datetime),
+            loop.run_in_executor(None, self.query_hourly_average_API, "turbidity", start_datetime, end_datetime))
 
-                    depth = np.linspace(0, 100, 10)  # change this to your depth data
+        return locations, self.create_sensor_reader(salinity_data, turbidity_data, start_datetime, end_datetime)
 
+    def create_sensor_reader(self, salinity_data, turbidity_data, start_datetime, end_datetime):
+        """
+        Creates a SensorReader with hourly values of all locations
+        Required variables:
+            salinity_data: hourly salinity averages from calculate_hourly_average
+            turbidity_data: hourly turbidity averages from calculate_hourly_average
+            start_datetime
+            end_datetime
+        """
+        # Set the start and end dates
+        start_from = start_datetime
+        end_to = end_datetime
 
-                    sea_water_salinity = np.zeros((len(time), len(depth), len(lat), len(lon)))
-                    sea_water_temperature = np.zeros((len(time), len(depth), len(lat), len(lon)))
-                    sea_water_turbidity = np.zeros((len(time), len(depth), len(lat), len(lon)))
+        if not salinity_data.empty and not turbidity_data.empty:
+            print("Response successful")
 
+        hours = int((end_to - start_from).total_seconds() / 3600)
+        time = pd.date_range(start_from, periods=hours, freq='h')  # hourly data
+        sensor_lons = [location[0] for location in self.locationlist]
+        sensor_lats = [location[1] for location in self.locationlist]
+        sea_water_salinity = np.full((len(self.locationlist), hours), np.nan)
+        sea_water_temperature = np.full((len(self.locationlist), hours), np.nan)
+        sea_water_turbidity = np.full((len(self.locationlist), hours), np.nan)
+        count = 0
 
-                    for i, key in enumerate(salinity_hourly_avg.keys()):
-                        sea_water_salinity[i, :, :, :] = sea_water_salinity_data[i]
-                        sea_water_temperature[i, :, :, :] = sea_water_temperature_data[i]
+        for location in self.locationlist:
+            count+=1
+            sensor_lon, sensor_lat = location[0], location[1]
 
-                    
+            salinity_hourly_avg = self.location_measurements(salinity_data, sensor_lon, sensor_lat)
+            turbidity_hourly_avg = self.location_measurements(turbidity_data, sensor_lon, sensor_lat)
 
-                    for i, key in enumerate(turbidity_hourly_avg.keys()):
-                        sea_water_turbidity[i, :, :, :] = sea_water_turbidity_data[i]
-                    
+            # length = len(salinity_hourly_avg)
+            print(f"salinity length: {len(salinity_hourly_avg)}, turbidity length: {len(turbidity_hourly_avg)}")
+            
+            if (len(salinity_hourly_avg) < hours):
+                salinity_hourly_avg = self.add_missing_measurements(salinity_hourly_avg, start_from, hours)
 
-                    if count == 1:
-                        ds = xr.Dataset(
-                            {"sea_water_salinity": (("time", "depth", "lat", "lon"), sea_water_salinity),
-                            "sea_water_temperature": (("time", "depth", "lat", "lon"), sea_water_temperature),
-                            "sea_water_turbidity": (("time", "depth", "lat", "lon"), sea_water_turbidity)},
-                            coords={"lon": lon, "lat": lat, "depth": depth, "time": time},
-                        )
+            if (len(turbidity_hourly_avg) < hours):
+                turbidity_hourly_avg = self.add_missing_measurements(turbidity_hourly_avg, start_from, hours)
 
-                    else:
-                        ds += xr.Dataset(
-                            {"sea_water_salinity": (("time", "depth", "lat", "lon"), sea_water_salinity),
-                            "sea_water_temperature": (("time", "depth", "lat", "lon"), sea_water_temperature),
-                            "sea_water_turbidity": (("time", "depth", "lat", "lon"), sea_water_turbidity)},
-                            coords={"lon": lon, "lat": lat, "depth": depth, "time": time},
-                        )
+            if (len(salinity_hourly_avg) != len(turbidity_hourly_avg)):
+                print(f"Data mismatch: Salinity: {len(salinity_hourly_avg)} Turbidity: {len(turbidity_hourly_avg)}")
 
-                ds.attrs['Conventions'] = 'CF-1.6'
-                ds.attrs['standard_name_vocabulary'] = 'CF-1.6'
+            # One value per sensor and hour
+            sea_water_salinity[count-1] = salinity_hourly_avg["conductivity"].reindex(time).to_numpy()
+            sea_water_temperature[count-1] = salinity_hourly_avg["temperature"].reindex(time).to_numpy()
+            sea_water_turbidity[count-1] = turbidity_hourly_avg["turbidity"].reindex(time).to_numpy()
 
-                # Add the standard_name attribute to the salinity variable: improtant to get environment variable
-                ds.sea_water_salinity.attrs['standard_name'] = 'salinity'
-                ds.sea_water_temperature.attrs['standard_name'] = 'temperature'
-                ds.sea_water_turbidity.attrs['standard_name'] = 'turbidity'
+        sensor_reader = SensorReader(
+            time.to_pydatetime(), sensor_lons, sensor_lats,
+            {"salinity": sea_water_salinity,
+             "temperature": sea_water_temperature,
+             "turbidity": sea_water_turbidity})
 
-                # Save the data to a NetCDF file
-                ds.to_netcdf("sensor_data.nc")
+        print("Creation of sensor reader successful with variables: " + str(sensor_reader.variables))
+        print("===============================================\n\n")
 
-                # Open the saved NetCDF file as a reader and check the variable attributes
-                reader_salinity = reader_netCDF_CF_generic.Reader('sensor_data.nc')
-                
-                print("Creation of netCDF file successful with variables: " + str(reader_salinity.variables))
-                print("===============================================\n\n")
+        return sensor_reader
 
 
-            else:
-                # Print an error message if the request was not successful
-                print(f"Error: {response.status_code} - {response.text}")
-                exit()
+    def location_measurements(self, hourly_average, lon, lat):
+        """
+        Hourly averages of one location, indexed by time
+        Required variables:
+            hourly_average: DataFrame from calculate_hourly_average
+            lon
+            lat
+        """
+        try:
+            return hourly_average.loc[(lon, lat)]
+        except KeyError:
+            return hourly_average.iloc[0:0].droplevel(["lon", "lat"])
 
-        except requests.ConnectionError:
-            print("Error: Unable to connect to the Hasura API. Please check the server.")
-            exit()
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            exit()
-            
-        
     def calculate_hourly_average(self, data, type):
         """
-        Calculated hourly average
+        Calculates hourly averages per location for all records at once.
+        Returns a DataFrame indexed by location (lon, lat) and hour, with one
+        column per measured variable
         Required variables:
-            data
-            type
-        """      
-                        
-        hourly_average = {}
-        # Unique locations
-
+            data: iterable of records
+            type: salinity or turbidity
+        """
         if type == "salinity":
-            for entry in data:
-                record_time = datetime.datetime.fromisoformat(entry["record_time"])
-                hour_key = record_time.replace(minute=0, second=0, microsecond=0).isoformat()
-
-                location = entry["location"]["coordinates"]
-                key = (hour_key)
-
-                if key not in hourly_average:
-                    hourly_average[key] = {
-                        "temperature_sum": 0,
-                        "conductivity_sum": 0,
-                        "count": 0,
-                        "coordinates": location  # Save location coordinates
-                    }
-
-                hourly_average[hour_key]["temperature_sum"] += entry["temperature"]
-                hourly_average[hour_key]["conductivity_sum"] += entry["conductivity"]
-                #hourly_average[hour_key]["coordinates"] = entry["location"]["coordinates"]
-                hourly_average[hour_key]["count"] += 1
-
-            for key, value in hourly_average.items():
-                value["temperature"] = value["temperature_sum"] / value["count"]
-                value["conductivity"] = value["conductivity_sum"] / value["count"]
-                del value["temperature_sum"]
-                del value["conductivity_sum"]
-                del value["count"]
-
-
-            return hourly_average
-        
-
+            fields = ["temperature", "conductivity"]
         else:
-            for entry in data:
-                record_time = datetime.datetime.fromisoformat(entry["record_time"])
-                hour_key = record_time.replace(minute=0, second=0, microsecond=0).isoformat()
-
-                if hour_key not in hourly_average:
-                    hourly_average[hour_key] = {
-                        "turbidity_sum": 0,
-                        "count": 0
-                    }
+            fields = ["turbidity"]
 
-                hourly_average[hour_key]["turbidity_sum"] += entry["turbidity"]
-                hourly_average[hour_key]["count"] += 1
+        columns = ["lon", "lat", "record_time"] + fields
+        records = pd.DataFrame.from_records(
+            ((*entry["location"]["coordinates"], entry["record_time"], *[entry[field] for field in fields])
+             for entry in data), columns=columns)
 
-            for key, value in hourly_average.items():
-                value["turbidity"] = value["turbidity_sum"] / value["count"]
-                del value["turbidity_sum"]
-                del value["count"]
+        # Floor record times to the hour, in UTC without timezone as the simulation times
+        records["time"] = pd.to_datetime(records["record_time"], utc=True, format='ISO8601').dt.tz_convert(None).dt.floor('h')
+        return records.groupby(["lon", "lat", "time"])[fields].mean()
 
-            return hourly_average
-    
 
-    def data_for_mutation(self, json_data):
+    def post_mutation_chunk(self, mutation_query, objects, session=None):
         """
-        Prepares data for mutation
+        Posts one chunk of simulation rows and returns the number of affected rows
+        of the last mutation of the query
         Required variables:
-            json_data
-        """    
-        # Append the JSON data to the results list
-        self.results.append(json.loads(json_data))
-
-
-    def mutation_data_API(self):    
+            mutation_query
+            objects
+        Optional variables:
+            session: defaults to self.session, which retries failed requests
         """
-        Post data to the API
-        """         
-        # GraphQL mutation with variables
-        mutation_query = """
-        mutation MyMutation($objects: [simulations_insert_input!]!) {
-          insert_simulations(objects: $objects) {
-            affected_rows
-          }
-        }
-        """
-
-        # Prepare the payload with variables
-        payload = {
-            "query": mutation_query,
-            "variables": {
-                "objects": self.results
-            }
-        }
+        session = self.session if session is None else session
+        payload = {"query": mutation_query, "variables": {"objects": objects}}
+        response = session.post(self.hasura_url, headers=self.headers, json=payload)
         try:
-            # Make the HTTP POST request
-            response = requests.post(self.hasura_url, headers=self.headers, json=payload)
-
-            # Check the response
-            if response.status_code == 200:
-                print("Mutation successful")
-                print(response.json())
-            else:
-                print("Mutation failed")
-                print(response.text)
-                exit()
-        except requests.RequestException as e:
-            print(f"Error during HTTP request: {e}")
-            exit()
-
-    def reset_data_API(self):
-
-        mutation_query = """
-        mutation MyMutation {
-            delete_simulations(where: {id_sim: {_gt: 0}}) {
+            result = response.json()
+        except ValueError:
+            raise requests.RequestException(f"Mutation failed: {response.text}")
+        if response.status_code != 200 or "errors" in result:
+            raise requests.RequestException(f"Mutation failed: {response.text}")
+        return list(result["data"].values())[-1]["affected_rows"]
+
+    def bulk_mutation_data_API(self, objects, chunk_size=1000, upsert_constraint=upsert_constraint):
+        """
+        Post simulation rows to the API, and return the number of rows posted.
+        Raises requests.RequestException if posting fails.
+        Required variables:
+            objects: list of simulation rows
+        Optional variables:
+            chunk_size: number of rows per request when upserting
+            upsert_constraint: unique constraint on (grid_id, record_time) of the simulations
+                               table. Existing rows are updated instead of inserted again, in
+                               chunks sent concurrently over the pooled session, and retried
+                               as upserts can safely be repeated. If None, all rows of the
+                               table are instead replaced in one request, which Hasura runs
+                               as a single transaction
+        """
+        if upsert_constraint is None:
+            mutation_query = """
+            mutation MyMutation($objects: [simulations_insert_input!]!) {
+              delete_simulations(where: {id_sim: {_gt: 0}}) {
+                affected_rows
+              }
+              insert_simulations(objects: $objects) {
                 affected_rows
+              }
             }
-        }
+            """
+            affected_rows = self.post_mutation_chunk(mutation_query, objects,
+                                                     session=self.mutation_session)
+            print(f"Mutation successful: replaced all rows with {affected_rows} rows")
+            return affected_rows
+
+        mutation_query = f"""
+        mutation MyMutation($objects: [simulations_insert_input!]!) {{
+          insert_simulations(objects: $objects, on_conflict: {{constraint: {upsert_constraint},
+                             update_columns: [conductivity, temperature, turbidity, changed]}}) {{
+            affected_rows
+          }}
+        }}
         """
-        try:
-            response = requests.post(self.hasura_url, json={"query": mutation_query}, headers=self.headers)
-            if response.status_code == 200:
-                print("Reset successful")
-                print(response.json())
-            else:
-                print("Reset failed")
-                print(response.text)
-                exit()
-        except requests.RequestException as e:
-            print(f"Error during HTTP request: {e}")
-            exit()
+        chunks = [objects[i:i + chunk_size] for i in range(0, len(objects), chunk_size)]
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            affected_rows = sum(executor.map(
+                lambda chunk: self.post_mutation_chunk(mutation_query, chunk), chunks))
+        print(f"Mutation successful: {affected_rows} rows in {len(chunks)} chunks")
+        return affected_rows
 
     def cdf_reader(self):
         data = nc.Dataset('hasura_data_hourly.nc', 'r+')
@@ -2,9 +2,10 @@ from opendrift.models import basemodel
 from opendrift.models.oceandrift import OceanDrift 
 from datetime import datetime, timedelta 
 import logger
+import os
 
 from HydroParticle import HydroParticle 
-from VirtualLander import VirtualLander
+from VirtualLanderGrid import VirtualLanderGrid
 import numpy as np
 import csv
 
@@ -12,8 +13,6 @@ class HydroDrift(OceanDrift):
 
     ElementType = HydroParticle
 
-    lander_list = []
-
     count = 0
 
     # Could set the z limits, but need more information
@@ -432,41 +431,107 @@ class HydroDrift(OceanDrift):
         #print(location_lat_list)
         #print(location_lon_list)
 
-        id = 1
-
-        for lon in range(len(location_lon_list)):
-            for lat in range(len(location_lat_list)):
+        self.lander_grid = VirtualLanderGrid(location_lat_list, location_lon_list, starttime, seed_length)
 
-                if not (lat == len(location_lat_list)-1 or lon == len(location_lon_list)-1):
-                    lander = VirtualLander(id)
-                    lander.create_lander(location_lat_list[lat], location_lat_list[lat+1], location_lon_list[lon], location_lon_list[lon+1], starttime, seed_length) 
-                    self.lander_list.append(lander)
-                    id+=1
-
-        print(str(len(self.lander_list)) + " landers have been created!")
+        print(str(len(self.lander_grid)) + " landers have been created!")
         print("===============================================\n\n")
 
 
     def update_lander(self):
         '''
-        Method to cupdate lander values
+        Method to update lander values.
+        All particles are mapped to their landers at once with the lander index,
+        and the values are aggregated per lander with a running average
+        (see VirtualLanderGrid.update_landers).
         '''
         current_sim_time = self.time
-        for i in range(len(self.elements.ID)):
-            for lander in self.lander_list:
-                if (lander.contains(self.elements.lat[i], self.elements.lon[i])):
-                    lander.update_lander(self.elements.salinity[i], self.elements.temperature[i], self.elements.turbidity[i], current_sim_time)
-                    
+        self.lander_grid.update_landers(self.elements.lat, self.elements.lon,
+                                        self.elements.salinity, self.elements.temperature,
+                                        self.elements.turbidity, current_sim_time)
+
 
     def smooth_landerlist(self):
         '''
         Method to smoothen the values of the landers. This wil only affect the landers with the change set to True
         '''
-    
-        for lander in self.lander_list:
-            if lander.change == True:
-                lander.smoother()
-                
+        self.lander_grid.smooth()
+
+
+    def write_checkpoint(self, filename):
+        '''
+        Method to store the active particles and the lander values before smoothing,
+        so that the next run can continue from the end of this run
+        Required variables:
+            filename
+        '''
+        num_elements = self.num_elements_active()
+        state = {
+            'time': np.datetime64(self.time, 's'),
+            'lander_starttime': np.datetime64(self.lander_grid.starttime, 's'),
+            'lander_salinity': self.lander_grid.salinity,
+            'lander_temperature': self.lander_grid.temperature,
+            'lander_turbidity': self.lander_grid.turbidity,
+            'lander_change': self.lander_grid.change,
+        }
+        # ID and status are set again when the particles are seeded
+        for name in self.elements.variables:
+            if name not in ('ID', 'status'):
+                state['element_' + name] = np.broadcast_to(getattr(self.elements, name), num_elements)
+
+        # Replace the previous checkpoint only when the new one is complete
+        with open(filename + '.tmp', 'wb') as file:
+            np.savez(file, **state)
+        os.replace(filename + '.tmp', filename)
+
+    @staticmethod
+    def checkpoint_time(filename, end_time, seed_length):
+        '''
+        Method to get the time of the particles in a checkpoint, if a run of
+        seed_length hours ending at end_time can continue from it, otherwise None
+        Required variables:
+            filename
+            end_time
+            seed_length
+        '''
+        if filename is None or not os.path.exists(filename):
+            return None
+
+        with np.load(filename) as state:
+            time = state['time'].item()
+            same_length = state['lander_change'].shape[1] == seed_length
+
+        delta = end_time - time
+        if not same_length or delta <= timedelta(0) or delta >= timedelta(hours=seed_length) \
+                or delta % timedelta(hours=1):
+            return None
+        return time
+
+    def seed_from_checkpoint(self, filename, starttime):
+        '''
+        Method to continue from a previous run. The particles of the checkpoint
+        seeded after starttime are seeded again with their stored state, and the
+        lander values of the hours after starttime are kept.
+        Required variables:
+            filename
+            starttime
+        '''
+        with np.load(filename) as state:
+            time = state['time'].item()
+            self.lander_grid.restore(state['lander_starttime'].item(), state['lander_salinity'],
+                                     state['lander_temperature'], state['lander_turbidity'],
+                                     state['lander_change'])
+
+            keep = state['element_age_seconds'] <= (time - starttime).total_seconds()
+            elements = {name[len('element_'):]: state[name][keep]
+                        for name in state.files if name.startswith('element_')}
+
+        num_elements = int(keep.sum())
+        print(str(num_elements) + " particles continued from " + str(time))
+        if num_elements > 0:
+            lon = elements.pop('lon')
+            lat = elements.pop('lat')
+            self.seed_elements(lon=lon, lat=lat, time=time, number=num_elements, **elements)
+
 
     def write_landers_to_csv(self):
         '''
@@ -475,7 +540,7 @@ class HydroDrift(OceanDrift):
         with open('lander_results.csv', 'w', newline='') as file:
             writer = csv.writer(file)
 
-            for lander in self.lander_list:
+            for lander in self.lander_grid:
                 #if lander.change == True:              
                     writer.writerow([f"Lander {lander.id} has center location {lander.center_lat} {lander.center_lon}"])
                     writer.writerow([f"Grid size Min: {lander.minlon} {lander.minlat}, Max: {lander.maxlon} {lander.maxlat}"])
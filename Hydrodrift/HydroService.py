@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+
+from API import QueryAPI
+from HydroDrift import HydroDrift
+from main import create_readers, run_drift
+
+class HydroService():
+    '''
+    Long running HydroDrift service.
+    The ocean model readers, the lander grid and the imported OpenDrift modules
+    are kept between runs, so only the sensor data is pulled for every run.
+    Runs are requested through a local queue, or through the HTTP endpoint:
+        POST /run {"end_time": "2024-04-16T00:00:00", "seed_length": 24,
+                   "sensors": [[lon, lat], ...]}
+        GET /run/<id>
+    Only end_time is required, sensors defaults to all sensors with data.
+    Runs are done one at a time, in the order they were requested.
+    '''
+
+    def __init__(self, queryAPI=None, metrological_model=None, checkpoint=None):
+        '''
+        Optional variables:
+            queryAPI: QueryAPI used for all runs
+            metrological_model: ocean model reader, FjordOS is opened on the first run if not given
+            checkpoint: file to continue each run from the previous one, see run_drift
+        '''
+        self.queryAPI = queryAPI if queryAPI is not None else QueryAPI()
+        self.metrological_model = metrological_model
+        self.checkpoint = checkpoint
+        self.lander_grid = None
+
+        self.requests = queue.Queue()
+        self.runs = {}
+        self._run_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, end_time, seed_length=24, sensors=None):
+        '''
+        Method to queue a run, returns the id of the run
+        Required variables:
+            end_time
+        Optional variables:
+            seed_length
+            sensors: list of [lon, lat] sensor locations to seed from
+        '''
+        with self._lock:
+            run_id = next(self._run_ids)
+            self.runs[run_id] = {"id": run_id, "status": "queued",
+                                 "end_time": str(end_time), "seed_length": seed_length}
+        self.requests.put((run_id, end_time, seed_length, sensors))
+        return run_id
+
+    def status(self, run_id):
+        '''
+        Method to get the status of a run, None if the run is unknown
+        '''
+        with self._lock:
+            run = self.runs.get(run_id)
+            return dict(run) if run is not None else None
+
+    def _set_status(self, run_id, **kwargs):
+        with self._lock:
+            self.runs[run_id].update(kwargs)
+
+    def run(self, end_time, seed_length=24, sensors=None):
+        '''
+        Method to run the model once, with the readers and landers of the service
+        Required variables:
+            end_time
+        Optional variables:
+            seed_length
+            sensors: list of [lon, lat] sensor locations to seed from
+        '''
+        start_time = end_time - timedelta(hours=seed_length)
+        # Sensor data is only needed for the hours after the checkpoint
+        data_start = HydroDrift.checkpoint_time(self.checkpoint, end_time, seed_length) or start_time
+
+        if self.metrological_model is None:
+            reader_norkyst, self.metrological_model = create_readers()
+
+        # Locations are collected per run
+        self.queryAPI.locationlist = []
+        if sensors:
+            self.queryAPI.locationlist = [list(location) for location in sensors]
+        else:
+            self.queryAPI.query_location_API(data_start, end_time)
+        locations = self.queryAPI.locationlist
+        lander_reader = self.queryAPI.query_data_API(data_start, end_time)
+
+        drift = run_drift(start_time, end_time, seed_length, self.queryAPI, locations,
+                          lander_reader, self.metrological_model, self.lander_grid,
+                          self.checkpoint)
+        self.lander_grid = drift.lander_grid
+
+    def work(self):
+        '''
+        Method to run the queued runs until None is queued
+        '''
+        while True:
+            request = self.requests.get()
+            if request is None:
+                self.requests.task_done()
+                break
+            run_id, end_time, seed_length, sensors = request
+            self._set_status(run_id, status="running")
+            try:
+                self.run(end_time, seed_length, sensors)
+                self._set_status(run_id, status="done")
+            # Failed runs must not stop the service
+            except Exception as e:
+                self._set_status(run_id, status="failed", error=str(e))
+            finally:
+                self.requests.task_done()
+
+    def start(self):
+        '''
+        Method to start the worker thread running the queued runs
+        '''
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self.work, daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        '''
+        Method to stop the worker thread after the queued runs
+        '''
+        if self._worker is not None:
+            self.requests.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def serve(self, host="0.0.0.0", port=8000):
+        '''
+        Method to start the worker and answer run requests over HTTP until interrupted
+        '''
+        self.start()
+        server = ThreadingHTTPServer((host, port), self.request_handler())
+        print(f"HydroDrift service listening on {host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stop()
+
+    def request_handler(self):
+        '''
+        Request handler class for the HTTP endpoint of this service
+        '''
+        service = self
+
+        class HydroServiceHandler(BaseHTTPRequestHandler):
+
+            def send_json(self, code, body):
+                content = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/run":
+                    self.send_json(404, {"error": "Unknown path"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    end_time = datetime.fromisoformat(body["end_time"])
+                    seed_length = int(body.get("seed_length", 24))
+                    sensors = body.get("sensors")
+                except (KeyError, TypeError, ValueError) as e:
+                    self.send_json(400, {"error": f"Invalid run request: {e}"})
+                    return
+                run_id = service.submit(end_time, seed_length, sensors)
+                self.send_json(202, service.status(run_id))
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 2 and parts[0] == "run" and parts[1].isdigit():
+                    run = service.status(int(parts[1]))
+                    if run is not None:
+                        self.send_json(200, run)
+                        return
+                self.send_json(404, {"error": "Unknown run"})
+
+            def log_message(self, format, *args):
+                pass
+
+        return HydroServiceHandler
+
+
+if __name__ == "__main__":
+    '''
+    Args:
+    1: Port, defaults to HYDRODRIFT_PORT or 8000
+    '''
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv('HYDRODRIFT_PORT', 8000))
+    HydroService(checkpoint=os.getenv('HYDRODRIFT_CHECKPOINT')).serve(port=port)
@@ -0,0 +1,111 @@
+import numpy as np
+
+class LanderIndex():
+    '''
+    Grid index for the virtual landers.
+    The landers created by HydroDrift.create_landers_from_list form a regular
+    lat/lon grid, so the landers containing a position can be found with a
+    binary search on the cell edges instead of testing every lander.
+    '''
+
+    def __init__(self, lat_edges, lon_edges):
+        '''
+        Required variables:
+            lat_edges
+            lon_edges
+        '''
+        self.lat_edges = np.asarray(lat_edges, dtype=np.float64)
+        self.lon_edges = np.asarray(lon_edges, dtype=np.float64)
+        self.num_lat = len(self.lat_edges) - 1
+        self.num_lon = len(self.lon_edges) - 1
+        self.num_landers = self.num_lat * self.num_lon
+
+    def lander_index(self, ilat, ilon):
+        '''
+        Position in the lander list of the lander in cell (ilat, ilon).
+        Landers are created with longitude as the outer loop.
+        '''
+        return ilon * self.num_lat + ilat
+
+    def _axis_cells(self, edges, values):
+        '''
+        Lower and upper cell index containing each value along one axis.
+        The two only differ when a value lies exactly on a shared edge.
+        '''
+        lower = np.searchsorted(edges, values, side='left') - 1
+        upper = np.searchsorted(edges, values, side='right') - 1
+        return lower, upper
+
+    def locate(self, lat, lon):
+        '''
+        Method to find the landers containing each particle.
+        As with VirtualLander.contains, cell edges are inclusive, so a particle
+        on a shared edge belongs to every lander touching that edge.
+        Returns the particle and lander indices of all (particle, lander)
+        pairs, sorted by lander and keeping the particle order within each lander.
+        Required variables:
+            lat
+            lon
+        '''
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        particle = np.arange(len(lat))
+
+        lat_lower, lat_upper = self._axis_cells(self.lat_edges, lat)
+        lon_lower, lon_upper = self._axis_cells(self.lon_edges, lon)
+
+        candidates = [(particle, lat_lower, lon_lower)]
+        on_lat_edge = lat_lower != lat_upper
+        on_lon_edge = lon_lower != lon_upper
+        if on_lat_edge.any() or on_lon_edge.any():
+            both = on_lat_edge & on_lon_edge
+            candidates.append((particle[on_lat_edge], lat_upper[on_lat_edge], lon_lower[on_lat_edge]))
+            candidates.append((particle[on_lon_edge], lat_lower[on_lon_edge], lon_upper[on_lon_edge]))
+            candidates.append((particle[both], lat_upper[both], lon_upper[both]))
+
+        particle = np.concatenate([c[0] for c in candidates])
+        ilat = np.concatenate([c[1] for c in candidates])
+        ilon = np.concatenate([c[2] for c in candidates])
+
+        inside = (ilat >= 0) & (ilat < self.num_lat) & (ilon >= 0) & (ilon < self.num_lon)
+        particle = particle[inside]
+        lander = self.lander_index(ilat[inside], ilon[inside])
+
+        order = np.lexsort((particle, lander))
+        return particle[order], lander[order]
+
+    def running_average(self, lander, values, previous, changed):
+        '''
+        Method to aggregate particle values per lander.
+        Gives the same result as feeding the values one by one, in order: the
+        first value is taken as is if the lander has no value for the hour yet,
+        and every following value is averaged with the current one. This is a weighted sum where the k-th last value
+        has weight 1/2**k.
+        Required variables:
+            lander: sorted lander index of every (particle, lander) pair, from locate
+            values: dictionary of particle values for every pair
+            previous: dictionary of current values, indexed by lander
+            changed: whether each lander already has a value, indexed by lander
+        Returns the landers touched and a dictionary with their new values.
+        '''
+        landers, start, counts = np.unique(lander, return_index=True, return_counts=True)
+        group = np.repeat(np.arange(len(landers)), counts)
+        rank = np.arange(len(lander)) - start[group]
+        was_changed = np.asarray(changed)[landers]
+
+        # The first value replaces an unset lander value instead of being averaged
+        exponent = counts[group] - rank
+        exponent[(rank == 0) & ~was_changed[group]] -= 1
+        weights = np.ldexp(1.0, -exponent)
+        previous_weights = np.ldexp(1.0, -counts)
+
+        averages = {}
+        for name, value in values.items():
+            total = np.bincount(group, weights=weights*np.asarray(value, dtype=np.float64),
+                                minlength=len(landers))
+            # Unset lander values are NaN, and must not be weighted at all
+            previous_values = np.asarray(previous[name], dtype=np.float64)[landers]
+            total += np.where(was_changed, previous_weights*previous_values, 0.0)
+            averages[name] = total.astype(np.float32)
+
+        return landers, averages
@@ -0,0 +1,91 @@
+from opendrift.readers.basereader import BaseReader, ContinuousReader
+import numpy as np
+
+class SensorReader(BaseReader, ContinuousReader):
+    '''
+    Reader providing hourly sensor values in a square box around each sensor.
+    Only one value per sensor and hour is stored. Values are interpolated
+    linearly in time, and positions outside all sensor boxes get NaN so that
+    the next reader is used for them.
+    '''
+
+    def __init__(self, times, lons, lats, parameter_value_map, box_size=0.005, max_depth=100):
+        '''
+        Required variables:
+            times: list of datetimes
+            lons: longitude of each sensor
+            lats: latitude of each sensor
+            parameter_value_map: map {'variable_name': array (sensor, time), ...}
+        Optional variables:
+            box_size: half width in degrees of the box around each sensor
+            max_depth: depth in meters down to which the sensor values are used
+        '''
+        self.times = list(times)
+        self.sensor_lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        self.sensor_lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        self.box_size = box_size
+
+        for key, var in parameter_value_map.items():
+            parameter_value_map[key] = np.atleast_2d(np.asarray(var, dtype=np.float32))
+            if parameter_value_map[key].shape != (len(self.sensor_lons), len(self.times)):
+                raise ValueError('All variables must have shape (number of sensors, number of times)')
+
+        self._parameter_value_map = parameter_value_map
+        self._time_seconds = np.array([(t - self.times[0]).total_seconds() for t in self.times])
+        self.variables = list(parameter_value_map.keys())
+        self.proj4 = '+proj=latlong'
+        self.xmin = self.sensor_lons.min() - box_size
+        self.xmax = self.sensor_lons.max() + box_size
+        self.ymin = self.sensor_lats.min() - box_size
+        self.ymax = self.sensor_lats.max() + box_size
+        self.zmin = -max_depth
+        self.zmax = 0
+        self.start_time = self.times[0]
+        self.end_time = self.times[-1]
+        if len(self.times) > 1:
+            self.time_step = self.times[1] - self.times[0]
+        else:
+            self.time_step = None
+        self.name = 'sensor_reader'
+
+        # Run constructor of parent Reader class
+        super(SensorReader, self).__init__()
+
+    def nearest_sensor(self, x, y):
+        '''
+        Index of the closest sensor whose box contains each position, -1 if none
+        '''
+        dx = np.abs(x[:, np.newaxis] - self.sensor_lons)
+        dy = np.abs(y[:, np.newaxis] - self.sensor_lats)
+        inside = (dx <= self.box_size) & (dy <= self.box_size)
+        distance = np.where(inside, dx**2 + dy**2, np.inf)
+        sensor = np.argmin(distance, axis=1)
+        sensor[~inside.any(axis=1)] = -1
+        return sensor
+
+    def get_variables(self, requestedVariables, time=None,
+                      x=None, y=None, z=None):
+
+        x = np.atleast_1d(x)
+        y = np.atleast_1d(y)
+        variables = {'time': time, 'x': x, 'y': y, 'z': z}
+
+        # Linear interpolation between the two closest hours
+        seconds = (time - self.times[0]).total_seconds()
+        indxTime = np.clip(np.searchsorted(self._time_seconds, seconds, side='right') - 1,
+                           0, len(self.times) - 1)
+        indxAfter = min(indxTime + 1, len(self.times) - 1)
+        if indxAfter > indxTime:
+            weight_after = (seconds - self._time_seconds[indxTime]) / \
+                (self._time_seconds[indxAfter] - self._time_seconds[indxTime])
+        else:
+            weight_after = 0
+
+        sensor = self.nearest_sensor(x, y)
+        covered = sensor >= 0
+        for var in requestedVariables:
+            values = self._parameter_value_map[var]
+            series = (1 - weight_after)*values[:, indxTime] + weight_after*values[:, indxAfter]
+            variables[var] = np.where(covered, series[sensor], np.nan)
+
+        return variables
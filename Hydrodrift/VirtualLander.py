@@ -10,30 +10,56 @@ class VirtualLander():
     - Salinity
     - Temperature
     '''
-    maxlat, minlat, maxlon, minlon, center_lat, center_lon, particle_center_lat, particle_center_lon = 0, 0, 0, 0, 0, 0, 0 ,0
-    
-    
     df_salinity = None
     df_temperature = None
     df_turbidity = None
 
-    arr_salinity = []
-    arr_temperature = []
-    arr_turbidity = []
+    def __init__(self, id):
+        self.id = id
 
+        self.maxlat, self.minlat, self.maxlon, self.minlon = 0, 0, 0, 0
+        self.center_lat, self.center_lon = 0, 0
+        self.particle_center_lat, self.particle_center_lon = 0, 0
 
-    arr_datetime = []
-    arr_change = []
+        self.arr_salinity = []
+        self.arr_temperature = []
+        self.arr_turbidity = []
 
-    change = False
-    starttime = None
-    id= 0
-    seed_length = 0
+        self.arr_datetime = []
+        self.arr_change = []
 
-    def __init__(self, id):
-        self.id = id
-       
+        self.change = False
+        self.starttime = None
+        self.seed_length = 0
 
+    @classmethod
+    def from_grid(cls, grid, index):
+        '''
+        Method to create a lander viewing one row of a VirtualLanderGrid.
+        The value arrays are views, so changes are shared with the grid.
+        Required variables:
+            grid
+            index
+        '''
+        lander = cls(int(grid.id[index]))
+        lander.starttime = grid.starttime
+        lander.seed_length = grid.seed_length
+
+        lander.maxlat = grid.maxlat[index]
+        lander.minlat = grid.minlat[index]
+        lander.maxlon = grid.maxlon[index]
+        lander.minlon = grid.minlon[index]
+        lander.center_lat = grid.center_lat[index]
+        lander.center_lon = grid.center_lon[index]
+
+        lander.arr_salinity = grid.salinity[index]
+        lander.arr_temperature = grid.temperature[index]
+        lander.arr_turbidity = grid.turbidity[index]
+        lander.arr_change = grid.change[index]
+        lander.arr_datetime = grid.datetime
+
+        lander.change = bool(grid.lander_change[index])
+        return lander
 
     def create_lander(self, min_lat, max_lat, min_lon, max_lon, starttime, seed_length):
         '''
@@ -69,44 +95,6 @@ class VirtualLander():
 
         #print(f"Lander {self.id} is created")
 
-    def update_lander(self, sim_salinity, sim_temperature, sim_turbidity, sim_time):
-        '''
-        Method to update the lander salinity, temperature and turbidity
-        Required variables:
-            salinity
-            temperature
-            turbidity
-            current run time
-        
-        '''
-        
-        time_difference = (sim_time - self.starttime)
-        
-        duration = int(time_difference.total_seconds() / 3600)
-
-        self.change = True
-        
-        if self.arr_change[duration] == False:
-            self.arr_salinity[duration] = sim_salinity
-            self.arr_temperature[duration] = sim_temperature
-            self.arr_turbidity[duration] = sim_turbidity
-            self.arr_change[duration] = True
-            #print(f"Lander {self.id} values updated.")
-
-        else:
-            curr__salinity = self.arr_salinity[duration]
-            new_salinity = np.float32((curr__salinity + sim_salinity)/2)
-            self.arr_salinity[duration] = new_salinity
-
-            curr__temperature = self.arr_temperature[duration]
-            new_temperature = np.float32((curr__temperature + sim_temperature)/2)
-            self.arr_temperature[duration] = new_temperature
-
-            curr__turbidity = self.arr_turbidity[duration]
-            new_turbidity = np.float32((curr__turbidity + sim_turbidity)/2)
-            self.arr_turbidity[duration] = new_turbidity
-            #print(f"Lander {self.id} values updated.")
-
     ## Lag metode for å kunne finne midtpunktet for alle partiklene som er innom griden til gitt tid
     def calculate_particle_center_point(self, lat, lon):
         '''
@@ -136,54 +124,6 @@ class VirtualLander():
             return True
     
         
-    def smoother(self):
-        '''
-        Smoothing method for the lander values.
-        The Change-value will not be changed, but rather fill in the default values with smoothe values.       
-        '''
-        for i in range(self.seed_length):
-            if self.arr_change[i] == True: #må endre or self.arr_change[i-1] == False
-                continue
-                #skip
-            
-            # Check if current value is unchanged AND if the previous value is changed, OR if the previous values have been smoothen
-            elif self.arr_change[i] == False  and (self.arr_change[i-1] == True):
-                    next_changed_index = i+1
-
-                    # Check if there are any changed values after the current unchanged default values. 
-                    # If it finds any changed values, the current value will be set as the average of the previous + the next changed value
-                    while next_changed_index < self.seed_length:
-                        if self.arr_change[next_changed_index] == True:
-                            self.arr_salinity[i] = np.float32((self.arr_salinity[i-1] + self.arr_salinity[next_changed_index])/2)
-                            self.arr_temperature[i] = np.float32((self.arr_temperature[i-1] + self.arr_temperature[next_changed_index])/2)
-                            self.arr_turbidity[i] = np.float32((self.arr_turbidity[i-1] + self.arr_turbidity[next_changed_index])/2)
-                            self.arr_change[i] = True
-                            break
-                        
-                        next_changed_index= next_changed_index+1
-
-                    # If the current value is stil set as default, current value will be set as previous value
-                    #if self.arr_salinity[i] == self.df_salinity and self.arr_temperature[i] == self.df_temperature and self.arr_turbidity[i] == self.df_turbidity:
-                    if self.arr_change[i] == False:    
-                        self.arr_salinity[i] = np.float32(self.arr_salinity[i-1])
-                        self.arr_temperature[i] = np.float32(self.arr_temperature[i-1])
-                        self.arr_turbidity[i] = np.float32(self.arr_turbidity[i-1])
-                        self.arr_change[i] = True
-
-            # If there arent any previous values set the current value
-            elif self.arr_change[i] == False:
-                next_changed_index = i+1
-                while next_changed_index < self.seed_length:
-                        if self.arr_change[next_changed_index] == True:
-                            self.arr_salinity[i] = np.float32(self.arr_salinity[next_changed_index])
-                            self.arr_temperature[i] = np.float32(self.arr_temperature[next_changed_index])
-                            self.arr_turbidity[i] = np.float32(self.arr_turbidity[next_changed_index])
-                            break
-
-                        next_changed_index= next_changed_index+1
-
-
-
     def calculate_center(self, max_lat, min_lat, max_lon, min_lon):
         '''
         Method to find centroid of grid
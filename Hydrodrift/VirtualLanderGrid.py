@@ -0,0 +1,202 @@
+import numpy as np
+from datetime import datetime, timedelta
+
+from LanderIndex import LanderIndex
+from VirtualLander import VirtualLander
+
+class VirtualLanderGrid():
+    '''
+    All virtual landers of a regular lat/lon grid, stored as arrays.
+    The hourly values are stored in arrays shaped (number of landers, seed_length),
+    where row i is the lander with id i+1. Landers are numbered as in
+    HydroDrift.create_landers_from_list, with longitude as the outer loop.
+    Variables:
+    - Time
+    - Location
+    - Change
+    - Salinity
+    - Temperature
+    - Turbidity
+    '''
+
+    def __init__(self, lat_edges, lon_edges, starttime, seed_length):
+        '''
+        Required variables:
+            lat_edges
+            lon_edges
+            starttime
+            seed_length
+        '''
+        self.index = LanderIndex(lat_edges, lon_edges)
+
+        num_landers = self.index.num_landers
+        self.id = np.arange(1, num_landers + 1)
+
+        ilon, ilat = np.divmod(np.arange(num_landers), self.index.num_lat)
+        self.minlat = self.index.lat_edges[ilat]
+        self.maxlat = self.index.lat_edges[ilat + 1]
+        self.minlon = self.index.lon_edges[ilon]
+        self.maxlon = self.index.lon_edges[ilon + 1]
+        self.center_lat = (self.maxlat + self.minlat) / 2
+        self.center_lon = (self.maxlon + self.minlon) / 2
+
+        self.reset(starttime, seed_length)
+
+    def reset(self, starttime, seed_length):
+        '''
+        Method to clear the lander values for a new run, keeping the grid
+        Required variables:
+            starttime
+            seed_length
+        '''
+        self.starttime = starttime
+        self.seed_length = seed_length
+
+        num_landers = self.index.num_landers
+        shape = (num_landers, seed_length)
+        self.salinity = np.full(shape, VirtualLander.df_salinity, dtype=np.float32)
+        self.temperature = np.full(shape, VirtualLander.df_temperature, dtype=np.float32)
+        self.turbidity = np.full(shape, VirtualLander.df_turbidity, dtype=np.float32)
+        self.change = np.full(shape, False)
+        self.lander_change = np.full(num_landers, False)
+
+        self.datetime = np.array([starttime + timedelta(hours=i) for i in range(seed_length)])
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, index):
+        return VirtualLander.from_grid(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def restore(self, starttime, salinity, temperature, turbidity, change):
+        '''
+        Method to copy the lander values of a previous run, starting at starttime,
+        for the hours that are also in the current run
+        Required variables:
+            starttime
+            salinity
+            temperature
+            turbidity
+            change
+        '''
+        shift = int((self.starttime - starttime).total_seconds() / 3600)
+        hours = min(self.seed_length, np.shape(change)[1] - shift)
+        if shift < 0 or hours <= 0:
+            return
+
+        self.salinity[:, :hours] = salinity[:, shift:shift + hours]
+        self.temperature[:, :hours] = temperature[:, shift:shift + hours]
+        self.turbidity[:, :hours] = turbidity[:, shift:shift + hours]
+        self.change[:, :hours] = change[:, shift:shift + hours]
+        self.lander_change |= self.change.any(axis=1)
+
+    def update_landers(self, lat, lon, sim_salinity, sim_temperature, sim_turbidity, sim_time):
+        '''
+        Method to update the landers with the values of all particles at the
+        current run time. The first value of an hour is taken as is, and every
+        following value is averaged with the current one (see LanderIndex.running_average)
+        Required variables:
+            lat
+            lon
+            salinity
+            temperature
+            turbidity
+            current run time
+        '''
+        particle, lander = self.index.locate(lat, lon)
+        if len(particle) == 0:
+            return
+
+        duration = int((sim_time - self.starttime).total_seconds() / 3600)
+
+        values = {'salinity': np.asarray(sim_salinity)[particle],
+                  'temperature': np.asarray(sim_temperature)[particle],
+                  'turbidity': np.asarray(sim_turbidity)[particle]}
+        previous = {'salinity': self.salinity[:, duration],
+                    'temperature': self.temperature[:, duration],
+                    'turbidity': self.turbidity[:, duration]}
+        landers, averages = self.index.running_average(
+            lander, values, previous, self.change[:, duration])
+
+        self.salinity[landers, duration] = averages['salinity']
+        self.temperature[landers, duration] = averages['temperature']
+        self.turbidity[landers, duration] = averages['turbidity']
+        self.change[landers, duration] = True
+        self.lander_change[landers] = True
+
+    def smooth(self):
+        '''
+        Smoothing method for the lander values, for all landers at once.
+        For every lander, an unchanged hour after a changed one is set to the average of the previous
+        hour and the next changed hour, or to the previous hour if no changed
+        hour follows. Hours before the first changed hour get the value of the
+        first changed hour, or are averaged with the last hour if that has changed.
+        '''
+        num_landers, seed_length = self.change.shape
+        changed = self.change
+        hours = np.arange(seed_length)
+        rows = np.arange(num_landers)[:, np.newaxis]
+
+        # Index of the previous and next changed hour, -1 and seed_length if none
+        prev_index = np.maximum.accumulate(np.where(changed, hours, -1), axis=1)
+        next_index = np.minimum.accumulate(
+            np.where(changed, hours, seed_length)[:, ::-1], axis=1)[:, ::-1]
+        has_prev = prev_index >= 0
+        has_next = next_index < seed_length
+
+        # Hours before the first change wrap around to the last hour, if changed
+        wrap = ~has_prev & changed[:, -1:]
+        prev_index = np.where(wrap, seed_length - 1, prev_index)
+        distance = np.where(wrap, hours + 1, hours - prev_index)
+        has_prev = has_prev | wrap
+
+        fill = ~changed & (has_prev | has_next)
+        between = has_prev & has_next
+        # Repeated averaging with the next changed hour halves the distance
+        # to it for every hour away from the previous changed hour
+        weight = np.ldexp(1.0, -np.minimum(distance, 1074))
+
+        prev_index = np.clip(prev_index, 0, seed_length - 1)
+        next_index = np.clip(next_index, 0, seed_length - 1)
+        for values in (self.salinity, self.temperature, self.turbidity):
+            prev_values = values[rows, prev_index].astype(np.float64)
+            next_values = values[rows, next_index].astype(np.float64)
+            smoothed = np.where(between, next_values + (prev_values - next_values)*weight,
+                                np.where(has_prev, prev_values, next_values))
+            values[fill] = smoothed[fill]
+
+        # Hours before the first change without wrap around are filled,
+        # but stay marked as unchanged
+        self.change[fill & has_prev] = True
+
+    def records(self, changed_only=False):
+        '''
+        Method to create the simulation rows of the API, one per lander and hour,
+        directly from the lander arrays
+        Optional variables:
+            changed_only: only create rows for landers reached by particles
+        '''
+        landers = np.arange(len(self))
+        if changed_only:
+            landers = landers[self.lander_change]
+
+        record_time = [f"{time}" for time in self.datetime]
+        rows = []
+        for ind in landers:
+            grid_id = f"{self.id[ind]}"
+            for hour, conductivity, temperature, turbidity, changed in zip(
+                    record_time, self.salinity[ind], self.temperature[ind],
+                    self.turbidity[ind], self.change[ind]):
+                rows.append({
+                    "record_time": hour,
+                    "conductivity": f"{conductivity}",
+                    "temperature": f"{temperature}",
+                    "turbidity": f"{turbidity}",
+                    "grid_id": grid_id,
+                    "changed": f"{changed}"
+                })
+        return rows
@@ -1,61 +1,70 @@
 from datetime import datetime, timedelta 
 from opendrift.readers import reader_netCDF_CF_generic, reader_ROMS_native
+from opendrift.readers.basereader import TileCache
 from HydroDrift import HydroDrift
 from API import QueryAPI
-import json
+import asyncio
+import os
 import sys
 
-if __name__ == "__main__": 
+
+def create_readers():
     '''
-    Args:
-    1: Year
-    2: Month
-    3: Day
-    
+    Opens the ocean model readers
     '''
+    reader_norkyst = reader_netCDF_CF_generic.Reader(
+    'https://thredds.met.no/thredds/dodsC/sea/norkyst800m/1h/aggregate_be')
+   
+    # drift.add_reader(salinity_reader)
+    fjordOSReader = reader_ROMS_native.Reader("https://thredds.met.no/thredds/dodsC/fjordos/operational_archive/complete_archive/ocean_his.nc_2024041500")
+    # norkyst800Reader = reader_netCDF_CF_generic.Reader("https://thredds.met.no/thredds/dodsC/sea/norkyst800m/1h/aggregate_be")
 
-    # INIT VARIABLES
-    # List of seeding points/lander locations
-    latSensorList = []
-    lonSensorList = []
-    end_time,start_time = 0, 0
-
-
-    # DEFAULT VALUES
-    # Location in degrees
-    #lat, lon = 59.658233, 10.624583
-    # Seed length in hours
-    seed_length = 24
-    # Start and end datetime
-    end_time = datetime(2024, 4, 16, 0)
-    start_time = end_time - timedelta(hours=seed_length)
-
-
-    arg_len = len(sys.argv)
+    # Keep data read from thredds on local disk, for reruns and backfills
+    tile_cache_dir = os.getenv('HYDRODRIFT_TILE_CACHE')
+    if tile_cache_dir:
+        tile_cache = TileCache(tile_cache_dir,
+                               max_bytes=float(os.getenv('HYDRODRIFT_TILE_CACHE_BYTES', 10e9)))
+        reader_norkyst.set_tile_cache(tile_cache)
+        fjordOSReader.set_tile_cache(tile_cache)
+    return reader_norkyst, fjordOSReader
 
-    if arg_len > 3:
-        #for arg in sys.argv:
-        #    print(arg)
 
+async def prepare_async(queryAPI, start_time, end_time):
+    '''
+    Runs the API queries concurrently with opening the ocean model readers
+    '''
+    loop = asyncio.get_running_loop()
+    (locations, lander_reader), (reader_norkyst, fjordOSReader) = await asyncio.gather(
+        queryAPI.query_API_async(start_time, end_time),
+        loop.run_in_executor(None, create_readers))
+    return locations, lander_reader, reader_norkyst, fjordOSReader
 
-        # if arg_len > 4:
-        #     end_time = datetime(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])) + (timedelta(hours=int(sys.argv[4])))
-        # else:
-        end_time = datetime(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]))
-            
-        start_time = end_time - timedelta(hours=seed_length)
 
-    print("Starttime: " + str(start_time))
-    print("Endtime: " + str(end_time))
-    print("===============================================\n\n")
+def run_drift(start_time, end_time, seed_length, queryAPI, locations, lander_reader,
+              metrological_model, lander_grid=None, checkpoint=None):
+    '''
+    Runs the drift model from the sensor locations, and posts the lander values to the API
+    Required variables:
+        start_time
+        end_time
+        seed_length
+        queryAPI
+        locations
+        lander_reader
+        metrological_model
+    Optional variables:
+        lander_grid: VirtualLanderGrid from a previous run, to be reused
+        checkpoint: file with the state of the previous run. If the previous run
+            ended inside this window, only the new hours are simulated
+    '''
+    # INIT VARIABLES
+    # List of seeding points/lander locations
+    latSensorList = []
+    lonSensorList = []
 
-           
     drift = HydroDrift(loglevel=40)
     drift.suppress_qt_warnings()
 
-    print("Pulling data from API")
-    queryAPI = QueryAPI()
-    locations = queryAPI.query_location_API(start_time, end_time)
     for location in locations:
         latSensorList.append(location[1])
         lonSensorList.append(location[0])
@@ -65,30 +74,18 @@ if __name__ == "__main__":
     # lonSensorList.append(lonSensorList[0] - 0.1)
     # print(locations)
 
-    #queryAPI.query_data_API(start_time, end_time+ timedelta(hours=1))
-
-    queryAPI.query_data_API(start_time, end_time)
-
 
     # Creation of Virtual Landers
     size_lat = 0.05
     size_lon = 0.05
     print("Creating Virtual Landers")
-    drift.create_landers_from_list(start_time,seed_length, size_lat, size_lon)
+    if lander_grid is None:
+        drift.create_landers_from_list(start_time,seed_length, size_lat, size_lon)
+    else:
+        lander_grid.reset(start_time, seed_length)
+        drift.lander_grid = lander_grid
     
 
-    # Load API data from NetCDF file 
-    filename = 'sensor_data.nc'
-    lander_reader = reader_netCDF_CF_generic.Reader(filename)
-    #print('Variables in the NetCDF file:', salinity_reader.variables)
-
-    reader_norkyst = reader_netCDF_CF_generic.Reader(
-    'https://thredds.met.no/thredds/dodsC/sea/norkyst800m/1h/aggregate_be')
-   
-    # drift.add_reader(salinity_reader)
-    fjordOSReader = reader_ROMS_native.Reader("https://thredds.met.no/thredds/dodsC/fjordos/operational_archive/complete_archive/ocean_his.nc_2024041500")
-    # norkyst800Reader = reader_netCDF_CF_generic.Reader("https://thredds.met.no/thredds/dodsC/sea/norkyst800m/1h/aggregate_be")
-    metrological_model = fjordOSReader
     drift.add_reader(metrological_model)
     drift.add_reader(lander_reader, first=True)
 
@@ -99,12 +96,21 @@ if __name__ == "__main__":
 
 
     
+    # Continue from the previous run, seeding only for the new hours
+    seed_start = start_time
+    seed_number = 500
+    resume_time = HydroDrift.checkpoint_time(checkpoint, end_time, seed_length)
+    if resume_time is not None:
+        drift.seed_from_checkpoint(checkpoint, start_time)
+        seed_start = resume_time
+        seed_number = max(2, round(seed_number*(end_time - resume_time)/timedelta(hours=seed_length)))
+
     # Run the model
     number = 1
     for i in range(len(latSensorList)):
         drift.seed_elements(lon=lonSensorList[
-             i], lat=latSensorList[i], time=[start_time, end_time],
-                        number=500, radius=20)
+             i], lat=latSensorList[i], time=[seed_start, end_time],
+                        number=seed_number, radius=20)
         
     # drift.plot(buffer=.7, fast=True)
 
@@ -113,40 +119,26 @@ if __name__ == "__main__":
     # 60 min interval in 24 hours until all particles deactivate or timeout
     # Remember time:units = "seconds since 1970-01-01 00:00:00" ;
     #drift.run(time_step=timedelta(minutes=60), duration=timedelta(hours=seed_length), outfile='output_file.nc')
-    drift.run(time_step=timedelta(minutes=60), duration=timedelta(hours=seed_length))
+    drift.run(time_step=timedelta(minutes=60), duration=end_time - seed_start)
     print("Model run complete")
     print("===============================================\n\n")
 
+    if checkpoint is not None:
+        drift.write_checkpoint(checkpoint)
+
     # drift.plot(buffer=.7, fast=True)
 
     # Post prep of data  
     drift.smooth_landerlist()
 
     
-    for lander in drift.lander_list:
-        #if lander.change == True:   
-            #lander.print_lander()
-            for ind in range(lander.seed_length):
-                record_data = {
-                    "record_time": f"{lander.arr_datetime[ind]}",
-                    "conductivity": f"{lander.arr_salinity[ind]}",
-                    "temperature": f"{lander.arr_temperature[ind]}",
-                    "turbidity": f"{lander.arr_turbidity[ind]}",
-                    "grid_id": f"{lander.id}",
-                    "changed": f"{lander.arr_change[ind]}"
-                }
-
-                # Convert the dictionary to a JSON string
-                json_data = json.dumps(record_data)
-                queryAPI.data_for_mutation(json_data)
+    # Upsert only the landers reached by particles, using the unique constraint on
+    # (grid_id, record_time) of the simulations table. If the constraint is set
+    # empty, all rows are instead replaced in one transaction
+    upsert_constraint = os.getenv('HASURA_UPSERT_CONSTRAINT', QueryAPI.upsert_constraint) or None
+    records = drift.lander_grid.records(changed_only=upsert_constraint is not None)
 
-    
-    queryAPI.reset_data_API()
-    print("Reset data complete")
-    print("===============================================\n\n")
-
-
-    queryAPI.mutation_data_API()
+    queryAPI.bulk_mutation_data_API(records, upsert_constraint=upsert_constraint)
     print("POST data complete")
     print("===============================================\n\n")
 
@@ -156,7 +148,65 @@ if __name__ == "__main__":
     #drift.animation(fast=True, filename='hydrodrift_visual_simulation.mp4')
     print("Simulation complete")
     print("===============================================\n\n")
+
+    return drift
+
+
+if __name__ == "__main__": 
+    '''
+    Args:
+    1: Year
+    2: Month
+    3: Day
     
-    
+    '''
+
+    # DEFAULT VALUES
+    # Location in degrees
+    #lat, lon = 59.658233, 10.624583
+    # Seed length in hours
+    seed_length = 24
+    # Start and end datetime
+    end_time = datetime(2024, 4, 16, 0)
+    start_time = end_time - timedelta(hours=seed_length)
+
+
+    arg_len = len(sys.argv)
 
-    
\ No newline at end of file
+    if arg_len > 3:
+        #for arg in sys.argv:
+        #    print(arg)
+
+
+        # if arg_len > 4:
+        #     end_time = datetime(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])) + (timedelta(hours=int(sys.argv[4])))
+        # else:
+        end_time = datetime(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]))
+            
+        start_time = end_time - timedelta(hours=seed_length)
+
+    print("Starttime: " + str(start_time))
+    print("Endtime: " + str(end_time))
+    print("===============================================\n\n")
+
+           
+    # Sensor data is only needed for the hours after the checkpoint
+    checkpoint = os.getenv('HYDRODRIFT_CHECKPOINT')
+    data_start = HydroDrift.checkpoint_time(checkpoint, end_time, seed_length) or start_time
+
+    print("Pulling data from API")
+    queryAPI = QueryAPI()
+    if os.getenv('HYDRODRIFT_ASYNC'):
+        locations, lander_reader, reader_norkyst, fjordOSReader = asyncio.run(
+            prepare_async(queryAPI, data_start, end_time))
+    else:
+        locations = queryAPI.query_location_API(data_start, end_time)
+
+        #queryAPI.query_data_API(start_time, end_time+ timedelta(hours=1))
+
+        lander_reader = queryAPI.query_data_API(data_start, end_time)
+        reader_norkyst, fjordOSReader = create_readers()
+
+    metrological_model = fjordOSReader
+    run_drift(start_time, end_time, seed_length, queryAPI, locations, lander_reader, metrological_model,
+              checkpoint=checkpoint)
@@ -10,9 +10,16 @@ Opendrift module
 """
 import logging; logger = logging.getLogger(__name__)
 import importlib
+import threading
 import numpy as np
 from .version import __version__
 
+# The netCDF/HDF5 library is not thread-safe. Readers hold this lock while
+# reading data, and the netCDF exporter while writing, so that files may be
+# read and written from background threads (see StructuredReader.set_prefetch
+# and config general:output_async)
+netcdf_lock = threading.RLock()
+
 # For automated access to available drift classes, e.g. for GUI
 # Hardcoded for now
 _available_models = \
@@ -98,6 +98,9 @@ class LagrangianArray:
             An empty object may be created by giving no input.
         """
 
+        # Storage of variable arrays, with room for more elements
+        self._storage = {}
+
         # Collect default values in separate dict, for easier access
         default_values = {variable: self.variables[variable]['dtype'](
                           self.variables[variable]['default'])
@@ -156,6 +159,49 @@ class LagrangianArray:
         variables.update(new_variables)
         return variables
 
+    def reserve(self, capacity):
+        """Reserve storage for at least capacity elements.
+
+        Storage is allocated at the next extension of the arrays, with the
+        dtype of the combined values. Arrays are thereafter extended
+        in place, within the reserved storage."""
+        self._capacity = capacity
+
+    def _append(self, var, present_data, new_data):
+        """Set variable to present_data followed by new_data.
+
+        The new values are written into spare storage after present_data if
+        present_data is a contiguous view of the storage of this variable,
+        otherwise the values are copied to a new storage, with room for
+        more elements. Extending elements is thus amortized O(len(new_data))."""
+        num_present = len(present_data)
+        num_total = num_present + len(new_data)
+        dtype = np.result_type(present_data, new_data)
+        storage = self._storage.get(var)
+        offset = self._storage_offset(present_data, storage)
+        if offset is None or storage.dtype != dtype or \
+                offset + num_total > len(storage):
+            capacity = max(num_total, 2*num_present,
+                           getattr(self, '_capacity', 0))
+            storage = np.empty(capacity, dtype=dtype)
+            storage[:num_present] = present_data
+            self._storage[var] = storage
+            offset = 0
+        storage[offset + num_present:offset + num_total] = new_data
+        setattr(self, var, storage[offset:offset + num_total])
+
+    @staticmethod
+    def _storage_offset(data, storage):
+        """Position of data within storage, or None if data is not a contiguous view of storage"""
+        if data is storage:
+            return 0
+        if storage is None or not isinstance(data, np.ndarray) or \
+                data.base is not storage or data.ndim != 1 or \
+                data.strides[0] != storage.itemsize:
+            return None
+        return (data.__array_interface__['data'][0] -
+                storage.__array_interface__['data'][0]) // storage.itemsize
+
     def extend(self, other):
         """Add elements from another object."""
         len_self = len(self)
@@ -175,25 +221,45 @@ class LagrangianArray:
                     present_data = present_data*np.ones(len_self)
                 if not hasattr(new_data, '__len__'):
                     new_data = new_data*np.ones(len_other)
-                setattr(self, var, np.concatenate((present_data,
-                                                   new_data)))
+                self._append(var, present_data, new_data)
 
-    def move_elements(self, other, indices):
+    def move_elements(self, other, indices, keep_order=True):
         """Remove elements with given indices, and append to another object.
-        NB: indices is boolean array, not real indices!"""
+        NB: indices is boolean array, not real indices!
+
+        With keep_order=False, removed elements are replaced by the last
+        remaining elements (swap-remove), so that only the removed and the
+        swapped elements are copied. The positions of the replaced and
+        swapped elements are then returned as a tuple (holes, sources), to
+        be applied to arrays aligned with the elements:
+        array[holes] = array[sources]; array = array[:len(self)]"""
 
         # Move elements with given indices (boolean array)
         # to another LagrangianArray
         # NB: scalars and 1D arrays are converted to ndarrays and concatenated
         self_len = len(self)
         other_len = len(other)
+        num_moved = np.sum(indices)
+        num_kept = self_len - num_moved
+        holes = sources = None
+        if keep_order is False:
+            removed = np.flatnonzero(indices)
+            holes = removed[removed < num_kept]
+            sources = np.flatnonzero(~indices[num_kept:]) + num_kept
+            kept = slice(0, num_kept)
+        elif num_moved > 0 and indices[:num_moved].all():
+            kept = slice(num_moved, None)  # Moving first elements, as a view
+        elif num_moved > 0 and indices[num_kept:].all():
+            kept = slice(0, num_kept)  # Moving last elements, as a view
+        else:
+            kept = ~indices
         for var in self.variables:
             self_var = getattr(self, var)
             other_var = getattr(other, var)
             if (not isinstance(self_var, np.ndarray) and
                 not isinstance(other_var, np.ndarray)) and \
                     (other_var == self_var):
-                    if np.sum(indices) == len(self):
+                    if num_moved == len(self):
                         setattr(self, var, [])  # Empty if all elements moved
                     continue  # Equal scalars - we do nothing
 
@@ -205,25 +271,18 @@ class LagrangianArray:
             if len(other_var) < other_len:  # Convert scalar to aray
                 other_var = other_var*np.ones(other_len)
             if len(self_var) > 0:
-                setattr(other, var, np.concatenate((other_var,
-                                                    self_var[indices])))
+                other._append(var, other_var, self_var[indices])
             else:
                 setattr(other, var, self_var[indices])
-            setattr(self, var, self_var[~indices])  # Remove from self
-
-            #if isinstance(self_var, np.ndarray) or\
-            #    isinstance(other_var, np.ndarray):  # Array
-            #    setattr(other, var,
-            #            np.concatenate((getattr(other, var),
-            #                            getattr(self, var)[indices])))
-            #    # Remove elements from self
-            #    setattr(self, var, getattr(self, var)[~indices])
-            #elif isinstance(getattr(other, var), np.ndarray):
-            #    setattr(other, var,
-            #            np.concatenate((getattr(other, var),
-            #                            np.atleast_1d(getattr(self, var)))))
-            #else:
-            #    setattr(other, var, getattr(self, var))  # Scalar
+            if holes is not None and len(holes) > 0:
+                if self._storage_offset(self_var, self._storage.get(var)) is None:
+                    self_var = self_var.copy()  # Swapping in own storage only
+                    self._storage[var] = self_var
+                self_var[holes] = self_var[sources]
+            setattr(self, var, self_var[kept])  # Remove from self
+
+        if keep_order is False:
+            return holes, sources
 
     def __len__(self):
         length = 0
@@ -4,10 +4,13 @@ from datetime import datetime, timedelta
 import logging; logging.captureWarnings(True); logger = logging.getLogger(__name__)
 import string
 from shutil import move
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from netCDF4 import Dataset, num2date, date2num
 
+from opendrift import netcdf_lock
+
 # Module with functions to export/import trajectory data to/from netCDF file
 # Strives to be compliant with netCDF CF-convention on trajectories
 # https://cfconventions.org/Data/cf-conventions/cf-conventions-1.6/build/cf-conventions.html#idp8377728
@@ -22,8 +25,23 @@ def init(self, filename):
     self.outfile = Dataset(filename, 'w')
     self.outfile.createDimension('trajectory', self.num_elements_total())
     self.outfile.createVariable('trajectory', 'i4', ('trajectory',))
-    self.outfile.createDimension('time', None)  # Unlimited time dimension
-    self.outfile.createVariable('time', 'f8', ('time',))
+    ragged = self.get_config('general:output_format') == 'contiguous_ragged'
+    if ragged is True:
+        # Observations are appended for each buffer, with index of
+        # trajectory (indexed ragged array). At close, the observations
+        # are sorted by trajectory into a contiguous ragged array.
+        self.outfile.createDimension('obs', None)
+        self.outfile.createVariable('time', 'f8', ('obs',))
+        self.outfile.createVariable('trajectory_index', 'i4', ('obs',))
+        self.outfile.variables['trajectory_index'].instance_dimension = \
+            'trajectory'
+        self.outfile.variables['trajectory_index'].long_name = \
+            'index of trajectory this obs belongs to'
+        dimensions = ('obs',)
+    else:
+        self.outfile.createDimension('time', None)  # Unlimited time dimension
+        self.outfile.createVariable('time', 'f8', ('time',))
+        dimensions = ('trajectory', 'time')
     # NB: trajectory_id must be changed for future ragged array representation
     self.outfile.variables['trajectory'][:] = \
         np.arange(self.num_elements_total())+1
@@ -63,17 +81,29 @@ def init(self, filename):
         for key, value in self.metadata_dict.items():
             self.outfile.setncattr(key, str(value))
 
+    # Variables are chunked by output buffer along time, with chunks
+    # of about one million values
+    chunk_time = max(1, self.export_buffer_length)
+    chunk_trajectory = max(1, min(self.num_elements_total(),
+                                  2**20 // chunk_time))
+    if ragged is True:
+        chunksizes = (chunk_trajectory*chunk_time,)
+    else:
+        chunksizes = (chunk_trajectory, chunk_time)
+    compression = self.get_config('general:output_compression')
+
     # Add all element properties as variables
-    for prop in self.history.dtype.fields:
+    for prop in self.history_recorder.dtype.fields:
         if prop in skip_parameters:
             continue
         # Note: Should use 'f8' if 'f4' is not accurate enough,
         #       at expense of larger files
         try:
-            dtype = self.history.dtype[prop]
+            dtype = self.history_recorder.dtype[prop]
         except:
             dtype = 'f4'
-        var = self.outfile.createVariable(prop, dtype, ('trajectory', 'time'))
+        var = self.outfile.createVariable(
+            prop, dtype, dimensions, zlib=compression, chunksizes=chunksizes)
         for subprop in self.history_metadata[prop].items():
             if subprop[0] not in ['dtype', 'constant', 'default', 'seed']:
                 # Apparently axis attribute shall not be given for lon and lat:
@@ -81,22 +111,69 @@ def init(self, filename):
                     continue
                 var.setncattr(subprop[0], subprop[1])
 
+    # The file is kept open for writing of buffers
+    self.outfile_writer = None
+    self.outfile_pending = None
+    if self.get_config('general:output_async') is True:
+        self.outfile_writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='opendrift-output')
+
 def write_buffer(self):
-    if self.outfile._isopen == 0:
-        self.outfile = Dataset(self.outfile_name, 'a')
-    num_steps_to_export = self.steps_output - self.steps_exported
-    for prop in self.history_metadata:
-        if prop in skip_parameters:
-            continue
-        var = self.outfile.variables[prop]
-        var[:, self.steps_exported:self.steps_exported+num_steps_to_export] = \
-            self.history[prop][:, 0:num_steps_to_export]
+    """Write recorded history to file, and continue with an empty buffer.
 
+    With general:output_async, the recorded buffer is written by a
+    background thread, while the next buffer is recorded into a second
+    set of arrays (double buffering)."""
+    num_steps_to_export = self.steps_output - self.steps_exported
     times = [self.start_time + n*self.time_step_output for n in
              range(self.steps_exported, self.steps_output)]
-    self.outfile.variables['time'][
-        self.steps_exported:self.steps_exported+len(times)] = \
-            date2num(times, self.timeStr)
+
+    if self.outfile_writer is None:
+        _write_buffer(self, self.history_recorder, self.steps_exported,
+                      num_steps_to_export, times)
+        self.history_recorder.clear()  # Reset history array, for new data
+    else:
+        # Arrays of the previous buffer are reused when it has been written
+        written = wait_for_writer(self)
+        if written is not None:
+            recorded = self.history_recorder.swap(written.data, written.valid)
+        else:
+            recorded = self.history_recorder.swap()
+        self.outfile_pending = self.outfile_writer.submit(
+            _write_buffer, self, recorded, self.steps_exported,
+            num_steps_to_export, times)
+
+    self.steps_exported = self.steps_exported + num_steps_to_export
+
+def wait_for_writer(self):
+    """Wait for any buffer being written in the background, and return its recorder"""
+    pending = getattr(self, 'outfile_pending', None)
+    if pending is None:
+        return None
+    self.outfile_pending = None
+    return pending.result()  # Raises any error from writing
+
+def _write_buffer(self, recorder, steps_exported, num_steps_to_export, times):
+    with netcdf_lock:
+        return _write_buffer_locked(self, recorder, steps_exported,
+                                    num_steps_to_export, times)
+
+def _write_buffer_locked(self, recorder, steps_exported, num_steps_to_export, times):
+    if self.outfile._isopen == 0:
+        self.outfile = Dataset(self.outfile_name, 'a')
+    if 'obs' in self.outfile.dimensions:
+        _write_observations(self, recorder, num_steps_to_export, times)
+    else:
+        for prop in self.history_metadata:
+            if prop in skip_parameters:
+                continue
+            var = self.outfile.variables[prop]
+            var[:, steps_exported:steps_exported+num_steps_to_export] = \
+                recorder.variable(prop, num_steps_to_export)
+
+        self.outfile.variables['time'][
+            steps_exported:steps_exported+len(times)] = \
+                date2num(times, self.timeStr)
 
     # Write status categories metadata
     # TODO: need not be written each output timestep, thus this could be deleted?
@@ -108,16 +185,40 @@ def write_buffer(self):
     #self.outfile.variables['status'].flag_meanings = \
     #    " ".join(self.status_categories)
 
+    self.outfile.steps_exported = steps_exported + num_steps_to_export
+    self.outfile.sync()  # Flush from memory to disk
+
     logger.info('Wrote %s steps to file %s' % (num_steps_to_export,
                                                 self.outfile_name))
-    self.history.mask = True  # Reset history array, for new data
-    self.steps_exported = self.steps_exported + num_steps_to_export
-    self.outfile.steps_exported = self.steps_exported
-    self.outfile.sync()  # Flush from memory to disk
-    self.outfile.close()  # close file temporarily
+    return recorder
+
+def _write_observations(self, recorder, num_steps_to_export, times):
+    """Append recorded values of buffer as observations of ragged array"""
+    rows, cols = np.nonzero(recorder.valid[:, :num_steps_to_export])
+    if len(rows) == 0:
+        return
+    start = len(self.outfile.dimensions['obs'])
+    obs = slice(start, start + len(rows))
+    for prop in self.history_metadata:
+        if prop in skip_parameters:
+            continue
+        self.outfile.variables[prop][obs] = \
+            recorder.variable(prop, num_steps_to_export)[rows, cols]
+    self.outfile.variables['time'][obs] = \
+        np.atleast_1d(date2num(times, self.timeStr))[cols]
+    self.outfile.variables['trajectory_index'][obs] = rows
 
 def close(self):
-    self.outfile = Dataset(self.outfile_name, 'a')
+    wait_for_writer(self)
+    if self.outfile_writer is not None:
+        self.outfile_writer.shutdown()
+        self.outfile_writer = None
+    with netcdf_lock:
+        _close(self)
+
+def _close(self):
+    if self.outfile._isopen == 0:
+        self.outfile = Dataset(self.outfile_name, 'a')
     # Write status categories metadata
     status_dtype = self.ElementType.variables['status']['dtype']
     self.outfile.variables['status'].valid_range = np.array(
@@ -152,12 +253,12 @@ def close(self):
             self.outfile.variables[var].setncattr('maxval', self.maxvals[var])
 
     # Write bounds metadata
-    self.outfile.geospatial_lat_min = self.history['lat'].min()
-    self.outfile.geospatial_lat_max = self.history['lat'].max()
+    self.outfile.geospatial_lat_min = self.minvals['lat']
+    self.outfile.geospatial_lat_max = self.maxvals['lat']
     self.outfile.geospatial_lat_units = 'degrees_north'
     self.outfile.geospatial_lat_resolution = 'point'
-    self.outfile.geospatial_lon_min = self.history['lon'].min()
-    self.outfile.geospatial_lon_max = self.history['lon'].max()
+    self.outfile.geospatial_lon_min = self.minvals['lon']
+    self.outfile.geospatial_lon_max = self.maxvals['lon']
     self.outfile.geospatial_lon_units = 'degrees_east'
     self.outfile.geospatial_lon_resolution = 'point'
     self.outfile.runtime = str(datetime.now() -
@@ -172,11 +273,17 @@ def close(self):
         logger.debug('Making netCDF file CDM compliant with fixed dimensions')
         if self.num_elements_scheduled() > 0:
             logger.info('Removing %i unseeded elements already written to file' % self.num_elements_scheduled())
-            mask = np.ones(self.history.shape[0], dtype=bool)
+            mask = np.ones(self.history_recorder.shape[0], dtype=bool)
             mask[self.elements_scheduled.ID-1] = False
+        else:
+            mask = None
         with Dataset(self.outfile_name) as src, \
                 Dataset(self.outfile_name + '_tmp', 'w') as dst:
+            if 'trajectory_index' in src.variables:
+                _copy_contiguous_ragged(src, dst, mask)
             for name, dimension in src.dimensions.items():
+                if name in dst.dimensions:
+                    continue
                 if name=='trajectory':
                     # Truncate dimension length to  number actually seeded
                     dst.createDimension(name, self.num_elements_activated())
@@ -184,12 +291,15 @@ def close(self):
                     dst.createDimension(name, len(dimension))
 
             for name, variable in src.variables.items():
+                if name in dst.variables or name == 'trajectory_index':
+                    continue
                 dstVar = dst.createVariable(name, variable.datatype,
-                                             variable.dimensions)
+                                             variable.dimensions,
+                                             zlib=variable.filters()['zlib'])
                 srcVar = src.variables[name]
                 # Truncate data to number actually seeded
                 if 'trajectory' in variable.dimensions:
-                    if self.num_elements_scheduled() > 0:
+                    if mask is not None:
                         if len(variable.dimensions) == 2:
                             dstVar[:] = srcVar[mask, :]
                         else:
@@ -210,11 +320,42 @@ def close(self):
         print(me)
         print('Could not convert netCDF file from unlimited to fixed dimension. Could be due to netCDF library incompatibility(?)')
 
+def _copy_contiguous_ragged(src, dst, mask):
+    """Copy observations of indexed ragged array, sorted by trajectory.
+
+    The observations of each trajectory are written in order of time,
+    and are stored contiguously, with number of observations in rowSize.
+    Observations are read and written one variable at a time."""
+    trajectory_index = np.ma.getdata(src.variables['trajectory_index'][:])
+    order = np.argsort(trajectory_index, kind='stable')  # Keeps time order
+    row_size = np.bincount(trajectory_index,
+                           minlength=len(src.dimensions['trajectory']))
+    if mask is not None:  # Unseeded elements have no observations
+        row_size = row_size[mask]
+    dst.createDimension('trajectory', len(row_size))
+    dst.createDimension('obs', len(order))
+    dstVar = dst.createVariable('rowSize', 'i4', ('trajectory',))
+    dstVar.long_name = 'number of observations for trajectory'
+    dstVar.sample_dimension = 'obs'
+    dstVar[:] = row_size
+
+    for name, variable in src.variables.items():
+        if 'obs' not in variable.dimensions or name == 'trajectory_index':
+            continue
+        dstVar = dst.createVariable(name, variable.datatype, ('obs',),
+                                    zlib=variable.filters()['zlib'])
+        dstVar[:] = variable[:][order]
+        for att in variable.ncattrs():
+            dstVar.setncattr(att, variable.getncattr(att))
+
 def import_file_xarray(self, filename, chunks):
 
     import xarray as xr
     logger.debug('Importing with Xarray from ' + filename)
     self.ds = xr.open_dataset(filename, chunks=chunks)
+    if 'rowSize' in self.ds.variables:
+        raise ValueError('Contiguous ragged array output can not be '
+                         'imported with Xarray, use opendrift.open')
 
     self.steps_output = len(self.ds.time)
     ts0 = (self.ds.time[0] - np.datetime64('1970-01-01T00:00:00')) / np.timedelta64(1, 's')
@@ -258,6 +399,57 @@ def import_file_xarray(self, filename, chunks):
         self.lonmax = np.float32(self.ds.lon.maxval)
         self.latmax = np.float32(self.ds.lat.maxval)
 
+def timedelta_from_string(timestring):
+    if 'day' in timestring:
+        days = int(timestring.split('day')[0])
+        hs = timestring.split(' ')[-1]
+        th = datetime.strptime(hs, '%H:%M:%S')
+        return timedelta(days=days, hours=th.hour, minutes=th.minute, seconds=th.second)
+    else:
+        t = datetime.strptime(timestring, '%H:%M:%S')
+        return timedelta(
+            hours=t.hour, minutes=t.minute, seconds=t.second)
+
+def _ragged_reader(infile, times, elements, start, time_step):
+    """Function reading a variable of contiguous ragged array as a
+    (elements, times) masked array, for the given subset of elements
+    and indices of output time steps, with start time and time step
+    (in units of variable time) of the output.
+
+    Only the range of observations of the given elements is read."""
+    row_size = np.ma.getdata(infile.variables['rowSize'][:]).astype(np.int64)
+    row_end = np.cumsum(row_size)
+    row_start = row_end - row_size
+    first = row_start[elements].min() if len(elements) > 0 else 0
+    last = row_end[elements].max() if len(elements) > 0 else 0
+    obs = slice(first, last)
+
+    # Row (element) and column (time step) of observations
+    element_position = np.full(len(row_size), -1)
+    element_position[elements] = np.arange(len(elements))
+    rows = element_position[np.searchsorted(
+        row_end, np.arange(first, last), side='right')]
+    obs_time = np.ma.getdata(infile.variables['time'][obs])
+    # Observations are at output time steps
+    steps = np.rint((obs_time - start) / time_step).astype(np.int64)
+    time_position = np.full(np.max(times) + 1, -1)
+    time_position[times] = np.arange(len(times))
+    cols = np.full(len(steps), -1)
+    within = (steps >= 0) & (steps < len(time_position))
+    cols[within] = time_position[steps[within]]
+    selected = (rows >= 0) & (cols >= 0)
+    rows = rows[selected]
+    cols = cols[selected]
+
+    def read_variable(var):
+        variable = infile.variables[var]
+        values = np.ma.masked_all((len(elements), len(times)),
+                                  dtype=variable.dtype)
+        values[rows, cols] = variable[obs][selected]
+        return values
+
+    return read_variable
+
 def import_file(self, filename, times=None, elements=None, load_history=True):
     """Create OpenDrift object from imported file.
      times: indices of time steps to be imported, must be contineous range.
@@ -266,6 +458,7 @@ def import_file(self, filename, times=None, elements=None, load_history=True):
 
     logger.debug('Importing from ' + filename)
     infile = Dataset(filename, 'r')
+    ragged = 'rowSize' in infile.variables
     # 'times' can be used to import subset. Not yet implemented.
     if times is None and hasattr(infile, 'steps_exported'):
         self.steps_output = infile.steps_exported
@@ -278,8 +471,17 @@ def import_file(self, filename, times=None, elements=None, load_history=True):
             times = np.arange(len(infile.dimensions['time']))
             self.steps_output = len(times)
 
-    filetime = infile.variables['time'][times]
     units = infile.variables['time'].units
+    if ragged is True:
+        # Output times are not stored, but given by start and time step
+        times = np.atleast_1d(times)
+        output_start = date2num(
+            datetime.fromisoformat(infile.time_coverage_start), units)
+        output_step = timedelta_from_string(
+            infile.time_step_output).total_seconds()
+        filetime = output_start + output_step*times
+    else:
+        filetime = infile.variables['time'][times]
     self.start_time = num2date(filetime[0], units)
     if len(filetime) > 1:
         self.end_time = num2date(filetime[self.steps_output-1], units)  # Why -1?
@@ -301,18 +503,29 @@ def import_file(self, filename, times=None, elements=None, load_history=True):
     history_dtype_fields = []
     self.history_metadata = self.ElementType.variables.copy()
     for env_var in infile.variables:
+            if env_var == 'rowSize':
+                continue
             history_dtype_fields.append((env_var, np.dtype('float32')))
             self.history_metadata[env_var] = {}
     history_dtype = np.dtype(history_dtype_fields)
 
     # Import dataset (history)
-    status = infile.variables['status'][elements, times]
+    if ragged is True:
+        read_variable = _ragged_reader(infile, times, elements,
+                                       output_start, output_step)
+    else:
+        def read_variable(var):
+            return infile.variables[var][elements, times]
+    status = read_variable('status')
     firstlast = np.ma.notmasked_edges(status, axis=1)
     index_of_last = firstlast[1][1]
     actual_num_elements = len(index_of_last)
     if actual_num_elements < num_elements:
         num_elements = actual_num_elements
-        elements = firstlast[0][0]
+        elements = np.asarray(elements)[firstlast[0][0]]
+        if ragged is True:
+            read_variable = _ragged_reader(infile, times, elements,
+                                           output_start, output_step)
         logger.warning('A subset is requested, and number of active elements is %d'
                        % num_elements)
     if load_history is True:
@@ -321,10 +534,10 @@ def import_file(self, filename, times=None, elements=None, load_history=True):
             dtype=history_dtype)
         self.history[:] = np.ma.masked
         for var in infile.variables:
-            if var in ['time', 'trajectory']:
+            if var in ['time', 'trajectory', 'rowSize']:
                 continue
             try:
-                self.history[var] = infile.variables[var][elements, times]
+                self.history[var] = read_variable(var)
             except Exception as e:
                 logger.info(e)
                 pass
@@ -369,16 +582,6 @@ def import_file(self, filename, times=None, elements=None, load_history=True):
                                 (conf_key, value))
 
     # Import time steps from metadata
-    def timedelta_from_string(timestring):
-        if 'day' in timestring:
-            days = int(timestring.split('day')[0])
-            hs = timestring.split(' ')[-1]
-            th = datetime.strptime(hs, '%H:%M:%S')
-            return timedelta(days=days, hours=th.hour, minutes=th.minute, seconds=th.second)
-        else:
-            t = datetime.strptime(timestring, '%H:%M:%S')
-            return timedelta(
-                hours=t.hour, minutes=t.minute, seconds=t.second)
     try:
         self.time_step = timedelta_from_string(infile.time_step_calculation)
         self.time_step_output = timedelta_from_string(infile.time_step_output)
@@ -50,6 +50,7 @@ from opendrift.errors import NotCoveredError
 from opendrift.readers.basereader import BaseReader, standard_names
 from opendrift.readers import reader_from_url, reader_global_landmask
 from opendrift.models.physics_methods import PhysicsMethods
+from opendrift.models.history import HistoryRecorder
 
 
 class OpenDriftSimulation(PhysicsMethods, Timeable):
@@ -271,6 +272,46 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                 'previous means that objects will move back to the previous location '
                 'if they hit land'
             },
+            'general:output_async': {
+                'type':
+                'bool',
+                'default':
+                False,
+                'description':
+                'Output buffers are written to file in a background thread, '
+                'while the simulation continues. The netCDF/HDF5 library is '
+                'not thread-safe, so writing is serialized with reading by '
+                'readers through opendrift.netcdf_lock. Readers using other '
+                'libraries which are not thread-safe may not be safe with this.',
+                'level':
+                self.CONFIG_LEVEL_ADVANCED
+            },
+            'general:output_compression': {
+                'type':
+                'bool',
+                'default':
+                False,
+                'description':
+                'Variables of the output file are compressed with zlib. '
+                'Output files are smaller, but slower to write and read.',
+                'level':
+                self.CONFIG_LEVEL_ADVANCED
+            },
+            'general:output_format': {
+                'type':
+                'enum',
+                'enum': ['multidimensional', 'contiguous_ragged'],
+                'default':
+                'multidimensional',
+                'description':
+                'multidimensional stores each variable as a (trajectory, time) '
+                'array, masked before seeding and after deactivation. '
+                'contiguous_ragged stores only the actual positions of each '
+                'trajectory after each other, with the number of positions '
+                'given by variable rowSize (CF contiguous ragged array).',
+                'level':
+                self.CONFIG_LEVEL_ADVANCED
+            },
             'general:time_step_minutes': {
                 'type':
                 'float',
@@ -1652,7 +1693,12 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                                      self.elements_scheduled.lon[indices],
                                      self.elements_scheduled.lat[indices])
         self.elements_scheduled.move_elements(self.elements, indices)
-        self.elements_scheduled_time = self.elements_scheduled_time[~indices]
+        num_released = np.sum(indices)
+        if indices[:num_released].all():  # Keeping a view if possible
+            self.elements_scheduled_time = \
+                self.elements_scheduled_time[num_released:]
+        else:
+            self.elements_scheduled_time = self.elements_scheduled_time[~indices]
         logger.debug('Released %i new elements.' % np.sum(indices))
 
     def closest_ocean_points(self, lon, lat):
@@ -1696,6 +1742,16 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                     (np.sum(land != 0), len(lon)))
         landlons = lon[land != 0]
         landlats = lat[land != 0]
+
+        # Using precomputed closest ocean cells of landmask raster, if any
+        raster = getattr(land_reader, 'landmask_raster', None)
+        if raster is not None:
+            x, y = land_reader.lonlat2xy(landlons, landlats)
+            x, y, within = raster.nearest_ocean(x, y)
+            if within.all():
+                lon[land != 0], lat[land != 0] = land_reader.xy2lonlat(x, y)
+                return lon, lat
+
         longrid = np.arange(lonmin, lonmax, deltalon)
         latgrid = np.arange(latmin, latmax, deltalat)
         longrid, latgrid = np.meshgrid(longrid, latgrid)
@@ -2445,11 +2501,15 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
         if len(indices) == 0 or np.sum(indices) == 0:
             logger.debug('No elements to deactivate')
             return  # No elements scheduled for deactivation
-        # Basic, but some more housekeeping will be required later
-        self.elements.move_elements(self.elements_deactivated, indices)
+        # Removed elements are replaced by the last active elements,
+        # and the same swap is applied to the environment arrays
+        holes, sources = self.elements.move_elements(
+            self.elements_deactivated, indices, keep_order=False)
+        num_active = self.num_elements_active()
         logger.debug('Removed %i elements.' % (np.sum(indices)))
         if hasattr(self, 'environment'):
-            self.environment = self.environment[~indices]
+            self.environment[holes] = self.environment[sources]
+            self.environment = self.environment[:num_active]
             logger.debug('Removed %i values from environment.' %
                          (np.sum(indices)))
         if hasattr(self, 'environment_profiles') and \
@@ -2457,8 +2517,9 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
             for varname, profiles in self.environment_profiles.items():
                 logger.debug('remove items from profile for ' + varname)
                 if varname != 'z':
+                    profiles[:, holes] = profiles[:, sources]
                     self.environment_profiles[varname] = \
-                        profiles[:, ~indices]
+                        profiles[:, :num_active]
             logger.debug('Removed %i values from environment_profiles.' %
                          (np.sum(indices)))
             #if self.num_elements_active() == 0:
@@ -2530,6 +2591,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
         if self.num_elements_scheduled() == 0:
             raise ValueError('Please seed elements before starting a run.')
         self.elements = self.ElementType()
+        # Active elements are released into storage for all scheduled
+        self.elements.reserve(self.num_elements_scheduled())
 
         # Export seed_geojson as FeatureCollection string
         self.add_metadata('seed_geojson',
@@ -2788,10 +2851,9 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                     del self.history_metadata[m]
 
         history_dtype = np.dtype(history_dtype_fields)
-        self.history = np.ma.array(np.zeros(
-            (len(self.elements_scheduled), self.export_buffer_length)),
-                                   dtype=history_dtype)
-        self.history.mask = True
+        self.history_recorder = HistoryRecorder(
+            history_dtype, len(self.elements_scheduled),
+            self.export_buffer_length)
         self.steps_exported = 0
 
         if outfile is not None:
@@ -2977,6 +3039,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                 else:
                     self.add_metadata(keyword, self.priority_list[var])
 
+        self.minvals, self.maxvals = self.history_recorder.extrema()
+
         if outfile is not None:
             logger.debug('Writing and closing output file: %s' % outfile)
             # Write buffer to outfile, and close
@@ -3037,6 +3101,19 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                 self.deactivate_elements(self.elements.lat > N,
                                          reason='outside')
 
+    @property
+    def history(self):
+        """Masked structured array with element properties and environment
+        at each output time step, with shape (elements, time steps)"""
+        if getattr(self, 'history_recorder', None) is not None:
+            return self.history_recorder.masked()
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        self.history_recorder = None
+        self._history = history
+
     def state_to_buffer(self):
         """Append present state (elements and environment) to recarray."""
 
@@ -3057,7 +3134,7 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
         if steps_calculation_float.is_integer() or self.time_step < timedelta(
                 seconds=1) or final_time_step is True:
-            element_ind = range(len(ID_ind))  # We write all elements
+            element_ind = slice(None)  # We write all elements
         else:
             deactivated = np.where(self.elements.status != 0)[0]
             if len(deactivated) == 0:
@@ -3067,45 +3144,15 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                          len(deactivated))
             ID_ind = ID_ind[deactivated]
             element_ind = deactivated
-            time_ind = np.minimum(time_ind + 1, self.history.shape[1] - 1)
-
-        # TODO: storing of variables and environment below should be collected in a single loop
-        # Store present state in history recarray
-        for i, var in enumerate(self.elements.variables):
-            if self.export_variables is not None and \
-                    var not in self.export_variables:
-                continue
-            # Temporarily assuming elements numbered
-            # from 0 to num_elements_active()
-            # Does not hold when importing ID from a saved file, where
-            # some elements have been deactivated
-            self.history[var][ID_ind, time_ind] = \
-                getattr(self.elements, var)[element_ind]
-            if len(ID_ind) > 0:
-                newmin = np.min(self.history[var][ID_ind, time_ind])
-                newmax = np.max(self.history[var][ID_ind, time_ind])
-                if var not in self.minvals:
-                    self.minvals[var] = newmin
-                    self.maxvals[var] = newmax
-                else:
-                    self.minvals[var] = np.minimum(self.minvals[var], newmin)
-                    self.maxvals[var] = np.maximum(self.maxvals[var], newmax)
-        # Copy environment data to history array
-        for i, var in enumerate(self.environment.dtype.names):
-            if self.export_variables is not None and \
-                    var not in self.export_variables:
-                continue
-            self.history[var][ID_ind, time_ind] = \
-                getattr(self.environment, var)[element_ind]
-            if len(ID_ind) > 0:
-                newmin = np.min(self.history[var][ID_ind, time_ind])
-                newmax = np.max(self.history[var][ID_ind, time_ind])
-                if var not in self.minvals:
-                    self.minvals[var] = newmin
-                    self.maxvals[var] = newmax
-                else:
-                    self.minvals[var] = np.minimum(self.minvals[var], newmin)
-                    self.maxvals[var] = np.maximum(self.maxvals[var], newmax)
+            time_ind = np.minimum(time_ind + 1, self.history_recorder.shape[1] - 1)
+
+        # Store present state (elements and environment) in history,
+        # all variables at once
+        values = {var: getattr(self.elements, var)
+                  for var in self.elements.variables}
+        for var in self.environment.dtype.names:
+            values[var] = self.environment[var]
+        self.history_recorder.record(ID_ind, time_ind, values, element_ind)
 
         # Call writer if buffer is full
         if (self.outfile is not None) and \
@@ -0,0 +1,134 @@
+# This file is part of OpenDrift.
+#
+# OpenDrift is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2
+#
+# OpenDrift is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OpenDrift.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Copyright 2015, Knut-Frode Dagestad, MET Norway
+
+import numpy as np
+
+
+class HistoryRecorder:
+    """Buffer of element properties and environment at each output time step.
+
+    Values are stored in a plain structured array of shape
+    (number of elements, number of output time steps), with a single
+    boolean array marking which (element, time step) values are recorded,
+    instead of a masked array with a mask for each variable.
+    The masked array used by plotting and analysis methods is only
+    created when requested, and minimum/maximum values of variables are
+    calculated when the buffer is cleared or exported.
+
+    Attributes:
+
+        data: structured ndarray with recorded values
+
+        valid: boolean ndarray, True where values are recorded
+    """
+
+    def __init__(self, dtype, num_elements, num_steps):
+        self.data = np.zeros((num_elements, num_steps), dtype=dtype)
+        self.valid = np.zeros((num_elements, num_steps), dtype=bool)
+        self.recorded_variables = set()
+        self._minvals = {}  # Extrema of values cleared from buffer
+        self._maxvals = {}
+        self._masked = None
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def record(self, element_index, time_index, values, source_index=slice(None)):
+        """Record values of all variables for given elements at a time step.
+
+        Args:
+            element_index: row (element ID - 1) of each recorded element
+            time_index: column (output time step) to record
+            values: dict with arrays (or scalars) of variables to record
+            source_index: index of recorded elements within the arrays
+        """
+        rows = np.empty(len(element_index), dtype=self.data.dtype)
+        for var in self.data.dtype.names:
+            if var not in values:
+                continue
+            value = np.asarray(values[var])
+            rows[var] = value[source_index] if value.ndim > 0 else value
+            self.recorded_variables.add(var)
+        self.data[element_index, time_index] = rows
+        self.valid[element_index, time_index] = True
+        self._masked = None
+
+    def variable(self, var, num_steps=None):
+        """Masked array of a single variable, for the first num_steps time steps"""
+        steps = slice(0, num_steps)
+        if var not in self.recorded_variables:
+            return np.ma.masked_all(self.data[var][:, steps].shape,
+                                    dtype=self.data.dtype[var])
+        return np.ma.array(self.data[var][:, steps],
+                           mask=~self.valid[:, steps])
+
+    def masked(self):
+        """Masked structured array of all recorded values"""
+        if self._masked is None:
+            mask = np.ones(self.data.shape,
+                           dtype=[(var, bool) for var in self.data.dtype.names])
+            invalid = ~self.valid
+            for var in self.recorded_variables:
+                mask[var] = invalid
+            self._masked = np.ma.array(self.data, mask=mask)
+        return self._masked
+
+    def extrema(self):
+        """Minimum and maximum values of each variable, in dicts"""
+        minvals = dict(self._minvals)
+        maxvals = dict(self._maxvals)
+        if self.valid.any():
+            for var in self.recorded_variables:
+                values = self.data[var][self.valid]
+                newmin = np.min(values)
+                newmax = np.max(values)
+                if var in minvals:
+                    minvals[var] = np.minimum(minvals[var], newmin)
+                    maxvals[var] = np.maximum(maxvals[var], newmax)
+                else:
+                    minvals[var] = newmin
+                    maxvals[var] = newmax
+        return minvals, maxvals
+
+    def swap(self, data=None, valid=None):
+        """Continue recording into other arrays, returning a recorder with
+        the values recorded so far, e.g. to be exported in the background.
+
+        Extrema of the recorded values are kept. Arrays of a previously
+        returned recorder may be reused as data and valid, when no longer used."""
+        recorded = HistoryRecorder(self.data.dtype, 0, 0)
+        recorded.data, recorded.valid = self.data, self.valid
+        recorded.recorded_variables = set(self.recorded_variables)
+        self._minvals, self._maxvals = self.extrema()
+        if data is None:
+            data = np.zeros_like(self.data)
+            valid = np.zeros_like(self.valid)
+        else:
+            valid[:] = False
+        self.data, self.valid = data, valid
+        self._masked = None
+        return recorded
+
+    def clear(self):
+        """Mark all values as not recorded, keeping their extrema"""
+        self._minvals, self._maxvals = self.extrema()
+        self.valid[:] = False
+        self._masked = None
@@ -17,11 +17,10 @@
 import sys
 from datetime import datetime, timedelta
 import numpy as np
-from scipy.interpolate import interp1d
 import logging; logger = logging.getLogger(__name__)
 from opendrift.models.basemodel import OpenDriftSimulation
 from opendrift.elements import LagrangianArray
-from opendrift.models.physics_methods import verticaldiffusivity_Large1994, verticaldiffusivity_Sundby1983, gls_tke, skillscore_liu_weissberg
+from opendrift.models.physics_methods import verticaldiffusivity_Large1994, verticaldiffusivity_Sundby1983, gls_tke, skillscore_liu_weissberg, ProfileIndex
 
 # Defining the oil element properties
 class Lagrangian3DArray(LagrangianArray):
@@ -133,6 +132,9 @@ class OceanDrift(OpenDriftSimulation):
             'vertical_mixing:TSprofiles': {'type': 'bool', 'default': False, 'level':
                 self.CONFIG_LEVEL_ADVANCED,
                 'description': 'Update T and S profiles within inner loop of vertical mixing. This takes more time, but may be slightly more accurate.'},
+            'vertical_mixing:batch_random_numbers': {'type': 'bool', 'default': False, 'level':
+                self.CONFIG_LEVEL_ADVANCED,
+                'description': 'Draw the random numbers of all inner loop time steps of vertical mixing at once. This is faster, but uses memory for (number of inner time steps) x (number of elements) numbers.'},
             'drift:wind_drift_depth': {'type': 'float', 'default': 0.1,
                 'min': 0, 'max': 10, 'units': 'meters',
                 'description': 'The direct wind drift (windage) is linearly decreasing from the surface value (wind_drift_factor) until 0 at this depth.',
@@ -510,13 +512,7 @@ class OceanDrift(OpenDriftSimulation):
             Tprofiles = None
 
         # prepare vertical interpolation coordinates
-        z_i = range(self.environment_profiles['z'].shape[0])
-        if len(z_i) == 1:
-            z_index = 0
-        else:
-            z_index = interp1d(-self.environment_profiles['z'],
-                               z_i, bounds_error=False,
-                               fill_value=(0,len(z_i)-1))  # Extrapolation
+        z_index = ProfileIndex(self.environment_profiles['z'])
 
         # Internal loop for fast time step of vertical mixing model.
         # Random walk needs faster time step than horizontal advection.
@@ -527,57 +523,91 @@ class OceanDrift(OpenDriftSimulation):
                       'scheme using ' + str(ntimes_mix) +
                       ' fast time steps of dt=' + str(dt_mix) + 's')
 
+        num_elements = self.num_elements_active()
         if store_depths is not False:
-            depths = np.zeros((ntimes_mix, self.num_elements_active()))
+            depths = np.zeros((ntimes_mix, num_elements))
             depths[0, :] = self.elements.z
 
         # Calculating dK/dz for all profiles before the loop
         gradK = -np.gradient(Kprofiles, self.environment_profiles['z'], axis=0)
         gradK[np.abs(gradK)<1e-10] = 0
 
+        # Visser et al. 1997 random walk mixing
+        # requires an inner loop time step dt such that
+        # dt << (d2K/dz2)^-1, e.g. typically dt << 15min
+        #
+        # NB: In the last term Kz is evaluated in zi, while
+        # it should be evaluated in (self.elements.z - dKdz*dt_mix)
+        # This is not expected have large impact on the result
+        r = 1.0/3
+        # Flux and random walk amplitude at each level of the profiles,
+        # looked up by flat index (level*num_elements + element)
+        flux_profiles = np.ravel(gradK*dt_mix)
+        walk_profiles = np.ravel(np.sqrt(Kprofiles*dt_mix*2/r))
+        columns = np.arange(num_elements)
+
+        # Buffers reused for all fast time steps
+        zi = np.empty(num_elements, dtype=np.intp)
+        flux = np.empty(num_elements)
+        walk = np.empty(num_elements)
+        below = np.empty(num_elements, dtype=bool)
+        surface = np.empty(num_elements, dtype=bool)
+        if self.get_config('vertical_mixing:batch_random_numbers') is True:
+            random_numbers = np.random.random((ntimes_mix, num_elements))
+        else:
+            random_numbers = None
+
+        # Positions are updated in place, as float64 as by the arithmetic
+        self.elements.z = self.elements.z.astype(np.float64)
+
         for i in range(0, ntimes_mix):
+            z = self.elements.z
             #remember which particles belong to the exact surface
-            surface = self.elements.z == 0
+            np.equal(z, 0, out=surface)
 
             # Update the terminal velocity of particles
             self.update_terminal_velocity(Tprofiles=Tprofiles, Sprofiles=Sprofiles, z_index=z_index)
             w = self.elements.terminal_velocity
+            moving = self.elements.moving
+
+            # Diffusivity gradient and random walk amplitude at z
+            z_index.nearest(z, out=zi)
+            zi *= num_elements
+            zi += columns
+            np.take(flux_profiles, zi, out=flux)
+            np.take(walk_profiles, zi, out=walk)
 
-            # Diffusivity and its gradient at z
-            zi = np.round(z_index(-self.elements.z)).astype(np.uint16)
-            Kz = Kprofiles[zi, range(Kprofiles.shape[1])]
-            dKdz = gradK[zi, range(Kprofiles.shape[1])]
-
-            # Visser et al. 1997 random walk mixing
-            # requires an inner loop time step dt such that
-            # dt << (d2K/dz2)^-1, e.g. typically dt << 15min
-            #
-            # NB: In the last term Kz is evaluated in zi, while
-            # it should be evaluated in (self.elements.z - dKdz*dt_mix)
-            # This is not expected have large impact on the result
-            R = 2*np.random.random(self.num_elements_active()) - 1
-            r = 1.0/3
+            if random_numbers is None:
+                R = np.random.random(num_elements)
+            else:
+                R = random_numbers[i]
+            R *= 2
+            R -= 1
             # New position  =  old position   - up_K_flux   + random walk
-            self.elements.z = self.elements.z - self.elements.moving*(
-                dKdz*dt_mix - R*np.sqrt((Kz*dt_mix*2/r)))
+            walk *= R
+            flux -= walk
+            flux *= moving
+            z -= flux
 
             # Reflect from surface
-            reflect = np.where(self.elements.z >= 0)
-            if len(reflect[0]) > 0:
-                self.elements.z[reflect] = -self.elements.z[reflect]
+            np.abs(z, out=z)
+            np.negative(z, out=z)
 
             # Reflect elements going below seafloor
-            bottom = np.where(np.logical_and(self.elements.z < Zmin, self.elements.moving == 1))
-            if len(bottom[0]) > 0:
-                logger.debug('%s elements penetrated seafloor, lifting up' % len(bottom[0]))
-                self.elements.z[bottom] = 2*Zmin[bottom] - self.elements.z[bottom]
+            np.less(z, Zmin, out=below)
+            below &= moving == 1
+            if below.any():
+                logger.debug('%s elements penetrated seafloor, lifting up' % below.sum())
+                z[below] = 2*Zmin[below] - z[below]
 
             # Advect due to buoyancy
-            self.elements.z = self.elements.z + w*dt_mix*self.elements.moving
+            np.multiply(w, dt_mix, out=flux)
+            flux *= moving
+            z += flux
 
             # Put the particles that belonged to the surface slick
             # (if present) back to the surface
-            self.elements.z[surface] = 0.
+            z[surface] = 0.
 
             # Formation of slick and wave mixing for surfaced particles
             # if implemented for this class
@@ -585,9 +615,9 @@ class OceanDrift(OpenDriftSimulation):
             self.surface_wave_mixing(dt_mix)
 
             # Let particles stick to bottom
-            bottom = np.where(self.elements.z < Zmin)
-            if len(bottom[0]) > 0:
-                logger.debug('%s elements reached seafloor, set to bottom' % len(bottom[0]))
+            np.less(self.elements.z, Zmin, out=below)
+            if below.any():
+                logger.debug('%s elements reached seafloor, set to bottom' % below.sum())
                 self.interact_with_seafloor()
                 self.bottom_interaction(Zmin)
 
@@ -283,6 +283,49 @@ def verticaldiffusivity_stepfunction(depth, MLD=20,
     K[depth>MLD] = k_below
     return K
 
+class ProfileIndex:
+    ''' Fractional index of depths in the vertical coordinate of profiles
+
+    Callable as scipy.interpolate.interp1d(-z, range(len(z))), with
+    depths above/below the profile range given the first/last index.
+    For the regular grids of analytical diffusivity profiles, the index
+    is calculated directly from the grid spacing.'''
+
+    def __init__(self, z):
+        depth = -np.atleast_1d(np.asarray(z, dtype=np.float64))
+        self.num_layers = len(depth)
+        order = np.argsort(depth, kind='stable')
+        self.depth = depth[order]
+        self.index = order.astype(np.float64)
+        self.step = None
+        if self.num_layers > 1:
+            step = np.diff(depth)
+            if np.all(step == step[0]) and step[0] != 0:
+                self.step = step[0]
+                self.depth0 = depth[0]
+
+    def __call__(self, depth):
+        if self.num_layers == 1:
+            return np.zeros(np.shape(depth))
+        depth = np.asarray(depth, dtype=np.float64)
+        if self.step is None:
+            return np.interp(depth, self.depth, self.index,
+                             left=0, right=self.num_layers - 1)
+        index = (depth - self.depth0)/self.step
+        index[depth < self.depth[0]] = 0
+        index[depth > self.depth[-1]] = self.num_layers - 1
+        return index
+
+    def nearest(self, z, out):
+        '''Index of the nearest layer for vertical positions z (negative depth),
+        stored in the given integer array'''
+        if self.num_layers == 1:
+            out[:] = 0
+            return out
+        np.rint(self(-z), out=out, casting='unsafe')
+        return out
+
+
 def gls_tke(windstress, depth, sea_water_density,
             tke, generic_length_scale, gls_parameters=None):
     '''From LADIM model.'''
@@ -29,6 +29,9 @@ import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 
 from .structured import StructuredReader
+from .blockcache import BlockCache
+from .meshcache import MeshCache
+from .tilecache import TileCache
 from .unstructured import UnstructuredReader
 from .continuous import ContinuousReader
 from .variables import Variables
@@ -223,6 +226,22 @@ class BaseReader(Variables, Combine, Filter):
             for cat, time in self.timing.items():
                 time = str(time)[0:str(time).find('.') + 2]
                 outStr += '%10s  %s\n' % (time, cat)
+        if getattr(self, 'prefetch', False) is True:
+            stats = self.prefetch_stats
+            outStr += '%10s  %s\n' % ('%i/%i' % (stats['hidden'], stats['requested']),
+                                      'prefetched blocks ready when needed')
+            outStr += '%10s  %s\n' % (stats['waited'], 'prefetched blocks waited for')
+            outStr += '%10s  %s\n' % (stats['discarded'], 'prefetched blocks discarded')
+        cache = getattr(self, 'block_cache', None)
+        if cache is not None:
+            outStr += '%10s  %s\n' % ('%i/%i' % (cache.hits, cache.hits + cache.misses),
+                                      'block cache hits (shared)')
+            outStr += '%10s  %s\n' % ('%.1f MB' % (cache.bytes/1e6), 'block cache size')
+        cache = getattr(self, 'tile_cache', None)
+        if cache is not None:
+            outStr += '%10s  %s\n' % ('%i/%i' % (cache.hits, cache.hits + cache.misses),
+                                      'tile cache hits (shared)')
+            outStr += '%10s  %s\n' % ('%.1f MB' % (cache.bytes/1e6), 'tile cache size')
         return outStr
 
     def clip_boundary_pixels(self, numpix):
@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class BlockCache():
+    """
+    Least recently used cache of data blocks read by structured readers,
+    limited by the total size of the cached arrays.
+
+    Blocks are stored per reader, variables, time and spatial window, and a
+    cached block is used for any request of the same reader and time with a
+    subset of its variables and positions within its window. The same cache
+    may be set on several readers, and readers may be shared between
+    several model instances, so that e.g. repeated or backward runs do not
+    read the same blocks again::
+
+        cache = BlockCache(max_bytes=1e9)
+        reader.set_block_cache(cache)
+
+    Attributes:
+
+        max_bytes: maximum total size of cached blocks.
+
+        hits, misses, evictions: counters of cache use.
+    """
+
+    def __init__(self, max_bytes=500e6):
+        self.max_bytes = max_bytes
+        self.blocks = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def block_bytes(block):
+        """Total size of the arrays of a ReaderBlock"""
+        size = 0
+        for data in block.data_dict.values():
+            for array in (data if isinstance(data, list) else [data]):
+                size += np.asarray(array).nbytes
+        return size + np.asarray(block.x).nbytes + np.asarray(block.y).nbytes
+
+    @staticmethod
+    def block_covers(block, x, y, z=None):
+        """Check if block covers the given positions, including depths for 3D blocks"""
+        if block.covers_positions(x, y) is False:
+            return False
+        if z is None or block.z is None or np.ndim(block.z) == 0 or len(block.z) < 2:
+            return True
+        return np.min(z) >= np.min(block.z) and np.max(z) <= np.max(block.z)
+
+    def get(self, reader_key, variables, time, x, y, z=None):
+        """Return a cached block with the given variables covering the positions, or None"""
+        with self._lock:
+            for key, block in reversed(self.blocks.items()):
+                if key[0] != reader_key or key[2] != time:
+                    continue
+                if not all(v in key[1] for v in variables):
+                    continue
+                if not self.block_covers(block, x, y, z):
+                    continue
+                self.blocks.move_to_end(key)
+                self.hits += 1
+                return block
+            self.misses += 1
+        return None
+
+    def put(self, reader_key, time, block):
+        """Store a block, evicting the least recently used blocks if needed"""
+        size = self.block_bytes(block)
+        if size > self.max_bytes:
+            logger.debug('Block of %i bytes larger than cache, not cached' % size)
+            return
+        key = (reader_key, tuple(block.data_dict.keys()), time,
+               (float(np.min(block.x)), float(np.max(block.x)),
+                float(np.min(block.y)), float(np.max(block.y))))
+        with self._lock:
+            if key in self.blocks:
+                self.bytes -= self.block_bytes(self.blocks.pop(key))
+            self.blocks[key] = block
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldkey, oldblock = self.blocks.popitem(last=False)
+                self.bytes -= self.block_bytes(oldblock)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all blocks from the cache, keeping the counters"""
+        with self._lock:
+            self.blocks = OrderedDict()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self.blocks)
@@ -1,5 +1,6 @@
 from abc import abstractmethod
 import numpy as np
+from opendrift import netcdf_lock
 from .variables import Variables
 from .consts import vector_pairs_xy
 import logging
@@ -32,7 +33,8 @@ class ContinuousReader(Variables):
                                    profiles_depth, time,
                                    reader_x, reader_y, z):
 
-        env = self.get_variables(variables, time, reader_x, reader_y, z)
+        with netcdf_lock:
+            env = self.get_variables(variables, time, reader_x, reader_y, z)
 
         logger.debug('Fetched env-before')
         env_profiles = None
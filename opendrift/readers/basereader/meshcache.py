@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class MeshCache():
+    """
+    Directory of spatial indices of unstructured meshes (KD-trees, boundary
+    polygons and triangle locators), so that these are not built again each
+    time a reader of the same mesh is constructed.
+
+    Indices are identified by a hash of the mesh coordinates. Their arrays
+    are written to a raw file, which is memory mapped when the index is
+    loaded, and described by a JSON header. Only arrays and indices of
+    known types (arrays, cKDTree and TriangleLocator) are stored and
+    rebuilt, so loading files does not execute code, as unpickling would.
+    Indices are however used as stored, so the directory should only be
+    writable by trusted users. The cache is used by all unstructured
+    readers when set before readers are constructed::
+
+        UnstructuredReader.mesh_cache = MeshCache('/path/to/cache')
+
+    or when the environment variable ``OPENDRIFT_MESH_CACHE`` is set to a
+    directory. Files of a directory may be shared between processes, and
+    are only read if written completely.
+
+    Attributes:
+
+        directory: where indices are stored.
+
+        hits, misses: counters of cache use.
+    """
+
+    alignment = 64  # Byte alignment of arrays in raw file
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(name, *arrays):
+        """Identification of index with given name, of given arrays"""
+        key = hashlib.sha1(name.encode())
+        for array in arrays:
+            for a in [np.ma.getdata(array), np.ma.getmaskarray(array)]:
+                a = np.ascontiguousarray(a)
+                key.update(repr((a.dtype.str, a.shape)).encode())
+                key.update(a.data)
+        return key.hexdigest()
+
+    def get(self, name, arrays, build):
+        """Load index of given arrays, or build index with function build()
+        and store it, if not in cache"""
+        filename = os.path.join(self.directory,
+                                '%s_%s' % (name, self.make_key(name, *arrays)))
+        try:
+            index = self.load(filename)
+            logger.debug('Loaded %s from %s' % (name, filename))
+            self.hits += 1
+            return index
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning('Could not load %s from %s, building again: %s' %
+                           (name, filename, e))
+
+        self.misses += 1
+        index = build()
+        try:
+            self.save(filename, index)
+            logger.debug('Stored %s to %s' % (name, filename))
+        except (OSError, TypeError) as e:
+            logger.warning('Could not store %s to %s: %s' % (name, filename, e))
+        return index
+
+    def save(self, filename, index):
+        """Store index to files filename.json and filename.bin (arrays)"""
+        arrays = []
+        header = {'index': _encode(index, arrays)}
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        header['arrays'] = []
+        tmp = '%s.%i.%i.tmp' % (filename, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            for array in arrays:
+                f.write(b'\0'*(-f.tell() % self.alignment))
+                header['arrays'].append((f.tell(), array.dtype.str,
+                                         array.shape))
+                f.write(array.tobytes())
+        os.replace(tmp, filename + '.bin')
+        # The header is written last, marking a complete index
+        with open(tmp, 'w') as f:
+            json.dump(header, f)
+        os.replace(tmp, filename + '.json')
+
+    @staticmethod
+    def load(filename):
+        """Load index from files filename.json and filename.bin, with arrays
+        memory mapped (copy-on-write) from the latter"""
+        with open(filename + '.json') as f:
+            header = json.load(f)
+        arrays = []
+        for offset, dtype, shape in header['arrays']:
+            dtype = np.dtype(dtype)
+            if dtype.hasobject:
+                raise ValueError('Arrays of objects are not loaded')
+            if np.prod(shape) == 0:
+                arrays.append(np.zeros(shape, dtype=dtype))
+            else:
+                arrays.append(np.memmap(filename + '.bin', dtype=dtype,
+                                        mode='c', offset=offset,
+                                        shape=tuple(shape)))
+        return _decode(header['index'], arrays)
+
+
+def _index_types():
+    """Classes of indices which are stored by their attributes (__dict__)
+    or pickle state (__getstate__/__setstate__)"""
+    from scipy.spatial import cKDTree
+    from opendrift.readers.interpolation.unstructured import TriangleLocator
+    return {'cKDTree': cKDTree, 'TriangleLocator': TriangleLocator}
+
+
+def _encode(obj, arrays):
+    """JSON description of obj, with arrays appended to given list"""
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, (np.bool_, np.integer, np.floating)):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            raise TypeError('Arrays of objects are not stored')
+        arrays.append(np.ascontiguousarray(obj))
+        return {'array': len(arrays) - 1}
+    if isinstance(obj, (list, tuple)):
+        return {type(obj).__name__: [_encode(o, arrays) for o in obj]}
+    for name, cls in _index_types().items():
+        if type(obj) is cls:
+            if hasattr(cls, '__setstate__'):
+                return {'type': name,
+                        'state': _encode(obj.__getstate__(), arrays)}
+            return {'type': name,
+                    'attributes': {k: _encode(v, arrays)
+                                   for k, v in vars(obj).items()}}
+    raise TypeError('Indices of type %s are not stored' % type(obj).__name__)
+
+
+def _decode(obj, arrays):
+    """Object of JSON description, with given arrays"""
+    if not isinstance(obj, dict):
+        return obj
+    if 'array' in obj:
+        return arrays[obj['array']]
+    if 'list' in obj:
+        return [_decode(o, arrays) for o in obj['list']]
+    if 'tuple' in obj:
+        return tuple(_decode(o, arrays) for o in obj['tuple'])
+    cls = _index_types()[obj['type']]
+    index = cls.__new__(cls)
+    if 'state' in obj:
+        index.__setstate__(_decode(obj['state'], arrays))
+    else:
+        index.__dict__.update({k: _decode(v, arrays)
+                               for k, v in obj['attributes'].items()})
+    return index
@@ -2,8 +2,11 @@ import numpy as np
 import pyproj
 from scipy.ndimage import map_coordinates
 from abc import abstractmethod
+from datetime import timedelta
 
+from opendrift import netcdf_lock
 from opendrift.readers.interpolation.structured import ReaderBlock
+from opendrift.readers.interpolation.interpolators import NearestValidTables
 from .variables import Variables
 
 import logging
@@ -32,6 +35,9 @@ class StructuredReader(Variables):
     y = None
     interpolation = 'linearNDFast'
     convolve = None  # Convolution kernel or kernel size
+    prefetch = False  # Fetch next time block in background, see `set_prefetch`
+    block_cache = None  # BlockCache shared between readers, see `set_block_cache`
+    tile_cache = None  # TileCache on disk for remote datasets, see `set_tile_cache`
 
     # Used to enable and track status of parallel coordinate transformations.
     __lonlat2xy_parallel__ = None
@@ -90,6 +96,16 @@ class StructuredReader(Variables):
         self.var_block_before = {}  # Data for last timestep before present
         self.var_block_after = {}  # Data for first timestep after present
 
+        # Blocks being fetched in background, see `set_prefetch`
+        self.prefetched_blocks = {}
+        self.prefetch_stats = {'requested': 0, 'hidden': 0, 'waited': 0,
+                               'discarded': 0}
+        self._prefetch_executor = None
+        self._previous_time = None
+
+        # Nearest valid cells of the masks of missing values, for all blocks
+        self.nearest_valid_tables = NearestValidTables()
+
     @abstractmethod
     def get_variables(self, variables, time=None, x=None, y=None, z=None):
         """
@@ -119,11 +135,170 @@ class StructuredReader(Variables):
         logger.debug('Clearing cache for reader %s before starting new simulation' % self.name)
         self.var_block_before = {}
         self.var_block_after = {}
+        self._discard_prefetched()
+        self._previous_time = None
         if self.time_step is None:  # Set buffer large nough for whole simulation
                 logger.debug('Time step is None for %s, setting buffer size large nough for whole simulation' % self.name)
                 self.set_buffer_size(max_speed, end_time-start_time)
         super().prepare(extent, start_time, end_time, max_speed)
 
+    def set_prefetch(self, prefetch=True):
+        """Fetch the next time block of data on a background thread.
+
+        When enabled, the block following the current time (in the
+        direction of the simulation) is read while the model computes,
+        for the current element positions. The prefetched block is used
+        if it still covers the element positions when it is needed,
+        otherwise it is read again. See `prefetch_stats` and `performance`
+        for how many reads were hidden.
+
+        Reading is serialized with reading by other readers and writing of
+        output through `opendrift.netcdf_lock`, as the netCDF/HDF5 library
+        is not thread-safe. Readers using other libraries which are not
+        thread-safe should not be prefetched.
+        """
+        self.prefetch = prefetch
+        if prefetch is True and self._prefetch_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._prefetch_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='prefetch')
+        elif prefetch is False:
+            self._discard_prefetched()
+
+    def _read_block(self, variables, time, x, y, z):
+        """Read a block of data from the reader"""
+        # Readers are not necessarily thread safe
+        with netcdf_lock:
+            reader_data_dict = self.__convolve_block__(
+                self.get_variables(variables, time, x, y, z))
+        return ReaderBlock(reader_data_dict,
+                           interpolation_horizontal=self.interpolation,
+                           nearest_valid_tables=self.nearest_valid_tables)
+
+    def set_block_cache(self, block_cache):
+        """Keep the blocks read by this reader in a BlockCache.
+
+        A cached block is used instead of reading again whenever it covers the
+        element positions, e.g. for backward or repeated runs. The same cache
+        may be set for several readers and models. Hits and misses are shown
+        by `performance`. Use None to stop caching.
+        """
+        self.block_cache = block_cache
+        if block_cache is not None and not hasattr(self, '_block_cache_key'):
+            import uuid
+            self._block_cache_key = uuid.uuid4().hex
+
+    def set_tile_cache(self, tile_cache):
+        """Read the variables of the dataset of this reader through a TileCache.
+
+        Data read from a remote dataset (e.g. OPeNDAP) is stored on local
+        disk, and repeated or overlapping requests, also of later runs, are
+        read from disk. The same cache may be set for several readers.
+        Use None to stop caching.
+        """
+        self.tile_cache = tile_cache
+
+    def _dataset_variable(self, name):
+        """Return variable of the dataset of this reader, read through
+        the TileCache if set"""
+        var = self.Dataset.variables[name]
+        if self.tile_cache is None:
+            return var
+        source = str(getattr(self.Dataset, 'encoding', {}).get('source', self.name))
+        if getattr(self, '_tile_cache_version', None) is None:
+            self._tile_cache_version = self.tile_cache.dataset_version(
+                self.Dataset, source)
+        return self.tile_cache.variable(source, name, var,
+                                        self._tile_cache_version)
+
+    def _get_block(self, variables, blockvars, time, x, y, z):
+        """Return a prefetched or cached block covering positions, otherwise read block"""
+        block = self._take_prefetched(blockvars, time, x, y, z)
+        if block is None and self.block_cache is not None:
+            if z is not None and getattr(self, 'z', None) is not None:
+                # Blocks extend at most to the uppermost and lowermost layer
+                z = np.clip(z, np.min(self.z), np.max(self.z))
+            block = self.block_cache.get(self._block_cache_key, variables,
+                                         time, x, y, z)
+            if block is not None:
+                logger.debug('Using cached block for %s' % time)
+                return block
+        if block is None:
+            block = self._read_block(variables, time, x, y, z)
+        if self.block_cache is not None:
+            self.block_cache.put(self._block_cache_key, time, block)
+        return block
+
+    def _take_prefetched(self, blockvars, time, x, y, z):
+        prefetched = self.prefetched_blocks.pop((blockvars, time), None)
+        if prefetched is None:
+            return None
+        future, zmin, zmax = prefetched
+        hidden = future.done()
+        try:
+            block = future.result()
+        except Exception as e:
+            logger.warning('Prefetching block for %s failed: %s' % (time, e))
+            self.prefetch_stats['discarded'] += 1
+            return None
+        covers_z = (z is None or getattr(self, 'z', None) is None or zmin is None or
+                    (np.min(z) >= zmin and np.max(z) <= zmax))
+        if not covers_z or block.covers_positions(x, y) is False:
+            logger.debug('Prefetched block for %s does not cover positions' % time)
+            self.prefetch_stats['discarded'] += 1
+            return None
+        if hidden:
+            self.prefetch_stats['hidden'] += 1
+        else:
+            self.prefetch_stats['waited'] += 1
+        logger.debug('Using prefetched block for %s' % time)
+        return block
+
+    def _prefetch_next(self, time, time_before, time_after, before, after,
+                       x, y, z):
+        """Start reading the block following the current one in background
+
+        before and after are the (variables, key) of the before and after blocks,
+        the next block is stored with the key of the block it will replace."""
+        backwards = self._previous_time is not None and time < self._previous_time
+        self._previous_time = time
+        if backwards:
+            variables, blockvars = before
+            next_time = self.nearest_time(time_before - timedelta(seconds=1))[1]
+            if next_time is None or next_time >= time_before or \
+                    next_time < self.start_time:
+                return
+        else:
+            current = time_after if time_after is not None else time_before
+            next_time = self.nearest_time(current + timedelta(seconds=1))[2]
+            if next_time is None or next_time <= current or \
+                    next_time > self.end_time:
+                return
+            variables, blockvars = after
+
+        key = (blockvars, next_time)
+        if key in self.prefetched_blocks:
+            return
+        # Cancel blocks which will not be needed
+        for k in list(self.prefetched_blocks):
+            if k[0] == blockvars:
+                self.prefetched_blocks.pop(k)[0].cancel()
+
+        logger.debug('Prefetching block for %s' % next_time)
+        self.prefetch_stats['requested'] += 1
+        zmin = zmax = None
+        if z is not None:
+            zmin, zmax = np.min(z), np.max(z)
+        future = self._prefetch_executor.submit(
+            self._read_block, list(variables), next_time,
+            x.copy(), y.copy(), None if z is None else np.array(z, copy=True))
+        self.prefetched_blocks[key] = (future, zmin, zmax)
+
+    def _discard_prefetched(self):
+        for future, zmin, zmax in self.prefetched_blocks.values():
+            future.cancel()
+        self.prefetched_blocks = {}
+
     def set_convolution_kernel(self, convolve):
         """Set a convolution kernel or kernel size (of array of ones) used by `get_variables` on read variables."""
         self.convolve = convolve
@@ -238,14 +413,9 @@ class StructuredReader(Variables):
         # Fetch data, if no buffer is available
         if block_before is None or \
                 block_before.time != time_before:
-            reader_data_dict = \
-                    self.__convolve_block__(
-                self.get_variables(blockvariables_before, time_before,
-                                    mx, my, mz)
-                )
             self.var_block_before[blockvars_before] = \
-                ReaderBlock(reader_data_dict,
-                            interpolation_horizontal=self.interpolation)
+                self._get_block(blockvariables_before, blockvars_before,
+                                time_before, mx, my, mz)
             try:
                 len_z = len(self.var_block_before[blockvars_before].z)
             except:
@@ -260,13 +430,9 @@ class StructuredReader(Variables):
             if time_after is None:
                 self.var_block_after[blockvars_after] = block_before
             else:
-                reader_data_dict = self.__convolve_block__(
-                    self.get_variables(blockvariables_after, time_after, mx,
-                                       my, mz))
                 self.var_block_after[blockvars_after] = \
-                    ReaderBlock(
-                        reader_data_dict,
-                        interpolation_horizontal=self.interpolation)
+                    self._get_block(blockvariables_after, blockvars_after,
+                                    time_after, mx, my, mz)
                 try:
                     len_z = len(self.var_block_after[blockvars_after].z)
                 except:
@@ -289,20 +455,33 @@ class StructuredReader(Variables):
                            (self.name, str(self.buffer)))
             # TODO; could add dynamic incraes of buffer size here
 
+        # Read the next block in background while the model computes
+        if self.prefetch is True and not all(v in static_variables
+                                             for v in variables):
+            self._prefetch_next(time, time_before, time_after,
+                                (blockvariables_before, blockvars_before),
+                                (blockvariables_after, blockvars_after),
+                                mx, my, mz)
+
         ############################################################
         # Interpolate before/after blocks onto particles in space
         ############################################################
         self.timer_start('interpolation')
         logger.debug('Interpolating before (%s) in space  (%s)' %
                      (block_before.time, self.interpolation))
+        # The interpolators only depend on grid and positions, and are
+        # shared by the before and after blocks if these have the same grid
+        plan = block_before.interpolation_plan(reader_x, reader_y, z)
         env_before, env_profiles_before = block_before.interpolate(
-            reader_x, reader_y, z, variables, profiles, profiles_depth)
+            reader_x, reader_y, z, variables, profiles, profiles_depth,
+            plan=plan)
 
         if (time_after is not None) and (time_before != time):
             logger.debug('Interpolating after (%s) in space  (%s)' %
                          (block_after.time, self.interpolation))
             env_after, env_profiles_after = block_after.interpolate(
-                reader_x, reader_y, z, variables, profiles, profiles_depth)
+                reader_x, reader_y, z, variables, profiles, profiles_depth,
+                plan=plan)
 
         self.timer_end('interpolation')
 
@@ -0,0 +1,254 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TileCache():
+    """
+    Read-through cache on local disk of data read by readers from remote
+    (xarray) datasets, e.g. OPeNDAP/THREDDS, so that repeated and overlapping
+    requests of later runs are read from disk instead of over the network.
+
+    Variables are stored as tiles of tile_size x tile_size grid points in
+    the two last (horizontal) dimensions, for each index of other
+    dimensions indexed with an integer (e.g. time), and covering the
+    full length of remaining dimensions (e.g. depth). Tiles of integer
+    indexed dimensions are identified by the coordinate value (e.g. time)
+    if the dimension has a coordinate, so that tiles remain valid when
+    e.g. an aggregate is extended with new times. Tiles are also identified
+    by a version of the dataset (see `dataset_version`), so that tiles are
+    not reused when values of existing times are replaced, e.g. by newer
+    forecasts in a best estimate aggregate. Tiles missing from the
+    cache are read from the dataset with a single request per variable.
+    Least recently used tiles are removed to keep the total size below
+    max_bytes. The same directory may be used by several readers and
+    processes::
+
+        cache = TileCache('/path/to/cache', max_bytes=20e9)
+        reader.set_tile_cache(cache)
+
+    Attributes:
+
+        directory: where tiles are stored.
+
+        max_bytes: maximum total size of stored tiles.
+
+        tile_size: number of grid points along each horizontal side of tiles.
+
+        hits, misses, evictions: counters of tiles read from cache,
+        read from dataset, and removed from cache.
+    """
+
+    def __init__(self, directory, max_bytes=10e9, tile_size=128):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        # Sizes of stored tiles, from least to most recently used
+        os.makedirs(directory, exist_ok=True)
+        tiles = []
+        for filename in os.listdir(directory):
+            if filename.endswith('.npy'):
+                stat = os.stat(os.path.join(directory, filename))
+                tiles.append((stat.st_mtime, filename, stat.st_size))
+        self.tiles = OrderedDict((filename, size) for mtime, filename, size
+                                 in sorted(tiles))
+        self.bytes = sum(self.tiles.values())
+
+    @staticmethod
+    def dataset_version(dataset, source):
+        """Identification of the version of a dataset, from global attributes
+        date_created, date_modified, date_metadata_modified and history,
+        from values of forecast_reference_time, and from modification
+        time if source is a local file"""
+        version = hashlib.sha1()
+        attrs = getattr(dataset, 'attrs', {})
+        for attr in ['date_created', 'date_modified',
+                     'date_metadata_modified', 'history']:
+            if attr in attrs:
+                version.update(repr((attr, str(attrs[attr]))).encode())
+        variables = getattr(dataset, 'variables', {})
+        if 'forecast_reference_time' in variables:
+            values = np.asarray(variables['forecast_reference_time'].values)
+            version.update(repr(values.tolist()).encode())
+        if os.path.isfile(source):
+            version.update(repr(os.path.getmtime(source)).encode())
+        return version.hexdigest()
+
+    def variable(self, source, name, var, version=None):
+        """Return variable var of dataset source, read through this cache.
+        Tiles stored for other versions of the dataset are not used."""
+        return CachedVariable(self, source, name, var, version)
+
+    def read(self, source, name, var, key, version=None):
+        """Return var[key], as read by xarray/netCDF4 (outer indexing),
+        using tiles stored in cache"""
+        key = key if isinstance(key, tuple) else (key,)
+        shape = var.shape
+        if len(key) != len(shape) or len(shape) < 2 or \
+                any(isinstance(k, (int, np.integer)) for k in key[-2:]):
+            return np.asarray(var[key])  # Not tiled
+
+        # Integer indices of leading dimensions are part of tile identity
+        ident = [source, version, name, self.tile_size, shape[-2:]]
+        read_key = []
+        select = []
+        for dim, (k, size) in enumerate(zip(key[:-2], shape[:-2])):
+            if isinstance(k, (int, np.integer)):
+                k = int(k) % size
+                read_key.append(k)
+                ident.append(self._coordinate(var, dim, k, size))
+            else:
+                read_key.append(slice(None))
+                ident.append(('all', size))
+                select.append(self._indices(k, size))
+
+        # Horizontal tiles covering requested indices
+        yx = [self._indices(k, size) for k, size in zip(key[-2:], shape[-2:])]
+        if min(len(i) for i in yx) == 0:
+            return np.asarray(var[key])
+        first = [int(i.min()) // self.tile_size for i in yx]
+        last = [int(i.max()) // self.tile_size for i in yx]
+        tiles = {}
+        missing = []
+        for ty in range(first[0], last[0] + 1):
+            for tx in range(first[1], last[1] + 1):
+                filename = self._filename(ident, ty, tx)
+                tile = self._load(filename)
+                if tile is None:
+                    missing.append((ty, tx))
+                else:
+                    tiles[(ty, tx)] = tile
+
+        if len(missing) > 0:
+            # Read all missing tiles with one request
+            ty0 = min(t[0] for t in missing)
+            ty1 = max(t[0] for t in missing)
+            tx0 = min(t[1] for t in missing)
+            tx1 = max(t[1] for t in missing)
+            ts = self.tile_size
+            logger.debug('Reading %i tiles of %s from %s' %
+                         (len(missing), name, source))
+            data = np.asarray(var[tuple(read_key) + (
+                slice(ty0*ts, min((ty1 + 1)*ts, shape[-2])),
+                slice(tx0*ts, min((tx1 + 1)*ts, shape[-1])))])
+            for ty, tx in missing:
+                tile = data[..., (ty - ty0)*ts:(ty - ty0 + 1)*ts,
+                            (tx - tx0)*ts:(tx - tx0 + 1)*ts]
+                self._store(self._filename(ident, ty, tx), tile)
+                tiles[(ty, tx)] = tile
+
+        block = np.concatenate([
+            np.concatenate([tiles[(ty, tx)]
+                            for tx in range(first[1], last[1] + 1)], axis=-1)
+            for ty in range(first[0], last[0] + 1)], axis=-2)
+        offsets = [f*self.tile_size for f in first]
+        select += [i - o for i, o in zip(yx, offsets)]
+        return block[np.ix_(*select)]
+
+    @staticmethod
+    def _indices(k, size):
+        """Indices along dimension of given length, of slice, range or array"""
+        if isinstance(k, slice):
+            return np.arange(size)[k]
+        return np.asarray(k, dtype=np.int64).ravel() % size
+
+    @staticmethod
+    def _coordinate(var, dim, index, size):
+        """Identification of given index of dimension, by coordinate value if available"""
+        try:
+            coordinate = var[var.dims[dim]].values
+            if coordinate.shape == (size,):
+                return ('value', str(coordinate[index]))
+        except Exception:
+            pass
+        return ('index', index, size)
+
+    def _filename(self, ident, ty, tx):
+        return hashlib.sha1(repr(ident + [ty, tx]).encode()).hexdigest() + '.npy'
+
+    def _load(self, filename):
+        path = os.path.join(self.directory, filename)
+        try:
+            tile = np.load(path)
+            size = os.path.getsize(path)
+        except (FileNotFoundError, ValueError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            # Possibly stored by other process
+            self.bytes += size - self.tiles.pop(filename, 0)
+            self.tiles[filename] = size
+        try:
+            os.utime(path)  # Recently used also for other processes
+        except OSError:
+            pass
+        return tile
+
+    def _store(self, filename, tile):
+        path = os.path.join(self.directory, filename)
+        tmp = '%s.%i.%i.tmp' % (path, os.getpid(), threading.get_ident())
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(tile))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning('Could not store tile to %s: %s' % (path, e))
+            return
+        size = os.path.getsize(path)
+        with self._lock:
+            self.bytes += size - self.tiles.pop(filename, 0)
+            self.tiles[filename] = size
+            while self.bytes > self.max_bytes and len(self.tiles) > 1:
+                oldfile, oldsize = self.tiles.popitem(last=False)
+                self.bytes -= oldsize
+                self.evictions += 1
+                try:
+                    os.remove(os.path.join(self.directory, oldfile))
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Remove all tiles from the cache, keeping the counters"""
+        with self._lock:
+            for filename in self.tiles:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+            self.tiles = OrderedDict()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self.tiles)
+
+
+class CachedVariable():
+    """Variable of a dataset, where indexing reads through a TileCache.
+    Other attributes are those of the variable."""
+
+    def __init__(self, cache, source, name, var, version=None):
+        self._cache = cache
+        self._source = source
+        self._name = name
+        self._var = var
+        self._version = version
+
+    def __getitem__(self, key):
+        return self._cache.read(self._source, self._name, self._var, key,
+                                self._version)
+
+    def __getattr__(self, attr):
+        return getattr(self._var, attr)
@@ -1,10 +1,13 @@
+import os
 from abc import abstractmethod
 import numpy as np
 import scipy
 import logging
 logger = logging.getLogger(__name__)
 
+from opendrift import netcdf_lock
 from .variables import Variables
+from .meshcache import MeshCache
 
 
 class UnstructuredReader(Variables):
@@ -26,6 +29,10 @@ class UnstructuredReader(Variables):
     # Number of parallel threads to use when possible
     PARALLEL_WORKERS = -1
 
+    # MeshCache where spatial indices of meshes are stored and reused
+    mesh_cache = MeshCache(os.environ['OPENDRIFT_MESH_CACHE']) \
+        if os.environ.get('OPENDRIFT_MESH_CACHE') else None
+
     boundary = None
 
     # nodes
@@ -40,6 +47,9 @@ class UnstructuredReader(Variables):
     face_variables = None # list of std-name variables defined at center of faces
     faces_idx = None
 
+    # triangles
+    triangle_locator = None # TriangleLocator of nodes, for linear interpolation
+
     def __init__(self):
         super().__init__()
 
@@ -58,7 +68,8 @@ class UnstructuredReader(Variables):
                                    profiles_depth, time,
                                    reader_x, reader_y, z):
 
-        env = self.get_variables(variables, time, reader_x, reader_y, z)
+        with netcdf_lock:
+            env = self.get_variables(variables, time, reader_x, reader_y, z)
 
         # We probably have to use an UnstructuredBlock to store closest time-steps, and thus avoid fetching
         # more data on every call.
@@ -124,9 +135,12 @@ class UnstructuredReader(Variables):
         from scipy.spatial import ConvexHull
 
         P = np.vstack((x, y)).T
-        hull = ConvexHull(P)
 
-        boundary = P[hull.vertices, :]
+        def build():
+            hull = ConvexHull(P)
+            return P[hull.vertices, :]
+
+        boundary = self._cached_('boundary', (x, y), build)
         boundary = prep(Polygon(boundary))
 
         return boundary
@@ -154,10 +168,26 @@ class UnstructuredReader(Variables):
 
         return idx
 
+    def _build_triangle_locator_(self, x, y, triangles):
+        """
+        Builds a TriangleLocator of the mesh, which is reused between calls
+        """
+        from opendrift.readers.interpolation.unstructured import TriangleLocator
+        return self._cached_('triangles', (x, y, triangles),
+                             lambda: TriangleLocator(x, y, triangles))
+
     def _build_ckdtree_(self, x, y):
         from scipy.spatial import cKDTree
         P = np.vstack((x, y)).T
-        return cKDTree(P)
+        return self._cached_('ckdtree', (x, y), lambda: cKDTree(P))
+
+    def _cached_(self, name, arrays, build):
+        """
+        Return index built by build(), or loaded from mesh_cache if set
+        """
+        if self.mesh_cache is None:
+            return build()
+        return self.mesh_cache.get(name, arrays, build)
 
     def __nearest_ckdtree__(self, idx, x, y):
         """
@@ -1,3 +1,4 @@
 from .interpolators import *
-from .structured import ReaderBlock
+from .structured import ReaderBlock, InterpolationPlan
 
+from .unstructured import TriangleLocator
@@ -1,6 +1,6 @@
 import logging
 import numpy as np
-from scipy.ndimage import map_coordinates, grey_dilation
+from scipy.ndimage import map_coordinates, grey_dilation, distance_transform_cdt
 import logging; logging.captureWarnings(True); logger = logging.getLogger(__name__)
 from scipy.interpolate import interp1d, LinearNDInterpolator
 
@@ -19,6 +19,61 @@ def expand_numpy_array(data):
     data[data==np.finfo(np.float64).min] = np.nan
 
 
+def nearest_valid_indices(invalid, max_distance=10):
+    """Indices of invalid cells, and of the nearest valid cell for each of them
+
+    Distance is counted in cells, including diagonals, and cells further away
+    than max_distance from valid cells are not included."""
+    distance, indices = distance_transform_cdt(
+        invalid, metric='chessboard', return_indices=True)
+    fill = invalid & (distance <= max_distance)
+    return np.nonzero(fill), tuple(i[fill] for i in indices)
+
+
+class NearestValidTables():
+    """Tables of nearest_valid_indices of the last used masks, by grid
+
+    Kept by a reader, as the invalid (e.g. land) cells are usually the same
+    for all variables and times of its grid. A mask is compared only with the
+    masks of the same grid and number of invalid cells."""
+
+    def __init__(self, max_tables=32):
+        self.max_tables = max_tables
+        self.tables = []  # (key, mask, table), last used at the end
+
+    def __len__(self):
+        return len(self.tables)
+
+    def get(self, grid, invalid, max_distance=10):
+        """Table of nearest valid cells for the mask invalid of the given grid"""
+        key = (grid, invalid.shape, max_distance, np.count_nonzero(invalid))
+        for i, (table_key, mask, table) in enumerate(self.tables):
+            if table_key == key and np.array_equal(mask, invalid):
+                self.tables.append(self.tables.pop(i))
+                return table
+
+        table = nearest_valid_indices(invalid, max_distance)
+        self.tables.append((key, invalid, table))
+        if len(self.tables) > self.max_tables:
+            self.tables.pop(0)
+        return table
+
+
+def fill_nearest_valid(data, max_distance=10, tables=None, grid=None):
+    """Fill NaN-values of 2D array in place with the value of the nearest valid cell
+
+    The table of nearest valid cells is taken from tables (NearestValidTables)
+    for the given grid, if provided."""
+    invalid = ~np.isfinite(data)
+    if not invalid.any() or invalid.all():
+        return
+    if tables is None:
+        target, source = nearest_valid_indices(invalid, max_distance)
+    else:
+        target, source = tables.get(grid, invalid, max_distance)
+    data[target] = data[source]
+
+
 ###########################
 # 2D interpolator classes
 ###########################
@@ -107,39 +162,113 @@ class LinearND2DInterpolator():
 class Linear2DInterpolator():
 
     logger = logging.getLogger('opendrift')
+    nearest_valid_tables = None  # NearestValidTables of the reader, if any
 
     def __init__(self, xgrid, ygrid, x, y):
         self.x = x
         self.y = y
+        self.grid = (xgrid[0], xgrid[-1], ygrid[0], ygrid[-1])
         self.xi = (x - xgrid[0])/(xgrid[-1]-xgrid[0])*(len(xgrid)-1)
         self.yi = (y - ygrid[0])/(ygrid[-1]-ygrid[0])*(len(ygrid)-1)
+        self._bilinear_weights(len(xgrid), len(ygrid))
+
+    def _bilinear_weights(self, numx, numy):
+        """Corner indices and weights of each position, as used by map_coordinates
+
+        These only depend on the grid and the positions, and are reused
+        for all arrays and layers interpolated by this interpolator."""
+        if numx < 2 or numy < 2:
+            self.weights = None
+            return
+        x0 = np.clip(np.floor(self.xi), 0, numx - 2)
+        y0 = np.clip(np.floor(self.yi), 0, numy - 2)
+        outside = ~((self.xi >= 0) & (self.xi <= numx - 1) &
+                    (self.yi >= 0) & (self.yi <= numy - 1))
+        fx = np.where(outside, 0, self.xi - x0)
+        fy = np.where(outside, 0, self.yi - y0)
+        x0 = np.where(outside, 0, x0).astype(np.intp)
+        y0 = np.where(outside, 0, y0).astype(np.intp)
+        # Indices into the flattened horizontal grid
+        corner = y0*numx + x0
+        self.corners = (corner, corner + 1, corner + numx, corner + numx + 1)
+        self.weights = ((1 - fy)*(1 - fx), (1 - fy)*fx, fy*(1 - fx), fy*fx)
+        self.outside = outside
+
+    def _interpolate_bilinear(self, array):
+        """Bilinear interpolation of the last two dimensions of array"""
+        if self.weights is None or not np.issubdtype(array.dtype, np.floating):
+            if array.ndim == 2:
+                return map_coordinates(array, [self.yi, self.xi],
+                                       cval=np.nan, order=1)
+            return np.array([map_coordinates(layer, [self.yi, self.xi],
+                                             cval=np.nan, order=1)
+                             for layer in array])
+        flat = array.reshape(array.shape[:-2] + (-1,))
+        interp = sum(np.take(flat, corner, axis=-1)*weight
+                     for corner, weight in zip(self.corners, self.weights))
+        interp[..., self.outside] = np.nan
+        return interp.astype(array.dtype, copy=False)
 
     def __call__(self, array2d):
         if isinstance(array2d,np.ma.MaskedArray):
             logger.debug('Converting masked array to numpy array for interpolation')
             array2d = np.ma.filled(array2d, fill_value=np.nan)
+        if array2d.ndim == 3:
+            return self.interpolate_layers(array2d)
         if not np.isfinite(array2d).any():
             logger.warning('Only NaNs input to linearNDFast - returning')
             return np.nan*np.ones(len(self.xi))
 
         # Fill NaN-values with nearby real values
-        interp = map_coordinates(array2d, [self.yi, self.xi],
-                                 cval=np.nan, order=1)
+        interp = self._interpolate_bilinear(array2d)
         missing = np.where(~np.isfinite(interp))[0]
-        i=0
-        while len(missing) > 0:
-            i += 1
-            if i > 10:
-                logger.warning('Still NaN-values after 10 iterations, exiting!')
-                return interp
-            logger.debug('NaN values for %i elements, expanding data %i' %
-                          (len(missing), i))
-            expand_numpy_array(array2d)
+        if len(missing) > 0:
+            logger.debug('NaN values for %i elements, filling data' %
+                          len(missing))
+            fill_nearest_valid(array2d, tables=self.nearest_valid_tables,
+                               grid=self.grid)
             interp[missing] = map_coordinates(
                 array2d, [self.yi[missing], self.xi[missing]],
                 cval=np.nan, order=1, mode='nearest')
-            missing = np.where(~np.isfinite(interp))[0]
+            if not np.isfinite(interp[missing]).all():
+                logger.warning('Still NaN-values after filling 10 cells from valid data')
+
+        return interp
+
+    def interpolate_at_layers(self, array3d, layers):
+        """Interpolate each position at its own layer of a 3D array
+
+        Gives the same values as interpolating all layers, but only reads
+        the layer of each position."""
+        if isinstance(array3d, np.ma.MaskedArray):
+            array3d = np.ma.filled(array3d, fill_value=np.nan)
+        if self.weights is None or not np.issubdtype(array3d.dtype, np.floating):
+            interp = np.empty(len(self.xi))
+            for layer in np.unique(layers):
+                points = layers == layer
+                interp[points] = self(array3d[layer, :, :])[points]
+            return interp
+        flat = array3d.reshape(array3d.shape[0], -1)
+        interp = sum(flat[layers, corner]*weight
+                     for corner, weight in zip(self.corners, self.weights))
+        interp[self.outside] = np.nan
+        interp = interp.astype(array3d.dtype, copy=False)
+
+        # Missing values are filled layer by layer, as for 2D arrays
+        missing = ~np.isfinite(interp)
+        for layer in np.unique(layers[missing]):
+            points = missing & (layers == layer)
+            interp[points] = self(array3d[layer, :, :])[points]
+        return interp
+
+    def interpolate_layers(self, array3d):
+        """Interpolate all layers of a 3D array at once
 
+        Layers with missing values at some positions are filled
+        layer by layer, as for 2D arrays."""
+        interp = self._interpolate_bilinear(array3d)
+        for layer in np.where(~np.isfinite(interp).all(axis=1))[0]:
+            interp[layer, :] = self(array3d[layer, :, :])
         return interp
 
 
@@ -170,6 +299,8 @@ class Nearest1DInterpolator():
         self.zi = np.round(z_interpolator(z)).astype(np.uint8)
         self.zi[self.zi < 0] = 0
         self.zi[self.zi >= len(zgrid)] = len(zgrid) - 1
+        # Layer and weight of each position used for interpolation
+        self.layer_weights = [(self.zi, 1)]
 
     def __call__(self, array2d):
         return array2d[self.zi, range(len(self.zi))]
@@ -195,6 +326,9 @@ class Linear1DInterpolator():
         self.index_below = np.minimum(self.index_above + 1, len(zgrid) - 1)
         self.weight_above = 1 - (interp_zi - self.index_above)
         self.xi = range(len(z))
+        # Layers and weights of each position used for interpolation
+        self.layer_weights = [(self.index_above, self.weight_above),
+                              (self.index_below, 1 - self.weight_above)]
 
     def __call__(self, array2d):
         return array2d[self.index_above, self.xi]*self.weight_above + \
@@ -9,12 +9,71 @@ from opendrift.readers.basereader import variables
 import logging
 logger = logging.getLogger(__name__)
 
+class InterpolationPlan():
+    """Interpolators from a grid onto a given set of positions.
+
+    The plan only depends on the grid and the positions, and may be shared
+    by all variables and layers of the blocks before and after in time,
+    as long as these have the same grid."""
+
+    def __init__(self, block, x, y, z=None):
+        logger.debug('Initialising interpolator.')
+        self.xgrid = block.x
+        self.ygrid = block.y
+        self.zgrid = block.z
+        self.x = x
+        self.y = y
+        self.z = z
+        self.interpolator2d = block.Interpolator2DClass(block.x, block.y, x, y)
+        if block.nearest_valid_tables is not None:
+            self.interpolator2d.nearest_valid_tables = block.nearest_valid_tables
+        self.interpolator1d = None
+        if block.z is not None and len(np.atleast_1d(block.z)) > 1:
+            self.interpolator1d = block.Interpolator1DClass(block.z, z)
+        self._interpolator2d_nearest = None
+
+    @property
+    def interpolator2d_nearest(self):
+        """Nearest neighbour interpolator, e.g. for landmask, made when first needed"""
+        if self._interpolator2d_nearest is None:
+            if isinstance(self.interpolator2d, Nearest2DInterpolator):
+                self._interpolator2d_nearest = self.interpolator2d
+            else:
+                self._interpolator2d_nearest = Nearest2DInterpolator(
+                    self.xgrid, self.ygrid, self.x, self.y)
+        return self._interpolator2d_nearest
+
+    def matches(self, block, x, y, z=None):
+        """Check if this plan may be used to interpolate block onto the given positions"""
+        if x is not self.x or y is not self.y or z is not self.z:
+            return False
+        if type(self.interpolator2d) is not block.Interpolator2DClass:
+            return False
+        if self.interpolator1d is not None and \
+                type(self.interpolator1d) is not block.Interpolator1DClass:
+            return False
+        if (self.zgrid is None) != (block.z is None):
+            return False
+        return (np.array_equal(self.xgrid, block.x) and
+                np.array_equal(self.ygrid, block.y) and
+                (block.z is None or np.array_equal(np.atleast_1d(self.zgrid),
+                                                   np.atleast_1d(block.z))))
+
+
 class ReaderBlock():
     """Class to store and interpolate the output from a reader with data on a regular (structured) grid."""
 
+    # Interpolate 3D variables horizontally only at the layers used for
+    # vertical interpolation, except for variables where profiles are requested
+    only_needed_layers = True
+
     def __init__(self, data_dict,
                  interpolation_horizontal='linearNDFast',
-                 interpolation_vertical='linear'):
+                 interpolation_vertical='linear',
+                 nearest_valid_tables=None):
+
+        # Tables of nearest valid cells, kept by the reader (NearestValidTables)
+        self.nearest_valid_tables = nearest_valid_tables
 
         # Make pointers to data values, for convenience
         self.x = data_dict['x']
@@ -76,16 +135,27 @@ class ReaderBlock():
                           'for landmask, and %s for other variables'
                           % interpolation_horizontal)
 
-    def _initialize_interpolator(self, x, y, z=None):
-        logger.debug('Initialising interpolator.')
-        self.interpolator2d = self.Interpolator2DClass(self.x, self.y, x, y)
-        if self.z is not None and len(np.atleast_1d(self.z)) > 1:
-            self.interpolator1d = self.Interpolator1DClass(self.z, z)
+    def interpolation_plan(self, x, y, z=None, plan=None):
+        """Return plan if it can be used for this block and positions, otherwise a new plan"""
+        if plan is not None and plan.matches(self, x, y, z):
+            logger.debug('Reusing interpolator.')
+            return plan
+        return InterpolationPlan(self, x, y, z)
+
+    def _initialize_interpolator(self, x, y, z=None, plan=None):
+        self.plan = self.interpolation_plan(x, y, z, plan)
+        self.interpolator2d = self.plan.interpolator2d
+        if self.plan.interpolator1d is not None:
+            self.interpolator1d = self.plan.interpolator1d
 
     def interpolate(self, x, y, z=None, variables=None,
-                    profiles=[], profiles_depth=None):
+                    profiles=[], profiles_depth=None, plan=None):
+        """Interpolate all variables of the block onto the given positions.
 
-        self._initialize_interpolator(x, y, z)
+        An InterpolationPlan from interpolation_plan may be given, to reuse
+        the interpolators of another block with the same grid."""
+
+        self._initialize_interpolator(x, y, z, plan)
 
         env_dict = {}
         if profiles is not []:
@@ -94,7 +164,7 @@ class ReaderBlock():
             nearest = False
             if varname == 'land_binary_mask':
                 nearest = True
-                self.interpolator2d_nearest = Nearest2DInterpolator(self.x, self.y, x, y)
+                self.interpolator2d_nearest = self.plan.interpolator2d_nearest
             if type(data) is list:
                 num_ensembles = len(data)
                 logger.debug('Interpolating %i ensembles for %s' % (num_ensembles, varname))
@@ -110,6 +180,11 @@ class ReaderBlock():
                         horizontal[elnum] = int_full[elnum]
                     else:
                         horizontal[:, elnum] = int_full[:, elnum]
+            elif data.ndim == 3 and self.only_needed_layers is True and \
+                    self.plan.interpolator1d is not None and \
+                    (profiles is None or varname not in profiles):
+                env_dict[varname] = self._interpolate_needed_layers(data)
+                continue
             else:
                 horizontal = self._interpolate_horizontal_layers(data, nearest=nearest)
             if profiles is not None and varname in profiles:
@@ -133,13 +208,33 @@ class ReaderBlock():
         if data.ndim == 2:
             return interpolator2d(data)
         if data.ndim == 3:
+            if hasattr(interpolator2d, 'interpolate_layers'):
+                # All layers at once, with the same interpolation weights
+                return np.ma.array(interpolator2d(data), dtype=np.float64)
             num_layers = data.shape[0]
             # Allocate output array
             result = np.ma.empty((num_layers, len(interpolator2d.x)))
             for layer in range(num_layers):
-                result[layer, :] = self.interpolator2d(data[layer, :, :])
+                result[layer, :] = interpolator2d(data[layer, :, :])
             return result
 
+    def _interpolate_needed_layers(self, data):
+        """Interpolate 3D array at the layers used for vertical interpolation
+
+        Gives the same values as interpolating all layers horizontally and
+        then vertically, without interpolating the other layers."""
+        layer_weights = self.interpolator1d.layer_weights
+        if hasattr(self.interpolator2d, 'interpolate_at_layers'):
+            return sum(self.interpolator2d.interpolate_at_layers(data, layers)*weight
+                       for layers, weight in layer_weights)
+
+        # Otherwise interpolate only the layers used by any position
+        needed = np.unique(np.concatenate([layers for layers, weight in layer_weights]))
+        horizontal = np.ma.masked_all((data.shape[0], len(self.interpolator2d.x)))
+        for layer in needed:
+            horizontal[layer, :] = self.interpolator2d(data[layer, :, :])
+        return self.interpolator1d(horizontal)
+
     def covers_positions(self, x, y, z=None):
         '''Check if given positions are covered by this reader block.'''
 
@@ -0,0 +1,167 @@
+import numpy as np
+from scipy.spatial import cKDTree
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TriangleLocator():
+    """
+    Find the triangles of a mesh containing given positions, and the
+    barycentric weights of the triangle nodes, for linear interpolation of
+    values at nodes.
+
+    Triangles are found by walking from a first guess towards the position,
+    through the neighbouring triangle across the edge opposite to the most
+    negative barycentric coordinate. As elements move only a few triangles
+    between calls, the triangles found in the previous call are used as
+    first guesses, and the result of the previous call is reused for
+    identical positions (e.g. for other variables or times). Positions not
+    found by walking (e.g. across a concave boundary) are checked against
+    the triangles with the closest centroids.
+
+    Args:
+        x, y: positions of nodes
+
+        triangles: (number of triangles, 3) array of node indices
+    """
+
+    max_walk_steps = 30
+    num_candidates = 16  # Closest centroids checked when walk fails
+    tolerance = 1e-10  # Accepted negative barycentric coordinate
+
+    def __init__(self, x, y, triangles):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.triangles = np.asarray(triangles, dtype=np.int64)
+
+        # Affine transforms from position to barycentric coordinates
+        x1, x2, x3 = self.x[self.triangles].T
+        y1, y2, y3 = self.y[self.triangles].T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            det = (y2 - y3)*(x1 - x3) + (x3 - x2)*(y1 - y3)
+            self.transform = np.stack([(y2 - y3)/det, (x3 - x2)/det,
+                                       (y3 - y1)/det, (x1 - x3)/det,
+                                       x3, y3], axis=1)
+        self.transform[det == 0, 0:4] = np.nan  # Never containing positions
+
+        self.neighbors = self._find_neighbors(self.triangles)
+        self.centroids = cKDTree(np.stack([(x1 + x2 + x3)/3,
+                                           (y1 + y2 + y3)/3], axis=1))
+        self._nodes = None
+
+        self.last_x = None
+        self.last_y = None
+        self.last_triangle = None
+        self.last_weights = None
+
+    @staticmethod
+    def _find_neighbors(triangles):
+        """Neighbouring triangle across the edge opposite to each node, or -1"""
+        num_triangles = len(triangles)
+        edges = np.concatenate([triangles[:, [1, 2]], triangles[:, [2, 0]],
+                                triangles[:, [0, 1]]])
+        edges.sort(axis=1)
+        key = edges[:, 0]*(triangles.max() + 1) + edges[:, 1]
+        owner = np.tile(np.arange(num_triangles), 3)
+        opposite = np.repeat(np.arange(3), num_triangles)
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        shared = np.nonzero(key[1:] == key[:-1])[0]
+        first = order[shared]
+        second = order[shared + 1]
+        neighbors = np.full((num_triangles, 3), -1, dtype=np.int64)
+        neighbors[owner[first], opposite[first]] = owner[second]
+        neighbors[owner[second], opposite[second]] = owner[first]
+        return neighbors
+
+    def barycentric(self, triangle, x, y):
+        """Barycentric coordinates (n, 3) of positions within given triangles"""
+        t = self.transform[triangle]
+        dx = x - t[..., 4]
+        dy = y - t[..., 5]
+        b1 = t[..., 0]*dx + t[..., 1]*dy
+        b2 = t[..., 2]*dx + t[..., 3]*dy
+        return np.stack([b1, b2, 1 - b1 - b2], axis=-1)
+
+    def locate(self, x, y):
+        """Return triangle containing each position (-1 if outside mesh)
+        and barycentric weights (n, 3) of its nodes"""
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        if self.last_x is not None and np.array_equal(x, self.last_x) \
+                and np.array_equal(y, self.last_y):
+            return self.last_triangle, self.last_weights
+
+        # First guess from previous call, or from closest centroid
+        triangle = np.full(len(x), -1, dtype=np.int64)
+        if self.last_triangle is not None:
+            num = min(len(x), len(self.last_triangle))
+            triangle[:num] = self.last_triangle[:num]
+        noguess = np.nonzero(triangle < 0)[0]
+        if len(noguess) > 0:
+            triangle[noguess] = self.centroids.query(
+                np.stack([x[noguess], y[noguess]], axis=1))[1]
+
+        weights = np.zeros((len(x), 3))
+        lost = []
+        active = np.arange(len(x))
+        for step in range(self.max_walk_steps):
+            b = self.barycentric(triangle[active], x[active], y[active])
+            worst = np.argmin(np.nan_to_num(b, nan=-np.inf), axis=1)
+            inside = b[np.arange(len(active)), worst] >= -self.tolerance
+            weights[active[inside]] = b[inside]
+            active = active[~inside]
+            if len(active) == 0:
+                break
+            step_to = self.neighbors[triangle[active], worst[~inside]]
+            lost.append(active[step_to < 0])  # Walked out of mesh
+            active = active[step_to >= 0]
+            triangle[active] = step_to[step_to >= 0]
+        lost = np.concatenate(lost + [active])
+
+        if len(lost) > 0:
+            found, b = self._search_candidates(x[lost], y[lost])
+            triangle[lost] = found
+            weights[lost] = b
+
+        self.last_x, self.last_y = x, y
+        self.last_triangle, self.last_weights = triangle, weights
+        return triangle, weights
+
+    def _search_candidates(self, x, y):
+        """Check triangles with closest centroids, for positions not found by walking"""
+        k = min(self.num_candidates, len(self.triangles))
+        candidates = self.centroids.query(np.stack([x, y], axis=1), k=k)[1]
+        candidates = candidates.reshape(len(x), k)
+        b = self.barycentric(candidates, x[:, None], y[:, None])
+        inside = np.nan_to_num(b, nan=-np.inf).min(axis=2) >= -self.tolerance
+        first = np.argmax(inside, axis=1)
+        rows = np.arange(len(x))
+        found = np.where(inside[rows, first], candidates[rows, first], -1)
+        weights = np.where(found[:, None] >= 0, b[rows, first], 0)
+        return found, weights
+
+    def nearest_node(self, x, y):
+        """Index of node closest to positions"""
+        if self._nodes is None:
+            self._nodes = cKDTree(np.stack([self.x, self.y], axis=1))
+        return self._nodes.query(np.stack([x, y], axis=1))[1]
+
+    def node_weights(self, x, y):
+        """Nodes (n, 3) and weights (n, 3) for linear interpolation of
+        values at nodes. Positions outside the mesh get the value of
+        the closest node."""
+        triangle, weights = self.locate(x, y)
+        nodes = self.triangles[triangle]
+        outside = np.nonzero(triangle < 0)[0]
+        if len(outside) > 0:
+            nodes[outside] = self.nearest_node(
+                np.atleast_1d(x)[outside], np.atleast_1d(y)[outside])[:, None]
+            weights = weights.copy()
+            weights[outside] = (1, 0, 0)
+        return nodes, weights
+
+    def interpolate(self, values, x, y):
+        """Linear interpolation of values at nodes (last axis) to positions"""
+        nodes, weights = self.node_weights(x, y)
+        return (np.take(values, nodes, axis=-1)*weights).sum(axis=-1)
@@ -302,21 +302,15 @@ class Reader(BaseReader, StructuredReader):
                 self.z_rho_tot = depth.sdepth(Htot, self.hc, self.Cs_r,
                                               Vtransform=self.Vtransform)
 
-            H = self.sea_floor_depth_below_sea_level[indy, indx]
-            z_rho = depth.sdepth(H, self.hc, self.Cs_r,
-                                 Vtransform=self.Vtransform)
+            # Depth of s-levels within subset, as view of field for whole domain
+            window = (slice(indy[0], indy[-1] + 1), slice(indx[0], indx[-1] + 1))
+            z_rho = self.z_rho_tot[(slice(None),) + window]
             # Element indices must be relative to extracted subset
             indx_el = np.clip(indx_el - indx.min(), 0, z_rho.shape[2]-1)
             indy_el = np.clip(indy_el - indy.min(), 0, z_rho.shape[1]-1)
 
-            # Loop to find the layers covering the requested z-values
-            indz_min = 0
-            indz_max = self.num_layers
-            for i in range(self.num_layers):
-                if np.min(z-z_rho[i, indy_el, indx_el]) > 0:
-                    indz_min = i
-                if np.max(z-z_rho[i, indy_el, indx_el]) > 0:
-                    indz_max = i
+            # Find the layers covering the requested z-values
+            indz_min, indz_max = covering_layers(z, z_rho[:, indy_el, indx_el])
             indz = range(np.maximum(0, indz_min-self.verticalbuffer),
                          np.minimum(self.num_layers,
                                     indz_max + 1 + self.verticalbuffer))
@@ -334,7 +328,7 @@ class Reader(BaseReader, StructuredReader):
         for par in requested_variables:
             varname = [name for name, cf in
                        self.ROMS_variable_mapping.items() if cf == par]
-            var = self.Dataset.variables[varname[0]]
+            var = self._dataset_variable(varname[0])
 
             if par == 'land_binary_mask':
                variables[par] = self.land_binary_mask[indy, indx]
@@ -418,14 +412,8 @@ class Reader(BaseReader, StructuredReader):
                             logger.debug('Re-using sigma2z-coefficients')
                             # Select relevant subset of full arrays
                             zle = np.arange(zi1, zi2)  # The relevant depth levels
-                            A = self.s2z_A.copy()  # Awkward subsetting to prevent losing one dimension
-                            A = A[:,:,indx]
-                            A = A[:,indy,:]
-                            A = A[zle,:,:]
-                            C = self.s2z_C.copy()
-                            C = C[:,:,indx]
-                            C = C[:,indy,:]
-                            C = C[zle,:,:]
+                            A = self.s2z_A[(slice(zi1, zi2),) + window]
+                            C = self.s2z_C[(slice(zi1, zi2),) + window]
                             C = C - C.max() + variables[par].shape[0] - 1
                             C[C<1] = 1
                             A = A.reshape(len(zle), len(indx)*len(indy))
@@ -559,6 +547,24 @@ class Reader(BaseReader, StructuredReader):
         return variables
 
 
+def covering_layers(z, z_rho):
+    """Layers covering the given z-values
+
+    *z* : depths of elements
+
+    *z_rho* : depths of s-levels at elements, shape (layers, elements)
+
+    Returns the uppermost layer below all elements (or 0), and the
+    uppermost layer below any element (or the number of layers)
+    """
+    dz = z - z_rho
+    below_all = np.nonzero(np.min(dz, axis=1) > 0)[0]
+    below_any = np.nonzero(np.max(dz, axis=1) > 0)[0]
+    indz_min = below_all[-1] if len(below_all) > 0 else 0
+    indz_max = below_any[-1] if len(below_any) > 0 else z_rho.shape[0]
+    return indz_min, indz_max
+
+
 def rotate_vectors_angle(u, v, radians):
     u2 = u*np.cos(radians) - v*np.sin(radians)
     v2 = u*np.sin(radians) + v*np.cos(radians)
@@ -383,7 +383,7 @@ class Reader(StructuredReader, BaseReader):
                     self.variable_mapping[par] = \
                         self.variable_mapping[
                             self.rotate_mapping[par]]
-            var = self.Dataset.variables[self.variable_mapping[par]]
+            var = self._dataset_variable(self.variable_mapping[par])
 
             ensemble_dim = None
             if continuous is True:
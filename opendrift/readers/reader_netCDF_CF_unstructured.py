@@ -147,7 +147,7 @@ class Reader(BaseReader, UnstructuredReader):
             # skipping coordinate variables
             if var_name in [
                     'x', 'y', 'time', 'lon', 'lat', 'lonc', 'latc', 'siglay',
-                    'siglev', 'siglay_center', 'siglev_center'
+                    'siglev', 'siglay_center', 'siglev_center', 'nv'
             ]:
                 continue
 
@@ -176,6 +176,13 @@ class Reader(BaseReader, UnstructuredReader):
         logger.debug("building index of faces..")
         self.faces_idx = self._build_ckdtree_(self.xc, self.yc)
 
+        if 'nv' in self.dataset.variables:
+            logger.debug("building triangle locator..")
+            # Nodes of each face (triangle), counting from 1
+            triangles = np.ma.getdata(self.dataset['nv'][:]).T - 1
+            self.triangle_locator = self._build_triangle_locator_(
+                np.ma.getdata(self.x), np.ma.getdata(self.y), triangles)
+
         self.timer_end("build index")
 
         self.timer_end("open dataset")
@@ -219,8 +226,11 @@ class Reader(BaseReader, UnstructuredReader):
 
         .. note::
 
-            Currently this reader does not really interpolate. It looks up the
-            closest point in time and space.
+            If the file contains the nodes of each face (`nv`), node-variables
+            are interpolated linearly within the triangle containing each
+            position, and face-variables are taken from this triangle.
+            Otherwise the closest node or face is used. Vertically and in time
+            the closest layer and time are used.
 
         Each element has a lookup-table of its surrounding elements, this list can be
         used when looking up elements for the interpolator of an arbitrary
@@ -275,7 +285,20 @@ class Reader(BaseReader, UnstructuredReader):
 
         variables = {}
 
-        if node_variables:
+        if node_variables and self.triangle_locator is not None:
+            logger.debug("Interpolating node-variables linearly..")
+
+            nodes, weights = self.triangle_locator.node_weights(x, y)
+            assert len(nodes) == len(x)
+
+            for var in node_variables:
+                dvar = self.variable_mapping.get(var)
+                logger.debug("Interpolating: %s (%s)" % (var, dvar))
+                dvar = self.dataset[dvar]
+                variables[var] = self.__interpolate_nodes__(
+                    dvar, indx_nearest, nodes, weights, z)
+
+        elif node_variables:
             logger.debug("Interpolating node-variables..")
 
             nodes = self._nearest_node_(x, y)
@@ -306,7 +329,15 @@ class Reader(BaseReader, UnstructuredReader):
         if face_variables:
             logger.debug("Interpolating face-variables..")
 
-            fcs = self._nearest_face_(x, y)
+            if self.triangle_locator is not None:
+                # Face (triangle) containing positions, else closest face
+                fcs, _weights = self.triangle_locator.locate(x, y)
+                outside = fcs < 0
+                if outside.any():
+                    fcs = fcs.copy()
+                    fcs[outside] = self._nearest_face_(x[outside], y[outside])
+            else:
+                fcs = self._nearest_face_(x, y)
             assert len(fcs) == len(x)
 
             for var in face_variables:
@@ -333,6 +364,31 @@ class Reader(BaseReader, UnstructuredReader):
 
         return variables
 
+    def __interpolate_nodes__(self, var, indx_time, nodes, weights, z):
+        """
+        Linear interpolation of node-variable with weights of the nodes of
+        the triangle containing each position. At each node, the closest
+        sigma layer or level is used.
+        """
+        node_slice = slice(nodes.min(), nodes.max() + 1)
+        if 'siglev' in var.dimensions or 'siglay' in var.dimensions:
+            sigma_ind = np.stack([
+                self.__nearest_node_sigma__(var, nodes[:, k], z)
+                for k in range(3)], axis=1)
+            # Reading the smallest block covering the actual data
+            block = var[indx_time,
+                        slice(sigma_ind.min(), sigma_ind.max() + 1),
+                        node_slice]
+            values = block[sigma_ind - sigma_ind.min(), nodes - nodes.min()]
+        else:
+            if 'time' in var.dimensions:
+                block = var[indx_time, node_slice]
+            else:
+                block = var[node_slice]
+            values = block[nodes - nodes.min()]
+
+        return (values*weights).sum(axis=1)
+
     @staticmethod
     def _vector_nearest_(X, xp):
         """
@@ -259,6 +259,12 @@ class Reader(BaseReader,UnstructuredReader):
         logger.debug('Building CKDtree of static 2D nodes for nearest-neighbor search')
         self.reader_KDtree = self._build_ckdtree_(self.x,self.y)
 
+        # triangles of mesh elements for linear interpolation of 2D data, using _build_triangle_locator_() from unstructured.py
+        if 'SCHISM_hgrid_face_nodes' in self.dataset.variables:
+            logger.debug('Building triangle locator of mesh elements for linear interpolation')
+            self.triangle_locator = self._build_triangle_locator_(
+                self.x, self.y, self._mesh_triangles_())
+
         # build convex hull of points for particle-in-mesh checks using _build_boundary_polygon_() from unstructured.py
         logger.debug('Building convex hull of nodes for particle''s in-mesh checks')
         self.boundary = self._build_boundary_polygon_(self.x,self.y)
@@ -381,6 +387,20 @@ class Reader(BaseReader,UnstructuredReader):
 
         return variables
 
+    def _mesh_triangles_(self):
+        '''
+        Return the mesh elements as triangles of (0-based) node indices.
+        Quadrilateral elements are split in two triangles.
+        '''
+        face_nodes = self.dataset.variables['SCHISM_hgrid_face_nodes']
+        start_index = face_nodes.attrs.get('start_index', 1)
+        faces = np.asarray(face_nodes.values, dtype=np.float64)
+        if faces.ndim == 3: # tiled along time by mfdataset()
+            faces = faces[0]
+        faces = np.where(np.isfinite(faces) & (faces >= start_index), faces - start_index, -1).astype(np.int64) # fill values for triangles
+        quads = faces[:, 3] >= 0 if faces.shape[1] > 3 else np.zeros(len(faces), dtype=bool)
+        return np.concatenate([faces[:, 0:3], faces[quads][:, [0, 2, 3]]])
+
     def convert_3d_to_array(self,id_time,data,variable_dict):
         '''
         The function reshapes a data matrix of dimensions = [node,vertical_levels] (i.e. data at vertical levels, at given time step)
@@ -396,7 +416,8 @@ class Reader(BaseReader,UnstructuredReader):
             -variable_dict
         out :
             -flattened 'data' array
-            -addition of ['x_3d','y_3d','z_3d'] items to variable_dict if needed.
+            -addition of ['x_3d','y_3d','z_3d'] items to variable_dict if needed, as well as
+             'zcor_3d' i.e. vertical levels [node,vertical_levels] (nan below seabed)
         '''
 
         try:
@@ -434,6 +455,8 @@ class Reader(BaseReader,UnstructuredReader):
             variable_dict['x_3d'] = np.ravel(x_tiled_ma[~vertical_levels.mask])
             variable_dict['y_3d'] = np.ravel(y_tiled_ma[~vertical_levels.mask])
             variable_dict['z_3d'] = np.ravel(vertical_levels[~vertical_levels.mask])
+            # unflattened vertical levels, for vertical interpolation at nodes of triangles
+            variable_dict['zcor_3d'] = np.ma.filled(vertical_levels.astype(np.float64), np.nan)
 
         return data,variable_dict
 
@@ -543,6 +566,7 @@ class Reader(BaseReader,UnstructuredReader):
             self.var_block_before[blockvars_before] = \
                 ReaderBlockUnstruct(reader_data_dict,
                     KDtree = self.reader_KDtree,
+                    triangle_locator = self.triangle_locator,
                     interpolation_horizontal=self.interpolation)
             try:
                 len_z = len(self.var_block_before[blockvars_before].z)
@@ -568,6 +592,7 @@ class Reader(BaseReader,UnstructuredReader):
                     ReaderBlockUnstruct(
                         reader_data_dict,
                         KDtree = self.reader_KDtree,
+                        triangle_locator = self.triangle_locator,
                         interpolation_horizontal=self.interpolation)
                 try:
                     len_z = len(self.var_block_after[blockvars_after].z)
@@ -885,11 +910,15 @@ class ReaderBlockUnstruct():
            KDtree : for nearest-neighbor search (initialized using SCHISM nodes in reader's _init_() )
                     This is read from reader object, so that it is not recomputed every time
 
+           triangle_locator : TriangleLocator of mesh elements (from reader's _init_() ), for linear
+                    interpolation of 2D data within triangles instead of inverse-distance weighting
+
     """
     logger = logging.getLogger('opendrift')  # using common logger
 
     def __init__(self, data_dict,
                  KDtree = None,
+                 triangle_locator = None,
                  interpolation_horizontal='linearNDFast',
                  interpolation_vertical='linear'):
 
@@ -917,6 +946,9 @@ class ReaderBlockUnstruct():
             del self.data_dict['x_3d']
             del self.data_dict['y_3d']
             del self.data_dict['z_3d']
+            self.zcor_3d = data_dict.pop('zcor_3d', None)
+            if self.zcor_3d is not None:
+                self.zcor_3d[np.isinf(self.zcor_3d)] = 15.0 #limit to +15.0m i.e. above msl
 
         # Initialize KDtree(s)
         # > save the 2D one by default (initizalied during reader __init__()
@@ -924,13 +956,14 @@ class ReaderBlockUnstruct():
 
         logger.debug('saving reader''s 2D (horizontal) KDtree to ReaderBlockUnstruct')
         self.block_KDtree = KDtree # KDtree input to function = one computed during reader's __init__()
+        self.triangle_locator = triangle_locator
 
         # If we eventually use subset of nodes rather than full mesh, we'll need to re-compute the 2D KDtree
         # as well, instead of re-using the "full" one available from reader's init
         # logger.debug('Compute time-varying KDtree for 2D nearest-neighbor search')
         # self.block_KDtree = cKDTree(np.vstack((self.x,self.y)).T)  # KDtree input to function = one computed during reader's __init__()
 
-        if hasattr(self,'z_3d'):
+        if hasattr(self,'z_3d') and (self.triangle_locator is None or self.zcor_3d is None):
             # we need to compute a new KDtree for that time step using vertical coordinates at that time step
             logger.debug('Compute time-varying KDtree for 3D nearest-neighbor search (i.e using ''zcor'') ')
             # clean arrays if needed, especially z_3d (get rid of nan's) - keep only non-nan
@@ -995,7 +1028,8 @@ class ReaderBlockUnstruct():
             # land mask
             if varname == 'land_binary_mask':
                 nearest = True
-                self.interpolator2d_nearest = Nearest2DInterpolator(self.x, self.y, x, y)
+                if self.triangle_locator is None:
+                    self.interpolator2d_nearest = Nearest2DInterpolator(self.x, self.y, x, y)
             # ensemble data
             if type(data) is list:
                 num_ensembles = len(data)
@@ -1019,10 +1053,28 @@ class ReaderBlockUnstruct():
                 # print(varname)
                 nb_closest_nodes = 3
                 DMIN=1.e-10
-                if data.shape[0] == self.x.shape[0] : # 2D data- full slice
+                if data.shape[0] == self.x.shape[0] and self.triangle_locator is not None : # 2D data- full slice
+                    # linear interpolation within triangles, nearest node for land mask and outside mesh
+                    nodes, weights = self.triangle_locator.node_weights(x, y)
+                    if nearest:
+                        env_dict[varname] = data.take(nodes[np.arange(len(nodes)), weights.argmax(axis=1)])
+                    else:
+                        env_dict[varname] = (data.take(nodes)*weights).sum(-1)
+                    if profiles is not None and varname in profiles:
+                        profiles_dict[varname] = env_dict[varname]
+                    continue
+                elif data.shape[0] == self.x.shape[0] : # 2D data- full slice
                     #2D KDtree
                     dist,i=self.block_KDtree.query(np.vstack((x,y)).T,nb_closest_nodes, workers=-1) #quick nearest-neighbor lookup
                     # dist = distance to nodes / i = index of nodes
+                elif hasattr(self,'z_3d') and (data.shape[0] == self.x_3d.shape[0]) and \
+                        not hasattr(self, 'block_KDtree_3d') : #3D data
+                    # vertical interpolation at nodes of triangles, then linear interpolation within triangles
+                    nodes, weights = self.triangle_locator.node_weights(x, y)
+                    env_dict[varname] = (self._interpolate_vertical_nodes(data, nodes, z)*weights).sum(-1)
+                    if profiles is not None and varname in profiles:
+                        profiles_dict[varname] = env_dict[varname]
+                    continue
                 elif hasattr(self,'z_3d') and (data.shape[0] == self.x_3d.shape[0]) : #3D data
                     #3D KDtree
                     dist,i=self.block_KDtree_3d.query(np.vstack((x,y,z)).T,nb_closest_nodes, workers=-1) #quick nearest-neighbor lookup
@@ -1057,6 +1109,27 @@ class ReaderBlockUnstruct():
 
         return env_dict, profiles_dict
 
+    def _interpolate_vertical_nodes(self, data, nodes, z):
+        '''Linear interpolation of flattened 3d data at depths z, at given nodes [particle,3].
+           Values of the deepest (shallowest) level are used below (above) it.'''
+
+        levels = np.full(self.zcor_3d.shape, np.nan)
+        levels[~np.isnan(self.zcor_3d)] = data # unflatten data to [node,vertical_levels]
+        zcor = self.zcor_3d[nodes] # [particle,3,vertical_levels]
+        levels = levels[nodes]
+        z = np.broadcast_to(np.atleast_1d(z).astype(np.float64), nodes.shape[0:1])[:, None]
+        num_levels = zcor.shape[-1]
+        first = np.isnan(zcor).sum(axis=-1) # levels below seabed come first
+        below = (zcor <= z[..., None]).sum(axis=-1)
+        upper = np.clip(first + below, first, num_levels - 1)
+        lower = np.clip(first + below - 1, first, num_levels - 1)
+        z_upper = np.take_along_axis(zcor, upper[..., None], axis=-1)[..., 0]
+        z_lower = np.take_along_axis(zcor, lower[..., None], axis=-1)[..., 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight_upper = np.where(upper > lower, (z - z_lower)/(z_upper - z_lower), 0)
+        return (np.take_along_axis(levels, lower[..., None], axis=-1)[..., 0]*(1 - weight_upper) +
+                np.take_along_axis(levels, upper[..., None], axis=-1)[..., 0]*weight_upper)
+
     def _interpolate_horizontal_layers(self, data, nearest=False):
         '''Interpolate all layers of 3d (or 2d) array.'''
 
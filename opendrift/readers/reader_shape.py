@@ -16,6 +16,10 @@
 
 from opendrift.readers.basereader import BaseReader, ContinuousReader
 
+import os
+import hashlib
+import numpy as np
+import scipy.ndimage
 import pyproj
 import shapely
 import shapely.ops
@@ -25,6 +29,206 @@ import itertools
 import logging
 logger = logging.getLogger(__name__)
 
+
+class LandmaskRaster:
+    """
+    Raster of polygons, for fast checking of positions against a complex
+    coastline, and for finding the closest ocean position.
+
+    Each cell of the raster is either fully outside the polygons, fully
+    inside, or crossed by the polygon boundary. Only positions in crossed
+    cells are checked exactly against the polygons. For each cell, the
+    closest cell fully in the ocean, and the distance to it, is also stored.
+
+    The raster may be stored to, and reused from, a file, which is only
+    used if made from the same polygons, resolution and coordinates::
+
+        raster = LandmaskRaster.from_cache(land, 0.001, 'oslofjord_raster.npz')
+
+    Args:
+        land: shapely (multi)polygon, in reader coordinates
+
+        resolution: size of raster cells, in reader coordinates
+
+        invert: True if polygons are ocean (lakes) and not land
+
+        geographic: True if coordinates are longitude and latitude, for
+            calculation of distances in meters instead of coordinate units
+    """
+
+    OUTSIDE = 0
+    INSIDE = 1
+    BOUNDARY = 2
+
+    def __init__(self, land, resolution, invert=False, geographic=True):
+        self.land = land
+        self.resolution = resolution
+        self.invert = invert
+        self.key = self.make_key(land, resolution, invert, geographic)
+
+        xmin, ymin, xmax, ymax = land.bounds
+        # One cell outside the polygons, so that there is always ocean nearby
+        self.xmin = xmin - resolution
+        self.ymin = ymin - resolution
+        nx = int(np.ceil((xmax - self.xmin) / resolution)) + 1
+        ny = int(np.ceil((ymax - self.ymin) / resolution)) + 1
+
+        self.cells = self._classify_cells(nx, ny)
+
+        # Closest cell fully in the ocean, and distance to its center
+        ocean = self.OUTSIDE if invert is False else self.INSIDE
+        if not (self.cells == ocean).any():
+            raise ValueError('Landmask raster has no cells fully in ocean')
+        sampling = (resolution, resolution)
+        if geographic is True:
+            latmid = np.radians(self.ymin + ny*resolution/2)
+            sampling = (resolution*111320,
+                        resolution*111320*np.cos(latmid))
+        self.distance, indices = scipy.ndimage.distance_transform_edt(
+            self.cells != ocean, sampling=sampling, return_indices=True)
+        self.distance = self.distance.astype(np.float32)
+        self.nearest_ocean_j = indices[0].astype(np.int32)
+        self.nearest_ocean_i = indices[1].astype(np.int32)
+
+    @staticmethod
+    def make_key(land, resolution, invert, geographic=True):
+        """Identification of raster of given polygons, resolution and
+        coordinates (distances depend on whether these are geographic)"""
+        return hashlib.sha1(land.wkb + repr((resolution, invert,
+                                             bool(geographic))).encode()
+                            ).hexdigest()
+
+    @classmethod
+    def from_cache(cls, land, resolution, filename, invert=False,
+                   geographic=True):
+        """Read raster from file, or make raster and store it to file
+        if file does not exist or is made from other polygons"""
+        key = cls.make_key(land, resolution, invert, geographic)
+        if os.path.exists(filename):
+            with np.load(filename) as f:
+                if str(f['key']) == key:
+                    logger.debug('Reading landmask raster from %s' % filename)
+                    raster = cls.__new__(cls)
+                    raster.land = land
+                    raster.resolution = resolution
+                    raster.invert = invert
+                    raster.key = key
+                    raster.xmin = float(f['xmin'])
+                    raster.ymin = float(f['ymin'])
+                    for var in ['cells', 'distance',
+                                'nearest_ocean_i', 'nearest_ocean_j']:
+                        setattr(raster, var, f[var])
+                    return raster
+                logger.info('Landmask raster in %s is made from other '
+                            'polygons, making new' % filename)
+
+        logger.info('Making landmask raster with resolution %s' % resolution)
+        raster = cls(land, resolution, invert=invert, geographic=geographic)
+        raster.save(filename)
+        return raster
+
+    def save(self, filename):
+        """Store raster to (npz) file"""
+        with open(filename, 'wb') as f:
+            np.savez_compressed(f, key=self.key, xmin=self.xmin,
+                                ymin=self.ymin, cells=self.cells,
+                                distance=self.distance,
+                                nearest_ocean_i=self.nearest_ocean_i,
+                                nearest_ocean_j=self.nearest_ocean_j)
+
+    def _boundary_coords(self):
+        polygons = getattr(self.land, 'geoms', [self.land])
+        for polygon in polygons:
+            for ring in [polygon.exterior, *polygon.interiors]:
+                yield np.asarray(ring.coords)[:, 0:2]
+
+    def _classify_cells(self, nx, ny):
+        cells = np.zeros((ny, nx), dtype=np.uint8)
+
+        # Cells crossed by boundary: segments are split in parts shorter
+        # than a cell, and cells covered by the bounding box of each part
+        # are marked. A small margin includes boundaries along cell edges.
+        margin = 1e-6
+        for coords in self._boundary_coords():
+            start = (coords[:-1] - (self.xmin, self.ymin)) / self.resolution
+            delta = np.diff(coords, axis=0) / self.resolution
+            parts = np.maximum(np.ceil(np.abs(delta).max(axis=1)), 1).astype(int)
+            segment = np.repeat(np.arange(len(parts)), parts)
+            fraction = (np.arange(len(segment)) -
+                        np.repeat(np.cumsum(parts) - parts, parts)) / \
+                np.repeat(parts, parts)
+            p0 = start[segment] + fraction[:, None]*delta[segment]
+            p1 = p0 + delta[segment] / parts[segment, None]
+            low = np.floor(np.minimum(p0, p1) - margin).astype(int)
+            high = np.floor(np.maximum(p0, p1) + margin).astype(int)
+            for di in (0, 1, 2):
+                for dj in (0, 1, 2):
+                    i = np.minimum(low[:, 0] + di, high[:, 0])
+                    j = np.minimum(low[:, 1] + dj, high[:, 1])
+                    cells[np.clip(j, 0, ny - 1), np.clip(i, 0, nx - 1)] = \
+                        self.BOUNDARY
+
+        # Connected cells not crossed by boundary are all inside or all
+        # outside, thus only the center of one cell of each region is checked
+        regions, num_regions = scipy.ndimage.label(cells != self.BOUNDARY)
+        if num_regions > 0:
+            first = np.unique(regions.ravel(), return_index=True)[1]
+            first = first[1:] if regions.ravel()[first[0]] == 0 else first
+            j, i = np.unravel_index(first, cells.shape)
+            x, y = self.cell_center(i, j)
+            inside = shapely.vectorized.contains(self.land, x, y)
+            region_value = np.concatenate(
+                ([self.BOUNDARY], np.where(inside, self.INSIDE, self.OUTSIDE)))
+            cells = region_value[regions].astype(np.uint8)
+
+        return cells
+
+    def cell_index(self, x, y):
+        """Column and row of cells, and whether positions are within raster"""
+        i = np.floor((np.asarray(x) - self.xmin) / self.resolution).astype(int)
+        j = np.floor((np.asarray(y) - self.ymin) / self.resolution).astype(int)
+        ny, nx = self.cells.shape
+        within = (i >= 0) & (i < nx) & (j >= 0) & (j < ny)
+        return np.where(within, i, 0), np.where(within, j, 0), within
+
+    def cell_center(self, i, j):
+        return (self.xmin + (np.asarray(i) + .5)*self.resolution,
+                self.ymin + (np.asarray(j) + .5)*self.resolution)
+
+    def contains(self, x, y):
+        """Check if positions are inside polygons, checking exactly only
+        positions in cells crossed by the boundary"""
+        x = np.asarray(x)
+        y = np.asarray(y)
+        i, j, within = self.cell_index(x, y)
+        cells = np.where(within, self.cells[j, i], self.OUTSIDE)
+        inside = cells == self.INSIDE
+        boundary = cells == self.BOUNDARY
+        if boundary.any():
+            inside[boundary] = shapely.vectorized.contains(
+                self.land, x[boundary], y[boundary])
+        return inside
+
+    def on_land(self, x, y):
+        if self.invert is False:
+            return self.contains(x, y)
+        else:
+            return ~self.contains(x, y)
+
+    def distance_to_ocean(self, x, y):
+        """Distance from cells of positions to closest cell fully in ocean,
+        in meters for geographic coordinates, or NaN outside raster."""
+        i, j, within = self.cell_index(x, y)
+        return np.where(within, self.distance[j, i], np.nan)
+
+    def nearest_ocean(self, x, y):
+        """Center of closest cell fully in ocean, for positions within raster"""
+        i, j, within = self.cell_index(x, y)
+        x, y = self.cell_center(self.nearest_ocean_i[j, i],
+                                self.nearest_ocean_j[j, i])
+        return x, y, within
+
+
 class Reader(BaseReader, ContinuousReader):
     """
     The shape reader can be used to load generic shapes as the 'landmask' variable.
@@ -36,6 +240,15 @@ class Reader(BaseReader, ContinuousReader):
         :param proj4_str: Proj.4 string of shape file projection coordinates
                           (default: '+proj=lonlat +ellps=WGS84').
         :type proj4_str: string.
+
+        :param raster_resolution: if given, positions are checked against a
+                          LandmaskRaster with this cell size (in shape coordinates),
+                          which is also used to find closest ocean points.
+        :type raster_resolution: float.
+
+        :param raster_cache: file where LandmaskRaster is stored, and reused
+                          for later runs with the same shapes and resolution.
+        :type raster_cache: string.
     """
     name = 'shape'
     variables = ['land_binary_mask']
@@ -43,10 +256,12 @@ class Reader(BaseReader, ContinuousReader):
     crs   = None
     polys = None
     land  = None
+    landmask_raster = None
     always_valid = True
 
     @staticmethod
-    def from_shpfiles(shpfiles, proj4_str = '+proj=lonlat +ellps=WGS84', invert=False):
+    def from_shpfiles(shpfiles, proj4_str = '+proj=lonlat +ellps=WGS84', invert=False,
+                      raster_resolution=None, raster_cache=None):
         """
         Construct a shape-reader from shape-files (.shp)
 
@@ -71,9 +286,12 @@ class Reader(BaseReader, ContinuousReader):
             reader = io.shapereader.Reader(shp)
             shp_iters.append(reader.geometries())
 
-        return Reader(itertools.chain(*shp_iters), proj4_str, invert=invert)
+        return Reader(itertools.chain(*shp_iters), proj4_str, invert=invert,
+                      raster_resolution=raster_resolution,
+                      raster_cache=raster_cache)
 
-    def __init__(self, shapes, proj4_str = '+proj=lonlat +ellps=WGS84', invert=False):
+    def __init__(self, shapes, proj4_str = '+proj=lonlat +ellps=WGS84', invert=False,
+                 raster_resolution=None, raster_cache=None):
 
         self.invert = invert  # True if polygons are lakes and not land areas
         self.proj4 = proj4_str
@@ -95,7 +313,20 @@ class Reader(BaseReader, ContinuousReader):
         self.xmin, self.ymin = self.lonlat2xy(self.xmin, self.ymin)
         self.xmax, self.ymax = self.lonlat2xy(self.xmax, self.ymax)
 
+        if raster_resolution is not None:
+            geographic = self.crs.is_geographic
+            if raster_cache is not None:
+                self.landmask_raster = LandmaskRaster.from_cache(
+                    self.land, raster_resolution, raster_cache,
+                    invert=invert, geographic=geographic)
+            else:
+                self.landmask_raster = LandmaskRaster(
+                    self.land, raster_resolution, invert=invert,
+                    geographic=geographic)
+
     def __on_land__(self, x, y):
+        if self.landmask_raster is not None:
+            return self.landmask_raster.on_land(x, y)
         if self.invert is False:
             return shapely.vectorized.contains(self.land, x, y)
         else:  # Inverse if polygons are lakes and not land areas
@@ -230,8 +230,12 @@ def multi_zslice(F, S, Z):
     # Find C, C.shape = (kmax, M) such that
     # z_r[C[k,i]-1, i] < Z[k] <= z_r[C[k,i], i]
 
-    # shape: kmax, N, M => kmax, M
-    C = np.sum(S[np.newaxis, :, :] < Z[:, np.newaxis, :], axis=1)
+    # shape: kmax, M
+    # Counting the s-levels one at a time avoids an intermediate
+    # boolean array of shape (kmax, N, M)
+    C = np.zeros((kmax, M), dtype=int)
+    for n in range(N):
+        C += S[n] < Z
     C = C.clip(1, N-1)
 
     # Horizontal index
@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'Hydrodrift'))
+from API import QueryAPI
+
+
+@pytest.fixture
+def hasura():
+    """Local stand-in for Hasura, answering queries with canned pages"""
+    server = HTTPServer(('127.0.0.1', 0), None)
+    server.pages = []
+    server.requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers['Content-Length'])
+            server.requests.append(json.loads(self.rfile.read(length)))
+            body = json.dumps(server.pages.pop(0)).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server.RequestHandlerClass = Handler
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def record(id, lon, lat, time, temperature):
+    return {"id": id, "location": {"type": "Point", "coordinates": [lon, lat]},
+            "record_time": time, "temperature": temperature, "conductivity": 30.}
+
+
+def test_paged_records(hasura):
+    records = [record(1, 10.5, 59.5, "2024-04-15T00:10:00+00:00", 8.),
+               record(2, 10.6, 59.6, "2024-04-15T00:10:00+00:00", 6.),
+               record(3, 10.5, 59.5, "2024-04-15T00:40:00+00:00", 10.),
+               record(4, 10.6, 59.6, "2024-04-15T01:10:00+00:00", 7.),
+               record(5, 10.5, 59.5, "2024-04-15T01:20:00+00:00", 9.)]
+    hasura.pages = [{"data": {"salinity": records[0:2]}},
+                    {"data": {"salinity": records[2:4]}},
+                    {"data": {"salinity": records[4:5]}}]
+    api = QueryAPI(hasura_url='http://127.0.0.1:%i/v1/graphql' % hasura.server_port,
+                   page_size=2)
+    locations = [(10.5, 59.5), (10.6, 59.6)]
+    averages = api.query_hourly_average_API(
+        "salinity", datetime(2024, 4, 15), datetime(2024, 4, 16), locations)
+
+    # Paging stops at the first page shorter than page_size
+    assert len(hasura.requests) == 3
+    assert hasura.pages == []
+
+    # Locations are pushed down into the where clause of every page, and later
+    # pages start after the last record of the previous page
+    wheres = [request["variables"]["where"] for request in hasura.requests]
+    assert wheres[0]["location"] == {"_in": [
+        {"type": "Point", "coordinates": [10.5, 59.5]},
+        {"type": "Point", "coordinates": [10.6, 59.6]}]}
+    assert wheres[1]["_and"][0] == wheres[0]
+    assert wheres[1]["_and"][1]["_or"][1] == {
+        "record_time": {"_eq": "2024-04-15T00:10:00+00:00"}, "id": {"_gt": 2}}
+    assert all(request["variables"]["limit"] == 2 for request in hasura.requests)
+
+    # Hourly averages grouped by location
+    assert averages.loc[(10.5, 59.5, datetime(2024, 4, 15, 0)), "temperature"] == 9.
+    assert averages.loc[(10.5, 59.5, datetime(2024, 4, 15, 1)), "temperature"] == 9.
+    assert averages.loc[(10.6, 59.6, datetime(2024, 4, 15, 0)), "temperature"] == 6.
+    assert averages.loc[(10.6, 59.6, datetime(2024, 4, 15, 1)), "temperature"] == 7.
+    assert len(averages) == 4
+
+
+def test_query_errors(hasura):
+    import requests
+    hasura.pages = [{"errors": [{"message": "field not found"}]}]
+    api = QueryAPI(hasura_url='http://127.0.0.1:%i/v1/graphql' % hasura.server_port)
+    with pytest.raises(requests.RequestException):
+        list(api.stream_records_API("turbidity", ["turbidity"], "2024-04-15", "2024-04-16"))
+
+    # Query failures are raised, and do not exit
+    hasura.pages = [{"errors": [{"message": "field not found"}]}]
+    with pytest.raises(requests.RequestException):
+        api.query_location_API(datetime(2024, 4, 15), datetime(2024, 4, 16))
+    hasura.pages = [{"data": {"salinity": [{"location": {"coordinates": [10.5, 59.5]}}]}}]
+    assert api.query_location_API(datetime(2024, 4, 15), datetime(2024, 4, 16)) == [[10.5, 59.5]]
+
+
+def test_post_simulations(hasura):
+    rows = [{"grid_id": "%i" % i, "record_time": "2024-04-15 00:00:00"} for i in range(5)]
+    api = QueryAPI(hasura_url='http://127.0.0.1:%i/v1/graphql' % hasura.server_port)
+
+    # By default rows are upserted in concurrent chunks
+    hasura.pages = [{"data": {"insert_simulations": {"affected_rows": n}}} for n in [2, 2, 1]]
+    assert api.bulk_mutation_data_API(rows, chunk_size=2) == 5
+    assert len(hasura.requests) == 3
+    assert all("constraint: simulations_grid_id_record_time_key" in request["query"]
+               for request in hasura.requests)
+    assert sorted(len(request["variables"]["objects"]) for request in hasura.requests) == [1, 2, 2]
+
+    # Without constraint, all rows are replaced in one request
+    hasura.requests.clear()
+    hasura.pages = [{"data": {"delete_simulations": {"affected_rows": 7},
+                              "insert_simulations": {"affected_rows": 5}}}]
+    assert api.bulk_mutation_data_API(rows, chunk_size=2, upsert_constraint=None) == 5
+    assert len(hasura.requests) == 1
+    assert "delete_simulations" in hasura.requests[0]["query"]
+    assert hasura.requests[0]["variables"]["objects"] == rows
@@ -0,0 +1,76 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'Hydrodrift'))
+from opendrift.readers import reader_constant
+from HydroDrift import HydroDrift
+
+starttime = datetime(2024, 4, 15)
+seed_length = 6
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    """Checkpoint of a run of seed_length hours from starttime"""
+    drift = HydroDrift(loglevel=50)
+    drift.create_landers_from_list(starttime, seed_length, .05, .05)
+    drift.add_reader(reader_constant.Reader(
+        {'x_sea_water_velocity': .05, 'y_sea_water_velocity': .02,
+         'x_wind': 0, 'y_wind': 0, 'land_binary_mask': 0}))
+    drift.seed_elements(lon=10.5, lat=59.5, radius=20, number=12,
+                        time=[starttime, starttime + timedelta(hours=seed_length)])
+    drift.run(time_step=timedelta(hours=1), duration=timedelta(hours=seed_length))
+    filename = str(tmp_path / 'checkpoint.npz')
+    drift.write_checkpoint(filename)
+    return drift, filename
+
+
+def test_round_trip(checkpoint):
+    drift, filename = checkpoint
+    end_time = drift.time + timedelta(hours=3)
+    assert HydroDrift.checkpoint_time(filename, end_time, seed_length) == drift.time
+
+    # The next run starts 3 hours later, and continues the particles seeded
+    # since then, and the lander values of the last 3 hours
+    start_time = end_time - timedelta(hours=seed_length)
+    continued = HydroDrift(loglevel=50)
+    continued.create_landers_from_list(start_time, seed_length, .05, .05)
+    continued.seed_from_checkpoint(filename, start_time)
+
+    keep = drift.elements.age_seconds <= 3*3600
+    assert 0 < keep.sum() < drift.num_elements_active()
+    scheduled = continued.elements_scheduled
+    assert len(scheduled) == keep.sum()
+    assert (continued.elements_scheduled_time == drift.time).all()
+    for name in drift.elements.variables:
+        if name in ('ID', 'status'):
+            continue
+        # Seeded with the dtype of the element variables
+        values = getattr(scheduled, name)
+        expected = np.broadcast_to(getattr(drift.elements, name), len(keep))[keep]
+        np.testing.assert_array_equal(values, expected.astype(values.dtype), err_msg=name)
+
+    assert drift.lander_grid.change.any()
+    grid, previous = continued.lander_grid, drift.lander_grid
+    for name in ('salinity', 'temperature', 'turbidity', 'change'):
+        np.testing.assert_array_equal(getattr(grid, name)[:, :3], getattr(previous, name)[:, 3:])
+        assert not grid.change[:, 3:].any()
+    np.testing.assert_array_equal(grid.lander_change, previous.change[:, 3:].any(axis=1))
+
+
+def test_not_continued(checkpoint, tmp_path):
+    drift, filename = checkpoint
+    time = drift.time
+    for end_time, length in [(time + timedelta(hours=seed_length), seed_length),  # No overlap
+                             (time, seed_length),  # Not after checkpoint
+                             (time - timedelta(hours=1), seed_length),
+                             (time + timedelta(minutes=90), seed_length),  # Not whole hours
+                             (time + timedelta(hours=3), seed_length + 1)]:  # Other landers
+        assert HydroDrift.checkpoint_time(filename, end_time, length) is None
+    assert HydroDrift.checkpoint_time(None, time + timedelta(hours=3), seed_length) is None
+    assert HydroDrift.checkpoint_time(str(tmp_path / 'missing.npz'),
+                                      time + timedelta(hours=3), seed_length) is None
@@ -0,0 +1,136 @@
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'Hydrodrift'))
+from VirtualLanderGrid import VirtualLanderGrid
+
+lat_edges = [59.0, 59.05, 59.1]
+lon_edges = [10.0, 10.1, 10.2]
+starttime = datetime(2024, 4, 15)
+
+
+def smoother(values, change):
+    """Previous smoothing of one lander, one hour at a time (i=0 compares
+    with the last hour)"""
+    values = [v.copy() for v in values]
+    change = change.copy()
+    seed_length = len(change)
+    for i in range(seed_length):
+        if change[i]:
+            continue
+        elif change[i - 1]:
+            for n in range(i + 1, seed_length):
+                if change[n]:
+                    for v in values:
+                        v[i] = np.float32((v[i - 1] + v[n])/2)
+                    change[i] = True
+                    break
+            if not change[i]:
+                for v in values:
+                    v[i] = np.float32(v[i - 1])
+                change[i] = True
+        else:
+            for n in range(i + 1, seed_length):
+                if change[n]:
+                    for v in values:
+                        v[i] = np.float32(v[n])
+                    break
+    return values, change
+
+
+def test_smooth():
+    seed_length = 10
+    changes = [
+        [0, 0, 1, 0, 0, 0, 1, 1, 0, 0],  # Gaps at start, in middle and at end
+        [0, 0, 0, 1, 0, 0, 0, 0, 0, 1],  # Wraps from last hour to start
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 0],  # Only first hour
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 1],  # Only last hour
+        [0, 1, 0, 1, 0, 1, 0, 1, 0, 1],  # Alternating, with wrap
+        [1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+    ]
+    grid = VirtualLanderGrid(lat_edges, [10.0, 10.1, 10.2, 10.3, 10.4], starttime, seed_length)
+    assert len(grid) == 8
+    np.random.seed(3)
+    for lander, change in enumerate(changes):
+        change = np.array(change, dtype=bool)
+        grid.change[lander] = change
+        for values in (grid.salinity, grid.temperature, grid.turbidity):
+            values[lander, change] = np.random.uniform(0, 30, change.sum())
+    # Remaining landers have no values
+    before = [grid.salinity.copy(), grid.temperature.copy(), grid.turbidity.copy()]
+    change_before = grid.change.copy()
+
+    grid.smooth()
+
+    for lander in range(len(grid)):
+        expected, expected_change = smoother([v[lander] for v in before], change_before[lander])
+        np.testing.assert_array_equal(grid.change[lander], expected_change)
+        for values, expected_values in zip((grid.salinity, grid.temperature, grid.turbidity),
+                                           expected):
+            # Only the rounding to float32 of every hour differs
+            np.testing.assert_allclose(values[lander], expected_values, rtol=1e-6)
+    assert np.isnan(grid.salinity[len(changes):]).all()
+
+
+def test_update_landers():
+    grid = VirtualLanderGrid(lat_edges, lon_edges, starttime, 6)
+    time = datetime(2024, 4, 15, 2)
+    # Two particles in lander 1, one in lander 2 (north of lander 1), one outside
+    lat = [59.01, 59.02, 59.07, 58.5]
+    lon = [10.05, 10.06, 10.05, 10.05]
+    grid.update_landers(lat, lon, [10., 20., 30., 40.], [1., 2., 3., 4.],
+                        [5., 6., 7., 8.], time)
+    np.testing.assert_array_equal(grid.salinity[:2, 2], [15., 30.])
+    np.testing.assert_array_equal(grid.temperature[:2, 2], [1.5, 3.])
+    np.testing.assert_array_equal(grid.turbidity[:2, 2], [5.5, 7.])
+    np.testing.assert_array_equal(grid.lander_change, [True, True, False, False])
+    assert grid.change.sum() == 2 and grid.change[:2, 2].all()
+    assert np.isnan(grid.salinity[2:]).all() and np.isnan(grid.salinity[:, 3]).all()
+
+    # Later particles of the same hour are averaged with the current value
+    grid.update_landers([59.01], [10.05], [25.], [2.5], [7.5], time)
+    assert grid.salinity[0, 2] == 20. and grid.temperature[0, 2] == 2.
+    # Particles outside all landers do not change anything
+    grid.update_landers([58.5], [9.5], [0.], [0.], [0.], time)
+    assert grid.lander_change.sum() == 2
+
+    # One row per lander and hour, or only for the landers reached by particles
+    assert len(grid.records()) == 4*6
+    rows = grid.records(changed_only=True)
+    assert len(rows) == 2*6
+    assert [row["grid_id"] for row in rows] == ['1']*6 + ['2']*6
+    assert rows[2] == {"record_time": "2024-04-15 02:00:00", "conductivity": "20.0",
+                       "temperature": "2.0", "turbidity": "6.5", "grid_id": "1",
+                       "changed": "True"}
+    assert rows[3]["changed"] == "False" and rows[3]["conductivity"] == "nan"
+
+
+def test_restore():
+    previous = VirtualLanderGrid(lat_edges, lon_edges, starttime, 6)
+    previous.salinity[:] = np.arange(24).reshape(4, 6)
+    previous.temperature[:] = previous.salinity + 100
+    previous.turbidity[:] = previous.salinity + 200
+    previous.change[1, 4] = True
+    previous.change[2, 1] = True
+
+    # Hours 3 to 5 of the previous run are hours 0 to 2 of the next run
+    grid = VirtualLanderGrid(lat_edges, lon_edges, datetime(2024, 4, 15, 3), 6)
+    grid.restore(previous.starttime, previous.salinity, previous.temperature,
+                 previous.turbidity, previous.change)
+    np.testing.assert_array_equal(grid.salinity[:, :3], previous.salinity[:, 3:])
+    np.testing.assert_array_equal(grid.temperature[:, :3], previous.temperature[:, 3:])
+    np.testing.assert_array_equal(grid.turbidity[:, :3], previous.turbidity[:, 3:])
+    np.testing.assert_array_equal(grid.change[:, :3], previous.change[:, 3:])
+    assert np.isnan(grid.salinity[:, 3:]).all() and not grid.change[:, 3:].any()
+    # Only landers with changes in the restored hours are changed
+    np.testing.assert_array_equal(grid.lander_change, [False, True, False, False])
+
+    # Nothing to restore from runs not overlapping the next run
+    for time in [datetime(2024, 4, 15, 6), datetime(2024, 4, 14, 20)]:
+        grid = VirtualLanderGrid(lat_edges, lon_edges, time, 6)
+        grid.restore(previous.starttime, previous.salinity, previous.temperature,
+                     previous.turbidity, previous.change)
+        assert np.isnan(grid.salinity).all() and not grid.lander_change.any()
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'Hydrodrift'))
+from LanderIndex import LanderIndex
+
+lat_edges = [59.0, 59.05, 59.1, 59.15]
+lon_edges = [10.0, 10.1, 10.2]
+
+
+def lander_cells(index):
+    """Edges of every lander, in the order of the lander list"""
+    return [(lat_edges[ilat], lat_edges[ilat + 1], lon_edges[ilon], lon_edges[ilon + 1])
+            for ilon in range(index.num_lon) for ilat in range(index.num_lat)]
+
+
+def loop_pairs(index, lat, lon):
+    """(particle, lander) pairs of the previous loop over particles and landers,
+    with cell edges inclusive as in VirtualLander.contains"""
+    pairs = []
+    for i in range(len(lat)):
+        for lander, (minlat, maxlat, minlon, maxlon) in enumerate(lander_cells(index)):
+            if minlat <= lat[i] <= maxlat and minlon <= lon[i] <= maxlon:
+                pairs.append((i, lander))
+    return pairs
+
+
+def particles():
+    np.random.seed(1)
+    lat = list(np.random.uniform(58.98, 59.17, 200))
+    lon = list(np.random.uniform(9.98, 10.22, 200))
+    # On edges and corners, shared or at the grid boundary
+    for la in lat_edges:
+        for lo in lon_edges:
+            lat += [la, la, la + .01]
+            lon += [lo, lo + .03, lo]
+    # Outside the grid, also in line with the cells
+    lat += [58.9, 59.2, 59.07, 59.07, 58.9]
+    lon += [10.05, 10.05, 9.9, 10.3, 9.9]
+    return np.array(lat), np.array(lon)
+
+
+def test_locate():
+    index = LanderIndex(lat_edges, lon_edges)
+    lat, lon = particles()
+    particle, lander = index.locate(lat, lon)
+
+    expected = loop_pairs(index, lat, lon)
+    assert list(zip(particle, lander)) == sorted(expected, key=lambda p: (p[1], p[0]))
+    # Several particles per lander, particles on several landers, and outside
+    assert np.bincount(lander).min() > 1
+    assert np.bincount(particle).max() == 4
+    assert len(set(range(len(lat))) - set(particle)) > 5
+
+
+def test_running_average():
+    index = LanderIndex(lat_edges, lon_edges)
+    lat, lon = particles()
+    np.random.seed(2)
+    values = {'salinity': np.random.uniform(20, 35, len(lat)).astype(np.float32),
+              'temperature': np.random.uniform(2, 15, len(lat)).astype(np.float32)}
+    previous = {name: np.full(index.num_landers, np.nan, dtype=np.float32) for name in values}
+    changed = np.zeros(index.num_landers, dtype=bool)
+    # Some landers already have a value for the hour
+    changed[[0, 3]] = True
+    for name in values:
+        previous[name][[0, 3]] = [25., 30.]
+
+    # Previous update of lander values, one particle at a time
+    expected = {name: previous[name].copy() for name in values}
+    expected_changed = changed.copy()
+    for i, lander in loop_pairs(index, lat, lon):
+        for name in values:
+            if expected_changed[lander]:
+                expected[name][lander] = np.float32((expected[name][lander] + values[name][i])/2)
+            else:
+                expected[name][lander] = values[name][i]
+        expected_changed[lander] = True
+
+    particle, lander = index.locate(lat, lon)
+    landers, averages = index.running_average(
+        lander, {name: value[particle] for name, value in values.items()},
+        previous, changed)
+
+    np.testing.assert_array_equal(landers, np.nonzero(expected_changed)[0])
+    for name in values:
+        # Only the rounding to float32 of every step differs
+        np.testing.assert_allclose(averages[name], expected[name][landers], rtol=1e-6)
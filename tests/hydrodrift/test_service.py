@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'Hydrodrift'))
+import HydroService
+from HydroService import HydroService as Service
+
+
+class StubQueryAPI():
+    """Stand-in for QueryAPI, failing for the locations of given end times"""
+
+    def __init__(self, fail=()):
+        self.locationlist = []
+        self.fail = fail
+        self.queried = []
+
+    def query_location_API(self, start_datetime, end_datetime):
+        if end_datetime in self.fail:
+            raise requests.ConnectionError("Hasura is down")
+        self.queried.append((start_datetime, end_datetime))
+        self.locationlist = [[10.5, 59.5]]
+        return self.locationlist
+
+    def query_data_API(self, start_datetime, end_datetime):
+        return 'sensor reader %s' % end_datetime
+
+
+@pytest.fixture
+def drifts(monkeypatch):
+    """Replaces the model runs of the service, recording their arguments"""
+    calls = []
+
+    def run_drift(start_time, end_time, seed_length, queryAPI, locations, lander_reader,
+                  metrological_model, lander_grid=None, checkpoint=None):
+        calls.append({"end_time": end_time, "locations": locations,
+                      "lander_reader": lander_reader, "lander_grid": lander_grid})
+        return SimpleNamespace(lander_grid='grid %s' % end_time)
+
+    monkeypatch.setattr(HydroService, 'run_drift', run_drift)
+    return calls
+
+
+def test_queue(drifts):
+    api = StubQueryAPI(fail=[datetime(2024, 4, 16)])
+    service = Service(queryAPI=api, metrological_model='model')
+    first = service.submit(datetime(2024, 4, 15), seed_length=24, sensors=[[10.7, 59.7]])
+    failing = service.submit(datetime(2024, 4, 16))
+    last = service.submit(datetime(2024, 4, 17), seed_length=12)
+    assert [service.status(run)["status"] for run in [first, failing, last]] == ['queued']*3
+    assert service.status(4) is None
+
+    service.start()
+    service.stop()
+
+    assert service.status(first)["status"] == 'done'
+    assert service.status(failing)["status"] == 'failed'
+    assert 'Hasura is down' in service.status(failing)["error"]
+    # A failed run does not stop the service
+    assert service.status(last) == {"id": last, "status": "done",
+                                    "end_time": "2024-04-17 00:00:00", "seed_length": 12}
+
+    # Runs are done in order, with given sensors or the sensors with data,
+    # and with the landers of the previous run
+    assert [call["end_time"] for call in drifts] == [datetime(2024, 4, 15), datetime(2024, 4, 17)]
+    assert drifts[0]["locations"] == [[10.7, 59.7]]
+    assert drifts[1]["locations"] == [[10.5, 59.5]]
+    assert api.queried == [(datetime(2024, 4, 16, 12), datetime(2024, 4, 17))]
+    assert drifts[1]["lander_reader"] == 'sensor reader 2024-04-17 00:00:00'
+    assert drifts[0]["lander_grid"] is None
+    assert drifts[1]["lander_grid"] == 'grid 2024-04-15 00:00:00'
+
+
+def test_http(drifts):
+    service = Service(queryAPI=StubQueryAPI(), metrological_model='model')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), service.request_handler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:%i/run' % server.server_port
+    try:
+        response = requests.post(url, json={"end_time": "2024-04-16T00:00:00",
+                                            "seed_length": 6, "sensors": [[10.7, 59.7]]})
+        assert response.status_code == 202
+        run = response.json()
+        assert run == {"id": 1, "status": "queued",
+                       "end_time": "2024-04-16 00:00:00", "seed_length": 6}
+
+        response = requests.get('%s/%i' % (url, run["id"]))
+        assert response.status_code == 200
+        assert response.json()["status"] == 'queued'
+
+        service.start()
+        service.stop()
+        assert requests.get('%s/%i' % (url, run["id"])).json()["status"] == 'done'
+        assert drifts[0]["locations"] == [[10.7, 59.7]]
+
+        # Invalid requests
+        assert requests.post(url, json={"seed_length": 6}).status_code == 400
+        assert requests.post(url, json={"end_time": "tomorrow"}).status_code == 400
+        assert requests.post(url + '/1', json={}).status_code == 404
+        assert requests.get('%s/%i' % (url, 2)).status_code == 404
+        assert requests.get(url).status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -84,5 +84,34 @@ class TestElements(unittest.TestCase):
         self.assertEqual(len(e2), 2)
         self.assertEqual(len(e3), 1)
 
+    def test_extend_in_place(self):
+        """Elements are appended within reserved storage"""
+        e1 = LagrangianArray(lon=[1., 2.], lat=[60., 61.])
+        e1.reserve(10)
+        e1.extend(LagrangianArray(lon=[3.], lat=[62.]))
+        storage = e1.lon.base
+        e1.extend(LagrangianArray(lon=[4., 5.], lat=[63., 64.]))
+        self.assertIs(e1.lon.base, storage)
+        self.assertListEqual(list(e1.lon), [1., 2., 3., 4., 5.])
+        # Replaced arrays are copied to new storage
+        e1.lon = e1.lon + 1
+        e1.extend(LagrangianArray(lon=[7.], lat=[65.]))
+        self.assertIsNot(e1.lon.base, storage)
+        self.assertListEqual(list(e1.lon), [2., 3., 4., 5., 6., 7.])
+        self.assertListEqual(list(e1.lat), [60., 61., 62., 63., 64., 65.])
+
+    def test_move_swap(self):
+        A1 = LagrangianArray(lon=[0., 1., 2., 3., 4., 5.], lat=60.)
+        A2 = LagrangianArray()
+        holes, sources = A1.move_elements(
+            A2, np.array([True, False, False, True, False, False]),
+            keep_order=False)
+        self.assertListEqual(list(A2.lon), [0., 3.])
+        self.assertListEqual(list(A1.lon), [4., 1., 2., 5.])
+        aligned = np.array([0., 1., 2., 3., 4., 5.])*10
+        aligned[holes] = aligned[sources]
+        self.assertListEqual(list(aligned[:len(A1)]), [40., 10., 20., 50.])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,32 @@
+import numpy as np
+from opendrift.models.history import HistoryRecorder
+
+
+def test_history_recorder():
+    dtype = np.dtype([('lon', np.float32), ('status', np.int32), ('temp', np.float32)])
+    h = HistoryRecorder(dtype, 4, 3)
+
+    h.record(np.array([0, 2]), 0, {'lon': np.array([4., 5.]), 'status': 0})
+    h.record(np.array([1, 2, 3]), 1,
+             {'lon': np.array([9., 6., 1., 2.]), 'status': np.array([0, 1, 0, 0])},
+             np.array([1, 2, 3]))
+
+    history = h.masked()
+    assert history.shape == (4, 3)
+    np.testing.assert_array_equal(history['lon'][:, 0], np.ma.masked_values([4, -1, 5, -1], -1))
+    np.testing.assert_array_equal(history['lon'][:, 1], np.ma.masked_values([-1, 6, 1, 2], -1))
+    assert history['lon'][:, 2].mask.all()
+    assert history['temp'].mask.all()  # Never recorded
+    assert history['status'][2, 1] == 0
+
+    minvals, maxvals = h.extrema()
+    assert (minvals['lon'], maxvals['lon']) == (1, 6)
+    assert 'temp' not in minvals
+
+    # Cleared values are masked, but kept in extrema
+    h.clear()
+    assert h.variable('lon', 2).mask.all()
+    h.record(np.array([0]), 0, {'lon': np.array([8.])})
+    minvals, maxvals = h.extrema()
+    assert (minvals['lon'], maxvals['lon']) == (1, 8)
+    assert h.masked()['lon'][0, 0] == 8
@@ -27,8 +27,10 @@ import numpy as np
 from opendrift.readers import reader_netCDF_CF_generic
 from opendrift.readers import reader_ROMS_native
 from opendrift.models.openoil import OpenOil
+from opendrift.models.oceandrift import OceanDrift
 from opendrift.models.physics_methods import verticaldiffusivity_Large1994, verticaldiffusivity_Sundby1983, \
-        distance_between_trajectories, distance_along_trajectory, skillscore_darpa, skillscore_liu_weissberg
+        distance_between_trajectories, distance_along_trajectory, skillscore_darpa, skillscore_liu_weissberg, \
+        ProfileIndex
 
 
 class TestPhysics(unittest.TestCase):
@@ -46,6 +48,40 @@ class TestPhysics(unittest.TestCase):
         self.assertAlmostEqual(KSundby.min(), 0, 3)
         self.assertAlmostEqual(KSundby.max(), 0.0585, 3)
 
+    def test_profile_index(self):
+        from scipy.interpolate import interp1d
+        depths = np.array([-1, 0, .4, 2.5, 3, 7.7, 40, 100])
+        for z in [-np.arange(0, 41), -np.arange(0, 41)[::-1],
+                  np.array([0, -1, -2.5, -10, -30])]:
+            z_index = interp1d(-z, range(len(z)), bounds_error=False,
+                               fill_value=(0, len(z)-1))
+            np.testing.assert_array_almost_equal(ProfileIndex(z)(depths),
+                                                 z_index(depths))
+        zi = np.empty(len(depths), dtype=np.intp)
+        ProfileIndex(-np.arange(0, 41)).nearest(-depths, out=zi)
+        np.testing.assert_array_equal(zi, [0, 0, 0, 2, 3, 8, 40, 40])
+
+    def test_vertical_mixing_batch_random_numbers(self):
+        z = []
+        for batch in [False, True]:
+            o = OceanDrift(loglevel=50)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_wind', 10)
+            o.set_config('environment:fallback:y_wind', 0)
+            o.set_config('environment:fallback:x_sea_water_velocity', 0)
+            o.set_config('environment:fallback:y_sea_water_velocity', 0)
+            o.set_config('drift:vertical_mixing', True)
+            o.set_config('vertical_mixing:diffusivitymodel', 'windspeed_Large1994')
+            o.set_config('vertical_mixing:batch_random_numbers', batch)
+            np.random.seed(0)
+            o.seed_elements(4, 60, number=500, z=-10, time=datetime.now())
+            o.run(steps=2, time_step=900)
+            z.append(o.elements.z)
+        # Same random numbers are drawn, in another order of calls
+        np.testing.assert_array_equal(z[0], z[1])
+        self.assertTrue(np.all(z[0] <= 0))
+        self.assertGreater(z[0].std(), 1)
+
     def test_droplet_diameters(self):
         o = OpenOil(loglevel=20)
         o.set_config('environment:fallback:land_binary_mask', 0)
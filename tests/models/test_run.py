@@ -24,7 +24,9 @@ import os
 import inspect
 
 import numpy as np
+from netCDF4 import Dataset
 
+import opendrift
 from opendrift.readers import reader_ArtificialOceanEddy
 from opendrift.readers import reader_global_landmask
 from opendrift.readers import reader_netCDF_CF_generic
@@ -429,6 +431,62 @@ class TestRun(unittest.TestCase):
             o.index_of_activation_and_deactivation()
         assert o.num_elements_active() == len(index_of_first)
 
+    def run_export(self, outfile, **config):
+        """Run with elements deactivated along the way, exported in
+        buffers of 3 steps to outfile with the given config"""
+        o = OceanDrift(loglevel=50)
+        o.set_config('environment:constant:land_binary_mask', 0)
+        o.set_config('environment:constant:x_sea_water_velocity', .1)
+        o.set_config('general:use_auto_landmask', False)
+        o.set_config('drift:deactivate_east_of', 0.02)
+        for key, value in config.items():
+            o.set_config(key, value)
+        o.seed_elements(lon=0, lat=0, radius=1000, number=50,
+                        time=[datetime(2010,1,1), datetime(2010,1,1,6)])
+        o.run(steps=20, time_step=1800, export_buffer_length=3,
+              outfile=outfile)
+        return o
+
+    def test_export_async(self):
+        """Buffers written in background give same file as direct writing"""
+        histories = []
+        for output_async in [False, True]:
+            outfile = 'export_async_%s.nc' % output_async
+            o = self.run_export(outfile, **{
+                'general:output_async': output_async,
+                'general:output_compression': output_async})
+            o.io_import_file(outfile)
+            histories.append(o.history)
+            os.remove(outfile)
+        for var in ['lon', 'lat', 'status']:
+            np.testing.assert_array_equal(histories[0][var], histories[1][var])
+            np.testing.assert_array_equal(histories[0][var].mask,
+                                          histories[1][var].mask)
+
+    def test_export_contiguous_ragged(self):
+        """Ragged array output is imported as multidimensional output"""
+        imported = []
+        for output_format in ['multidimensional', 'contiguous_ragged']:
+            outfile = 'export_%s.nc' % output_format
+            o = self.run_export(outfile,
+                                **{'general:output_format': output_format})
+            if output_format == 'contiguous_ragged':
+                with Dataset(outfile) as f:
+                    self.assertEqual(f.variables['lon'].dimensions, ('obs',))
+                    self.assertEqual(f.variables['rowSize'][:].sum(),
+                                     (~o.history['lon'].mask).sum())
+            imported.append([o.history, opendrift.open(
+                outfile, times=np.arange(2, 12),
+                elements=np.arange(20, 40)).history])
+            os.remove(outfile)
+        for multidimensional, ragged in zip(*imported):
+            self.assertEqual(multidimensional.shape, ragged.shape)
+            for var in ['lon', 'lat', 'status']:
+                np.testing.assert_array_equal(multidimensional[var],
+                                              ragged[var])
+                np.testing.assert_array_equal(multidimensional[var].mask,
+                                              ragged[var].mask)
+
     def test_buffer_length_stranding(self):
         o1 = OceanDrift(loglevel=30)
         norkyst = reader_netCDF_CF_generic.Reader(o1.test_data_folder() +
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import pytest
 import matplotlib.pyplot as plt
@@ -143,3 +144,109 @@ def test_profile():
     # Elements at 10 and 50m depth should not have same trajectory
     # This is presently failing
     assert o.elements.lon[1] != o.elements.lon[2]
+
+
+def write_mesh(filename, nodes):
+    """Write FVCOM-like file of Delaunay triangulation of nodes"""
+    from netCDF4 import Dataset
+    from scipy.spatial import Delaunay
+    triangles = Delaunay(nodes).simplices
+    centers = nodes[triangles].mean(axis=1)
+    siglay = np.array([-.25, -.75])
+    with Dataset(filename, 'w') as d:
+        d.CoordinateProjection = proj
+        d.CoordinateSystem = 'Cartesian'
+        d.createDimension('node', len(nodes))
+        d.createDimension('nele', len(triangles))
+        d.createDimension('three', 3)
+        d.createDimension('siglay', 2)
+        d.createDimension('siglev', 3)
+        d.createDimension('time', 1)
+        for name, dims, values in [
+                ('x', ('node',), nodes[:, 0]), ('y', ('node',), nodes[:, 1]),
+                ('xc', ('nele',), centers[:, 0]), ('yc', ('nele',), centers[:, 1]),
+                ('nv', ('three', 'nele'), triangles.T + 1),
+                ('h', ('node',), np.full(len(nodes), 100.)),
+                ('h_center', ('nele',), np.full(len(triangles), 100.)),
+                ('siglay', ('siglay', 'node'), siglay[:, None].repeat(len(nodes), 1)),
+                ('siglev', ('siglev', 'node'), np.zeros((3, len(nodes)))),
+                ('siglay_center', ('siglay', 'nele'), siglay[:, None].repeat(len(triangles), 1)),
+                ('siglev_center', ('siglev', 'nele'), np.zeros((3, len(triangles)))),
+                ('temp', ('time', 'siglay', 'node'),
+                 (nodes[:, 0]/1000 + nodes[:, 1]/500 + [[0], [-5]])[None]),
+                ('u', ('time', 'siglay', 'nele'),
+                 np.arange(len(triangles))[None, None].repeat(2, 1)),
+                ('time', ('time',), [58000])]:
+            d.createVariable(name, 'f8', dims)[:] = values
+        d['time'].time_zone = 'UTC'
+        d['time'].units = 'days since 1858-11-17 00:00:00'
+        d['time'].format = 'modified julian day (MJD)'
+        d['temp'].standard_name = 'temperature'
+        d['u'].standard_name = 'eastward_sea_water_velocity'
+
+
+def test_linear_interpolation(tmpdir):
+    """Node-variables are interpolated linearly within triangles"""
+    from scipy.spatial import Delaunay
+    np.random.seed(1)
+    nodes = np.random.uniform(0, 10000, (500, 2))
+    filename = str(tmpdir.join('mesh.nc'))
+    write_mesh(filename, nodes)
+
+    r = reader_netCDF_CF_unstructured.Reader(filename)
+    x = np.random.uniform(2000, 8000, 100)
+    y = np.random.uniform(2000, 8000, 100)
+    z = np.where(np.arange(100) < 50, -10, -80)
+    for i in range(2):  # Second time with triangles from first time
+        v = r.get_variables(['temperature', 'x_sea_water_velocity'],
+                            r.start_time, x, y, z)
+        np.testing.assert_array_almost_equal(
+            v['temperature'], x/1000 + y/500 - 5*(z < -50))
+        np.testing.assert_array_equal(
+            v['x_sea_water_velocity'],
+            Delaunay(nodes).find_simplex(np.c_[x, y]))
+        x = x + 50
+
+
+def test_mesh_cache(tmpdir):
+    from opendrift.readers.basereader import MeshCache, UnstructuredReader
+    np.random.seed(1)
+    filename = str(tmpdir.join('mesh.nc'))
+    write_mesh(filename, np.random.uniform(0, 10000, (500, 2)))
+    x = np.random.uniform(2000, 8000, 100)
+    y = np.random.uniform(2000, 8000, 100)
+
+    r = reader_netCDF_CF_unstructured.Reader(filename)
+    cache = MeshCache(str(tmpdir.join('cache')))
+    UnstructuredReader.mesh_cache = cache
+    try:
+        r1 = reader_netCDF_CF_unstructured.Reader(filename)
+        assert (cache.hits, cache.misses) == (0, 4)
+        r2 = reader_netCDF_CF_unstructured.Reader(filename)
+        assert (cache.hits, cache.misses) == (4, 4)
+
+        # Only arrays and JSON headers are stored, of known types only
+        files = os.listdir(cache.directory)
+        assert sorted(set(os.path.splitext(f)[1] for f in files)) == \
+            ['.bin', '.json']
+        for f in files:
+            if f.endswith('.json'):
+                header = open(os.path.join(cache.directory, f)).read()
+                with open(os.path.join(cache.directory, f), 'w') as out:
+                    out.write(header.replace('"type": "cKDTree"',
+                                             '"type": "os.system"'))
+        reader_netCDF_CF_unstructured.Reader(filename)
+        assert cache.misses > 4
+    finally:
+        UnstructuredReader.mesh_cache = None
+
+    for reader in [r1, r2]:
+        np.testing.assert_array_equal(reader._nearest_node_(x, y),
+                                      r._nearest_node_(x, y))
+        np.testing.assert_array_equal(reader._nearest_face_(x, y),
+                                      r._nearest_face_(x, y))
+        np.testing.assert_array_equal(reader.covers_positions(x - 5000, y),
+                                      r.covers_positions(x - 5000, y))
+        for v1, v2 in zip(reader.triangle_locator.locate(x, y),
+                          r.triangle_locator.locate(x, y)):
+            np.testing.assert_array_equal(v1, v2)
@@ -18,18 +18,20 @@
 # Copyright 2015, Knut-Frode Dagestad, MET Norway
 
 import os
+import tempfile
 import unittest
 from datetime import datetime, timedelta
 
 import numpy as np
 import xarray as xr
+from scipy.ndimage import map_coordinates
 
 from opendrift.models.oceandrift import OceanDrift
 from opendrift.readers import reader_netCDF_CF_generic
 from opendrift.readers import reader_ROMS_native
 from opendrift.readers.interpolation import \
-        expand_numpy_array, \
-        ReaderBlock, LinearND2DInterpolator, \
+        expand_numpy_array, fill_nearest_valid, NearestValidTables, \
+        ReaderBlock, LinearND2DInterpolator, Linear2DInterpolator, \
         NDImage2DInterpolator, Nearest2DInterpolator, \
         Nearest1DInterpolator, Linear1DInterpolator
 
@@ -41,8 +43,11 @@ class TestInterpolation(unittest.TestCase):
 
     def test_dateline(self):
 
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+
         # Make synthetic netCDF file with currents from 0 to 360 deg longitude
-        fc = 'opendrift_test_current_0_360.nc'
+        fc = os.path.join(tmpdir.name, 'opendrift_test_current_0_360.nc')
         lon = np.arange(0, 360)
         lat = np.arange(-88, 89)
         start_time = datetime(2021, 1, 1)
@@ -57,7 +62,7 @@ class TestInterpolation(unittest.TestCase):
         ds.to_netcdf(fc)
 
         # Make synthetic netCDF file with winds from -180 to 180 deg longitude
-        fw = 'opendrift_test_winds_180_180.nc'
+        fw = os.path.join(tmpdir.name, 'opendrift_test_winds_180_180.nc')
         lon = np.arange(-180, 180)
         t, xwind, ywind = np.meshgrid(time, np.zeros(lat.shape), np.zeros(lon.shape), indexing='ij')
         ywind[:, :, 0:180] = 1  # northward
@@ -69,7 +74,7 @@ class TestInterpolation(unittest.TestCase):
         ds.to_netcdf(fw)
 
         # Make synthetic netCDF file with winds from 160 to 280 deg longitude (Pacific)
-        fw2 = 'opendrift_test_winds_160_280.nc'
+        fw2 = os.path.join(tmpdir.name, 'opendrift_test_winds_160_280.nc')
         lon = np.arange(160, 280)
         t, xwind, ywind = np.meshgrid(time, np.zeros(lat.shape), np.zeros(lon.shape), indexing='ij')
         ywind[:, :, 0:20] = -1  # southhward
@@ -121,11 +126,6 @@ class TestInterpolation(unittest.TestCase):
         np.testing.assert_array_almost_equal(o.elements.lon, [-175.129,  175.129], decimal=3)
         np.testing.assert_array_almost_equal(o.elements.lat, [60.006, 59.994], decimal=3)
 
-        # Cleaning up
-        os.remove(fw)
-        os.remove(fw2)
-        os.remove(fc)
-
     def get_synthetic_data_dict(self):
         data_dict = {}
         data_dict['x'] = np.linspace(-70, 470, 200)
@@ -320,6 +320,86 @@ class TestInterpolation(unittest.TestCase):
         i,p = rb.interpolate(np.array([1, 2]), np.array([2, 3]), z, 'var')
         self.assertTrue(i['var'][0] > 0)
 
+    def test_interpolation_plan(self):
+        """Interpolators are shared by blocks with the same grid and positions"""
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        data_after = {k: (v.copy()*2 if k.startswith('var') else v)
+                      for k, v in data_dict.items()}
+        b_before = ReaderBlock(data_dict)
+        b_after = ReaderBlock(data_after)
+
+        plan = b_before.interpolation_plan(x, y, z)
+        self.assertIs(b_after.interpolation_plan(x, y, z, plan), plan)
+        self.assertIsNot(b_after.interpolation_plan(x.copy(), y, z, plan), plan)
+        env_before = b_before.interpolate(x, y, z, plan=plan)[0]
+        env_after = b_after.interpolate(x, y, z, plan=plan)[0]
+        self.assertIs(b_after.interpolator2d, b_before.interpolator2d)
+        np.testing.assert_array_almost_equal(env_after['var3d'],
+                                             2*env_before['var3d'])
+
+        # A block with another grid gets its own interpolators
+        data_other = self.get_synthetic_data_dict()[0]
+        data_other['x'] = data_other['x'] + 10
+        b_other = ReaderBlock(data_other)
+        self.assertIsNot(b_other.interpolation_plan(x, y, z, plan), plan)
+
+    def test_linearNDFast_layers(self):
+        """All layers interpolated at once give the same values as layer by layer"""
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        var3d = np.ma.filled(data_dict['var3d'], np.nan).astype(np.float64)
+        var3d[:, 3:5, 2:4] = np.nan  # Hole to be filled from neighbours
+        # Also positions at the grid edges and corners, and just outside
+        x = np.concatenate([x, data_dict['x'][[0, -1, 0, -1, 0]],
+                            [data_dict['x'][-1] + 1, 150]])
+        y = np.concatenate([y, data_dict['y'][[0, 0, -1, -1, 50]],
+                            [200, data_dict['y'][0] - 1]])
+        interpolator = Linear2DInterpolator(data_dict['x'], data_dict['y'], x, y)
+        layers = interpolator(var3d.copy())
+        for layer in range(var3d.shape[0]):
+            np.testing.assert_array_almost_equal(
+                layers[layer, :], interpolator(var3d[layer, :, :].copy()))
+
+            # Same as map_coordinates, with missing values filled from neighbours
+            expected = map_coordinates(var3d[layer], [interpolator.yi, interpolator.xi],
+                                       cval=np.nan, order=1)
+            missing = ~np.isfinite(expected)
+            filled = var3d[layer].copy()
+            fill_nearest_valid(filled)
+            expected[missing] = map_coordinates(
+                filled, [interpolator.yi[missing], interpolator.xi[missing]],
+                cval=np.nan, order=1, mode='nearest')
+            self.assertTrue(missing.any())
+            np.testing.assert_array_almost_equal(layers[layer, :], expected)
+
+    def test_nearest_layers(self):
+        """3D arrays are interpolated with nearest interpolator when requested"""
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        b = ReaderBlock(data_dict, interpolation_horizontal='linearNDFast')
+        b.interpolate(x, y, z, ['var3d'])
+        b.interpolator2d_nearest = b.plan.interpolator2d_nearest
+        layers = b._interpolate_horizontal_layers(data_dict['var3d'], nearest=True)
+        for layer in range(data_dict['var3d'].shape[0]):
+            np.testing.assert_array_almost_equal(
+                layers[layer, :],
+                b.interpolator2d_nearest(data_dict['var3d'][layer, :, :]))
+
+    def test_only_needed_layers(self):
+        """Interpolating only the bracketing layers gives the same values"""
+        for horizontal in ['linearNDFast', 'nearest']:
+            for vertical in ['linear', 'nearest']:
+                envs = []
+                for only_needed in [False, True]:
+                    data_dict, x, y, z = self.get_synthetic_data_dict()
+                    data_dict['var3d'][2:, 3:5, 2:4] = np.nan  # Seafloor
+                    b = ReaderBlock(data_dict,
+                                    interpolation_horizontal=horizontal,
+                                    interpolation_vertical=vertical)
+                    b.only_needed_layers = only_needed
+                    envs.append(b.interpolate(x, y, z, ['var3d'])[0])
+                np.testing.assert_array_almost_equal(
+                    np.ma.filled(envs[0]['var3d'], np.nan),
+                    np.ma.filled(envs[1]['var3d'], np.nan))
+
     def test_repeated(self):
         """Check that block can be used for interpolation to several sets of positions"""
         reader = reader_netCDF_CF_generic.Reader(o.test_data_folder() +
@@ -456,6 +536,57 @@ class TestInterpolation(unittest.TestCase):
         self.assertEqual(sum(~np.isfinite(data.ravel())), 0)
         self.assertFalse(np.isnan(data.max()))
 
+    def test_fill_nearest_valid(self):
+        data = np.tile(np.arange(5.), (5, 1))
+        data[1:, 3:] = np.nan
+        fill_nearest_valid(data)
+        self.assertTrue(np.isfinite(data).all())
+        np.testing.assert_array_equal(data[2:, 3], 2)
+        self.assertEqual(data[4, 4], 2)  # Nearest, including diagonals
+
+        # Cells far from valid data are not filled
+        data = np.full((30, 30), np.nan)
+        data[0, 0] = 1
+        fill_nearest_valid(data)
+        self.assertEqual(data[10, 10], 1)
+        self.assertTrue(np.isnan(data[11, 0]))
+
+    def test_nearest_valid_tables(self):
+        land = np.zeros((20, 30), dtype=bool)
+        land[5:15, 10:] = True
+        data = np.random.rand(2, 20, 30)
+        data[:, land] = np.nan
+        expected = data.copy()
+        for layer in expected:
+            fill_nearest_valid(layer)
+
+        tables = NearestValidTables(max_tables=2)
+        for layer, expected_layer in zip(data, expected):
+            fill_nearest_valid(layer, tables=tables, grid=(0, 1))
+            np.testing.assert_array_equal(layer, expected_layer)
+        # Same mask of the same grid gives the same table
+        self.assertEqual(len(tables), 1)
+        table = tables.get((0, 1), land)
+        self.assertIs(tables.get((0, 1), land.copy()), table)
+        # Other grids, and other masks with as many invalid cells, get other tables
+        self.assertIsNot(tables.get((0, 2), land), table)
+        self.assertIsNot(tables.get((0, 1), np.roll(land, 1, axis=0)), table)
+        # Least recently used tables are dropped
+        self.assertEqual(len(tables), 2)
+        self.assertIsNot(tables.get((0, 1), land), table)
+
+    def test_linearNDFast_coast(self):
+        """Positions next to missing data get values from the nearest valid cells"""
+        xgrid = np.arange(10.)
+        ygrid = np.arange(8.)
+        data = np.ones((8, 10))
+        data[:, 6:] = np.nan  # Land
+        x = np.array([2.5, 5.5, 6.5, 9.5])
+        y = np.array([3., 3., 3.5, 7.])
+        interpolator = Linear2DInterpolator(xgrid, ygrid, x, y)
+        np.testing.assert_array_almost_equal(interpolator(data), [1, 1, 1, 1])
+        self.assertTrue(np.isfinite(data).all())  # Filled in place
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -55,3 +55,35 @@ def test_global_array(test_data):
     np.testing.assert_array_equal(en.land_binary_mask, np.array([True, False]))
     assert len(
         oc.readers) == 2  # make sure opendrift doesn't add default basemap
+
+
+def test_landmask_raster(tmpdir):
+    import shapely.geometry
+    t = np.linspace(0, 2*np.pi, 2000, endpoint=False)
+    r = .3 + .05*np.sin(37*t)
+    coast = shapely.geometry.Polygon(np.c_[10 + r*np.cos(t), 60 + r*np.sin(t)])
+    island = shapely.geometry.Point(10.5, 60.2).buffer(.01)
+    cache = str(tmpdir.join('raster.npz'))
+
+    exact = reader_shape.Reader([coast, island])
+    raster = reader_shape.Reader([coast, island], raster_resolution=.005,
+                                 raster_cache=cache)
+    assert raster.landmask_raster.cells.max() == 2
+    # Reused from file
+    raster = reader_shape.Reader([coast, island], raster_resolution=.005,
+                                 raster_cache=cache)
+    # Not reused for other kind of coordinates, as distances differ
+    land_polygons = shapely.geometry.MultiPolygon([coast, island])
+    key = reader_shape.LandmaskRaster.make_key(land_polygons, .005, False, True)
+    assert reader_shape.LandmaskRaster.make_key(
+        land_polygons, .005, False, False) != key
+
+    x = np.random.uniform(9.6, 10.6, 10000)
+    y = np.random.uniform(59.6, 60.4, 10000)
+    land = exact.__on_land__(x, y)
+    np.testing.assert_array_equal(raster.__on_land__(x, y), land)
+
+    o = OceanDrift(loglevel=50)
+    o.add_reader(raster)
+    lon, lat = o.closest_ocean_points(x[land], y[land])
+    assert not exact.__on_land__(lon, lat).any()
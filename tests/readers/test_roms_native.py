@@ -0,0 +1,71 @@
+import numpy as np
+
+from opendrift.readers.reader_ROMS_native import covering_layers
+from opendrift.readers.roppy import depth
+
+
+def synthetic_z_rho(num_layers=30, shape=(40, 50)):
+    np.random.seed(0)
+    H = 20 + 300*np.random.rand(*shape)
+    s = (np.arange(num_layers) + .5 - num_layers)/num_layers
+    Cs_r = -(1 - np.cosh(4*s))/(1 - np.cosh(4))*np.sign(s)
+    return H, Cs_r, depth.sdepth(H, 50., Cs_r, Vtransform=2)
+
+
+def test_window_of_z_rho():
+    """Window view of s-level depths of whole domain equals depths of subset"""
+    H, Cs_r, z_rho_tot = synthetic_z_rho()
+    indy = np.arange(5, 17)
+    indx = np.arange(20, 41)
+    window = (slice(indy[0], indy[-1] + 1), slice(indx[0], indx[-1] + 1))
+    np.testing.assert_array_almost_equal(
+        z_rho_tot[(slice(None),) + window],
+        depth.sdepth(H[np.ix_(indy, indx)], 50., Cs_r, Vtransform=2))
+
+
+def test_covering_layers():
+    """Vectorized search gives the same layers as loop over layers"""
+    H, Cs_r, z_rho_tot = synthetic_z_rho()
+    num_layers = len(Cs_r)
+    for zmin, zmax in [(-10, 0), (-100, -30), (-400, -350), (-5, -1e-3),
+                       (-400, 0)]:
+        indy = np.random.randint(0, H.shape[0], 20)
+        indx = np.random.randint(0, H.shape[1], 20)
+        z = np.random.uniform(zmin, zmax, 20)
+        z_rho = z_rho_tot[:, indy, indx]
+
+        indz_min = 0
+        indz_max = num_layers
+        for i in range(num_layers):
+            if np.min(z - z_rho[i, :]) > 0:
+                indz_min = i
+            if np.max(z - z_rho[i, :]) > 0:
+                indz_max = i
+
+        assert covering_layers(z, z_rho) == (indz_min, indz_max)
+
+
+def test_multi_zslice():
+    """Interpolation to z-levels is the same as with 3D boolean temporary"""
+    H, Cs_r, z_rho_tot = synthetic_z_rho()
+    F = np.cos(z_rho_tot/50) + np.random.rand(*z_rho_tot.shape)
+    zlevels = np.array([0, -1, -5, -10, -50, -100, -200, -300, -400])
+    R, (A, C, I, kmax) = depth.multi_zslice(F, z_rho_tot, zlevels)
+
+    N = F.shape[0]
+    S = z_rho_tot.reshape((N, -1))
+    Fr = F.reshape((N, -1))
+    Z = zlevels[:, np.newaxis] + np.zeros((len(zlevels), S.shape[1]))
+    C_expected = np.sum(S[np.newaxis, :, :] < Z[:, np.newaxis, :],
+                        axis=1).clip(1, N-1)
+    I_expected = np.arange(S.shape[1])
+    A_expected = ((Z - S[(C_expected-1, I_expected)]) /
+                  (S[(C_expected, I_expected)] -
+                   S[(C_expected-1, I_expected)])).clip(0, 1)
+    R_expected = (1 - A_expected)*Fr[(C_expected-1, I_expected)] + \
+        A_expected*Fr[(C_expected, I_expected)]
+
+    np.testing.assert_array_equal(C, C_expected)
+    np.testing.assert_array_equal(A, A_expected)
+    np.testing.assert_array_equal(
+        R, R_expected.reshape((len(zlevels),) + F.shape[1:]))
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import xarray as xr
 import pytest
@@ -102,3 +103,129 @@ def test_lonlat2xy_parallel_big(test_data, benchmark):
 
     np.testing.assert_equal(x, xs)
     np.testing.assert_equal(y, ys)
+
+
+def current_dataset():
+    """Synthetic currents of 12 hours from 2021-01-01"""
+    from datetime import datetime, timedelta
+
+    start_time = datetime(2021, 1, 1)
+    times = [start_time + i*timedelta(hours=1) for i in range(12)]
+    lon = np.arange(4, 6, .05)
+    lat = np.arange(60, 61, .05)
+    t, y, x = np.meshgrid(np.arange(len(times)), lat, lon, indexing='ij')
+    return xr.Dataset(
+        {"u": (("time", "lat", "lon"), .1 + .02*t*np.cos(x), {'standard_name': 'x_sea_water_velocity'}),
+         "v": (("time", "lat", "lon"), .05*np.sin(y + t), {'standard_name': 'y_sea_water_velocity'})},
+        coords={"lon": lon, "lat": lat, "time": times})
+
+
+def run_drift(reader):
+    """Run of 10 hours with OceanDrift on the currents of current_dataset"""
+    from datetime import datetime, timedelta
+    from opendrift.models.oceandrift import OceanDrift
+
+    o = OceanDrift(loglevel=50)
+    o.set_config('general:use_auto_landmask', False)
+    o.set_config('environment:fallback:land_binary_mask', 0)
+    o.add_reader(reader)
+    np.random.seed(0)
+    o.seed_elements(lon=4.5, lat=60.5, radius=1000, number=100, time=datetime(2021, 1, 1))
+    o.run(duration=timedelta(hours=10), time_step=1800)
+    return o
+
+
+def test_prefetch():
+    ds = current_dataset()
+
+    def run(prefetch):
+        reader = reader_netCDF_CF_generic.Reader(ds)
+        reader.set_prefetch(prefetch)
+        return run_drift(reader), reader
+
+    o, _ = run(False)
+    o_prefetch, reader = run(True)
+
+    # Blocks are read for the positions one step earlier, and may be larger
+    np.testing.assert_array_almost_equal(o.elements.lon, o_prefetch.elements.lon)
+    np.testing.assert_array_almost_equal(o.elements.lat, o_prefetch.elements.lat)
+    stats = reader.prefetch_stats
+    assert stats['requested'] > 0
+    assert stats['hidden'] + stats['waited'] > 0
+    assert 'prefetched blocks' in reader.performance()
+
+
+def test_block_cache():
+    from opendrift.readers.basereader import BlockCache
+
+    reader = reader_netCDF_CF_generic.Reader(current_dataset())
+    cache = BlockCache(max_bytes=1e8)
+    reader.set_block_cache(cache)
+
+    o = run_drift(reader)
+    assert cache.hits == 0
+    misses = cache.misses
+    o2 = run_drift(reader)  # Second model instance with the same reader uses cached blocks
+    assert cache.hits == misses
+    assert cache.misses == misses
+    np.testing.assert_array_equal(o.elements.lon, o2.elements.lon)
+    assert 'block cache hits' in reader.performance()
+
+    # Least recently used blocks are evicted to keep within budget
+    block_size = cache.bytes / len(cache)
+    cache.max_bytes = 2.5*block_size
+    cache.clear()
+    run_drift(reader)
+    assert len(cache) == 2
+    assert cache.evictions > 0
+
+
+def test_tile_cache(test_data, tmpdir):
+    from opendrift.readers.basereader import TileCache
+
+    for filename, variables, z in [
+            ('2Feb2016_Nordic_sigma_3d/Nordic_subset.nc',
+             ['sea_water_temperature', 'x_sea_water_velocity'], -50),
+            ('14Jan2016_NorKyst_z_3d/AROME_MetCoOp_00_DEF_20160114_subset.nc',
+             ['x_wind', 'y_wind'], 0)]:
+        if 'Nordic' in filename:
+            open_reader = reader_ROMS_native.Reader
+        else:
+            open_reader = reader_netCDF_CF_generic.Reader
+        reference = open_reader(test_data + filename)
+        x = np.linspace(reference.xmin, reference.xmax, 10)[2:5]
+        y = np.linspace(reference.ymin, reference.ymax, 10)[3:7]
+        x, y = np.meshgrid(x, y)
+        x, y = x.ravel(), y.ravel()
+        z = z*np.ones(len(x))
+        expected = reference.get_variables(variables, reference.start_time, x, y, z)
+
+        # First reading from file, then from tiles stored by other TileCache
+        for misses, hits in [(True, False), (False, True)]:
+            cache = TileCache(str(tmpdir.join('tiles')), tile_size=4)
+            reader = open_reader(test_data + filename)
+            reader.set_tile_cache(cache)
+            v = reader.get_variables(variables, reader.start_time, x, y, z)
+            for var in variables:
+                np.testing.assert_array_equal(v[var], expected[var])
+            assert (cache.misses > 0) is misses
+            assert (cache.hits > 0) is hits
+        assert 'tile cache hits' in reader.performance()
+
+        # Tiles of other versions of the dataset are not used
+        cache = TileCache(str(tmpdir.join('tiles')), tile_size=4)
+        reader = open_reader(test_data + filename)
+        reader.Dataset.attrs['date_modified'] = '2100-01-01T00:00:00Z'
+        reader.set_tile_cache(cache)
+        v = reader.get_variables(variables, reader.start_time, x, y, z)
+        for var in variables:
+            np.testing.assert_array_equal(v[var], expected[var])
+        assert cache.misses > 0 and cache.hits == 0
+
+        # Least recently used tiles are removed to keep within budget
+        cache.max_bytes = cache.bytes / 2
+        v = reader.get_variables(variables, reader.end_time, x, y, z)
+        assert cache.evictions > 0 and cache.bytes <= cache.max_bytes
+        assert len(cache) == len(os.listdir(cache.directory))
+        cache.clear()
+        assert len(os.listdir(cache.directory)) == 0
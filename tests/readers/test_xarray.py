@@ -21,6 +21,7 @@ import unittest
 import pytest
 from datetime import datetime, timedelta
 import os
+import tempfile
 import numpy as np
 import opendrift
 from opendrift.readers import reader_oscillating
@@ -32,9 +33,9 @@ class TestXarray(unittest.TestCase):
 
     def test_density(self):
         """Test density"""
-        outfile = 'test_xarray.nc'
-        if os.path.exists(outfile):
-            os.remove(outfile)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        outfile = os.path.join(tmpdir.name, 'test_xarray.nc')
         o = OceanDrift(loglevel=20)
         o.set_config('environment:fallback:land_binary_mask', 0)
         t1 = datetime.now()
@@ -69,7 +70,6 @@ class TestXarray(unittest.TestCase):
         self.assertEqual(Hxsum[0], 118)
         self.assertEqual(Hsum[-1], 300)
         self.assertEqual(Hxsum[-1], 300)
-        os.remove(outfile)
 
 if __name__ == '__main__':
     unittest.main()